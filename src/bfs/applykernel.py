@@ -1,5 +1,6 @@
 from migen import *
 from migen.genlib.record import *
+from tbsupport import every_cycle
 
 from bfs.interfaces import *
 
@@ -50,10 +51,12 @@ class ApplyKernel(Module):
             self.ready.eq(self.update_ack & self.state_ack)
         ]
 
+    @every_cycle
     def gen_selfcheck(self, tb):
         logger = logging.getLogger("sim.applykernel")
+        debug = logger.isEnabledFor(logging.DEBUG)
         num_pe = tb.config.addresslayout.num_pe
-        pe_id = [a.gatherapplykernel.applykernel for core in tb.cores for a in core.apply].index(self)
+        pe_id = self.pe_id
         level = 0
         num_cycles = 0
         num_messages_in = 0
@@ -68,7 +71,8 @@ class ApplyKernel(Module):
                     logger.info("{}: PE {} raised to level {}".format(num_cycles, pe_id, level))
                 else:
                     num_messages_out += 1
-                    logger.debug(str(num_cycles) + ": Node " + str((yield self.nodeid_out)) + " visited in round " + str(level) +". Parent: " + str((yield self.state_out.parent)))
+                    if debug:
+                        logger.debug(str(num_cycles) + ": Node " + str((yield self.nodeid_out)) + " visited in round " + str(level) +". Parent: " + str((yield self.state_out.parent)))
             yield
         logger.info("PE {}: {} cycles taken for {} supersteps. {} messages received, {} updates sent.".format(pe_id, num_cycles, level, num_messages_in, num_messages_out))
         logger.info("Average throughput: In: {:.1f} cycles/message Out: {:.1f} cycles/message".format(num_cycles/num_messages_in if num_messages_in!=0 else 0, num_cycles/num_messages_out if num_messages_out!=0 else 0))
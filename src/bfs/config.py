@@ -19,6 +19,9 @@ class Config(CoreConfig):
         self.applykernel = ApplyKernel
         self.scatterkernel = ScatterKernel
 
+        # gather only looks at the sender, so messages can also be pulled
+        self.has_pull_mode = True
+
         first_node = True
         for node in graph:
             if first_node:
@@ -1,5 +1,6 @@
 from migen import *
 from migen.genlib.record import *
+from tbsupport import every_cycle
 
 from bfs.interfaces import *
 
@@ -72,10 +73,12 @@ class GatherApplyKernel(Module):
             self.ready.eq(self.update_ack & self.state_ack)
         ]
 
+    @every_cycle
     def gen_selfcheck(self, tb):
         logger = logging.getLogger("sim.applykernel")
+        debug = logger.isEnabledFor(logging.DEBUG)
         num_pe = tb.config.addresslayout.num_pe
-        pe_id = [a.gatherapplykernel for core in tb.cores for a in core.apply].index(self)
+        pe_id = self.pe_id
         level = 0
         num_cycles = 0
         num_messages_in = 0
@@ -89,7 +92,8 @@ class GatherApplyKernel(Module):
                 num_messages_in += 1
             if (yield self.update_valid) and (yield self.update_ack) and not (yield self.barrier_out):
                 num_messages_out += 1
-                logger.debug(str(num_cycles) + ": Node " + str((yield self.nodeid_out)) + " visited in round " + str(level) +". Parent: " + str((yield self.state_out.parent)))
+                if debug:
+                    logger.debug(str(num_cycles) + ": Node " + str((yield self.nodeid_out)) + " visited in round " + str(level) +". Parent: " + str((yield self.state_out.parent)))
             yield
         logger.info("PE {}: {} cycles taken for {} supersteps. {} messages received, {} updates sent.".format(pe_id, num_cycles, level, num_messages_in, num_messages_out))
         logger.info("Average throughput: In: {:.1f} cycles/message Out: {:.1f} cycles/update".format(num_cycles/num_messages_in if num_messages_in!=0 else 0, num_cycles/num_messages_out if num_messages_out!=0 else 0))
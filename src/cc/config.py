@@ -22,3 +22,8 @@ class Config(CoreConfig):
             graph.node[node]['active'] = 1
 
         super().__init__(graph, node_storage_layout, update_layout, message_layout, **kwargs)
+
+    def init_mirror(self, graph, master, mirror):
+        # the mirror starts with the master's color and passes on what the
+        # master receives, the extra hop does not change the minimum
+        pass
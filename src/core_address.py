@@ -88,6 +88,25 @@ class AddressLayout:
 
         return adj_idx, adj_val
 
+    def start_vault(self, pe, num_vaults):
+        """Vault the first block of the adjacency lists of pe is placed in
+        with a vault_map layout, spread evenly over the vaults. Only that
+        block is placed, the lists after it run on sequentially through the
+        vaults."""
+        return (pe*num_vaults//self.num_pe) % num_vaults
+
+    def pad_to_vault(self, adj_val, vault, vault_map, bytes_per_edge, burst_bytes):
+        """Pad adj_val with zeros up to the next block of vault, with
+        vault_map = (number of vaults, bytes per block) the interleaving of
+        addresses over the vaults. Blocks are whole bursts, so bursts stay
+        aligned. Used once per PE, to place its first block; the lists that
+        follow are not placed."""
+        num_vaults, block_bytes = vault_map
+        assert block_bytes % burst_bytes == 0
+        block = -(-len(adj_val)*bytes_per_edge // block_bytes)
+        block += (vault - block) % num_vaults
+        adj_val.extend(0 for _ in range(block*block_bytes//bytes_per_edge - len(adj_val)))
+
     def generate_partition_flat(self, adj_dict, edges_per_burst=1, bytes_per_edge=4, graph=None):
         if hasattr(self, "edgedatasize"):
             edgedatasize = self.edgedatasize
@@ -133,7 +152,13 @@ class AddressLayout:
 
         return adj_idx, adj_val
 
-    def generate_partition_flat_inverted(self, adj_dict, edges_per_burst=1, bytes_per_edge=4, graph=None):
+    def generate_partition_flat_inverted(self, adj_dict, edges_per_burst=1, bytes_per_edge=4, graph=None, vault_map=None):
+        """As generate_partition_flat, for the inverted architecture: every
+        vertex has a list of its neighbors on each PE. These are interleaved by
+        vertex, so PEs walking their lists at the same time hit the same
+        blocks. With vault_map = (number of vaults, bytes per block) they are
+        grouped by PE instead, and the first block of each PE is placed in a
+        different vault (start_vault)."""
         if hasattr(self, "edgedatasize"):
             edgedatasize = self.edgedatasize
         else:
@@ -145,21 +170,30 @@ class AddressLayout:
 
         self.adj_val_entry_size_in_bytes = bytes_per_edge
 
+        sublists = []
         for node, neighbors in adj_dict.items():
             subneighbors = [list() for _ in range(self.num_pe)]
             for n in neighbors:
                 pe = self.pe_adr(n)
                 subneighbors[pe].append(n)
-            for pe in range(self.num_pe):
-                idx = len(adj_val)
-                n = len(subneighbors[pe])
-                adj_idx[pe][node] = (idx*bytes_per_edge, n)
-                if edgedatasize > 0:
-                    adj_val.extend([convert_record_to_int([('vtx', self.nodeidsize), ('data', edgedatasize)], vtx=v, data=convert_record_to_int(self.edge_storage_layout, **graph.get_edge_data(node, v))) for v in subneighbors[pe]])
-                else:
-                    adj_val.extend(subneighbors[pe])
-                if len(subneighbors[pe]) % edges_per_burst != 0:
-                    adj_val.extend(0 for _ in range(edges_per_burst-(len(subneighbors[pe]) % edges_per_burst)))
+            sublists.extend((node, pe, subneighbors[pe]) for pe in range(self.num_pe))
+        if vault_map:
+            sublists.sort(key=lambda x: x[1])
+
+        last_pe = None
+        for node, pe, pe_neighbors in sublists:
+            if vault_map and pe != last_pe:
+                self.pad_to_vault(adj_val, self.start_vault(pe, vault_map[0]), vault_map, bytes_per_edge, edges_per_burst*bytes_per_edge)
+                last_pe = pe
+            idx = len(adj_val)
+            n = len(pe_neighbors)
+            adj_idx[pe][node] = (idx*bytes_per_edge, n)
+            if edgedatasize > 0:
+                adj_val.extend([convert_record_to_int([('vtx', self.nodeidsize), ('data', edgedatasize)], vtx=v, data=convert_record_to_int(self.edge_storage_layout, **graph.get_edge_data(node, v))) for v in pe_neighbors])
+            else:
+                adj_val.extend(pe_neighbors)
+            if len(pe_neighbors) % edges_per_burst != 0:
+                adj_val.extend(0 for _ in range(edges_per_burst-(len(pe_neighbors) % edges_per_burst)))
         return adj_idx, adj_val
 
     def repack(self, l, wordsize, pcie_width):
@@ -7,7 +7,7 @@ from tbsupport import *
 
 from core_interfaces import ApplyInterface, ScatterInterface, Message
 from core_collision import CollisionDetector
-from hmc_backed_fifo import HMCBackedFIFO
+from hmc_backed_fifo import HMCBackedFIFO, SpillFIFO
 from core_gatherapply_wrapper import GatherApplyWrapper
 
 import logging
@@ -20,6 +20,13 @@ class Apply(Module):
         nodeidsize = addresslayout.nodeidsize
         num_nodes_per_pe = addresslayout.num_nodes_per_pe
         num_valid_nodes = max(2, len(config.adj_idx[pe_id])+1)
+        if config.capacity:
+            num_valid_nodes = num_nodes_per_pe
+            # number of vertices of the loaded graph, written by the host
+            self.num_local_nodes = Signal(max=num_nodes_per_pe+1)
+            last_node = self.num_local_nodes
+        else:
+            last_node = len(config.adj_idx[pe_id])
 
         # input Q interface
         self.apply_interface = ApplyInterface(name="apply_in", **addresslayout.get_params())
@@ -33,8 +40,8 @@ class Apply(Module):
 
         ####
 
-        apply_interface_in_fifo = InterfaceFIFO(layout=self.apply_interface.layout, depth=8, name="apply_in_fifo")
-        self.submodules += apply_interface_in_fifo
+        apply_interface_in_fifo = InterfaceFIFO(layout=self.apply_interface.layout, depth=config.fifo_depth("Apply.apply_interface_in_fifo", 8), name="apply_in_fifo")
+        self.submodules.apply_interface_in_fifo = apply_interface_in_fifo
         self.comb += self.apply_interface.connect(apply_interface_in_fifo.din)
 
         # local node data storage
@@ -144,7 +151,7 @@ class Apply(Module):
                 NextValue(valid2, 1),
                 NextValue(dest_node_id2, node_idx),
                 NextValue(node_idx, node_idx+1),
-                If(node_idx==(len(config.adj_idx[pe_id]) + (pe_id << log2_int(num_nodes_per_pe))),
+                If(node_idx==(last_node + (pe_id << log2_int(num_nodes_per_pe))),
                     NextValue(statevalid2, 0),
                     NextValue(barrier2, 1),
                     NextValue(valid2, 1),
@@ -187,9 +194,15 @@ class Apply(Module):
 
         # User code
         if hasattr(config, "gatherapplykernel"):
-            self.submodules.gatherapplykernel = config.gatherapplykernel(config)
+            self.submodules.gatherapplykernel = kernel = config.gatherapplykernel(config)
         else:
-            self.submodules.gatherapplykernel = GatherApplyWrapper(config.gatherkernel(config), config.applykernel(config))
+            kernel = config.applykernel(config)
+            self.submodules.gatherapplykernel = GatherApplyWrapper(config.gatherkernel(config), kernel)
+        # PE and vertex memory of the kernel, for its selfcheck
+        kernel.pe_id = pe_id
+        kernel.mem = self.mem
+        # kernel constants of the loaded graph, written by the host
+        self.host_registers = [getattr(kernel, name) for name in config.host_registers] if config.capacity else []
 
         self.comb += [
             self.gatherapplykernel.level_in.eq(self.level),
@@ -228,7 +241,16 @@ class Apply(Module):
         if config.updates_in_hmc:
             fpga_id = pe_id//config.addresslayout.num_pe_per_fpga
             local_pe_id = pe_id % config.addresslayout.num_pe_per_fpga
-            self.submodules.outfifo = HMCBackedFIFO(width=len(outfifo_in), start_addr=local_pe_id*(1<<config.hmc_fifo_bits), end_addr=(local_pe_id + 1)*(1<<config.hmc_fifo_bits), port=config.platform[fpga_id].getHMCPort(local_pe_id))
+            self.submodules.outfifo = HMCBackedFIFO(width=len(outfifo_in), start_addr=local_pe_id*(1<<config.hmc_fifo_bits), end_addr=(local_pe_id + 1)*(1<<config.hmc_fifo_bits), port=config.platform[fpga_id].getHMCPort(local_pe_id), burst_flits=config.updates_hmc_burst_flits)
+
+            self.sync += [
+                If(self.outfifo.full, self.deadlock.eq(1))
+            ]
+        elif config.updates_spill_depth:
+            fpga_id = pe_id//config.addresslayout.num_pe_per_fpga
+            local_pe_id = pe_id % config.addresslayout.num_pe_per_fpga
+            spill = HMCBackedFIFO(width=len(outfifo_in), start_addr=local_pe_id*(1<<config.hmc_fifo_bits), end_addr=(local_pe_id + 1)*(1<<config.hmc_fifo_bits), port=config.platform[fpga_id].getHMCPort(local_pe_id), burst_flits=config.updates_hmc_burst_flits)
+            self.submodules.outfifo = SpillFIFO(width=len(outfifo_in), depth=config.updates_spill_depth, backend=spill)
 
             self.sync += [
                 If(self.outfifo.full, self.deadlock.eq(1))
@@ -277,8 +299,31 @@ class Apply(Module):
         # send from fifo when receiver ready
         self.comb += self.outfifo.re.eq(self.scatter_interface.ack)
 
+    @every_cycle
+    def gen_selfcheck(self, tb):
+        logger = logging.getLogger('sim.apply')
+        max_level = 0
+        while not (yield tb.global_inactive):
+            if hasattr(self.outfifo, "level"):
+                max_level = max(max_level, (yield self.outfifo.level))
+            yield
+        if hasattr(self.outfifo, "max_level"):
+            max_level = (yield self.outfifo.max_level)
+        msg = "PE {}: max output queue occupancy {} of {} vertices".format(self.pe_id, max_level, len(tb.config.adj_idx[self.pe_id]))
+        if tb.config.updates_spill_depth:
+            msg += ", {} updates spilled past {} on-chip entries".format((yield self.outfifo.num_spilled), tb.config.updates_spill_depth)
+        logger.info(msg)
+        hmc = self.outfifo.backend if tb.config.updates_spill_depth else self.outfifo
+        if isinstance(hmc, HMCBackedFIFO):
+            num_hmc_writes, num_hmc_reads, active_cycles = (yield hmc.num_hmc_writes), (yield hmc.num_hmc_reads), (yield hmc.num_active_cycles)
+            logger.info("PE {}: output queue in HMC: {} writes, {} reads of {} bytes, {} updates passed on chip, {:.2f} bytes/cycle over {} cycles in use".format(self.pe_id, num_hmc_writes, num_hmc_reads, hmc.line_bytes, (yield hmc.num_bypassed), (num_hmc_writes + num_hmc_reads)*hmc.line_bytes/max(1, active_cycles), active_cycles))
+
     def gen_simulation(self, tb):
         logger = logging.getLogger('sim.apply')
+        if tb.config.capacity and not tb.config.sim_bus_load:
+            yield self.num_local_nodes.eq(len(tb.config.adj_idx[self.pe_id]))
+            for name, reg in zip(tb.config.host_registers, self.host_registers):
+                yield reg.eq(getattr(tb.config, name))
         while not (yield tb.global_inactive):
             yield
         if self.pe_id == 0:
@@ -286,9 +331,10 @@ class Apply(Module):
         for node in range(len(tb.config.adj_idx[self.pe_id])):
             vertexid = tb.config.addresslayout.global_adr(self.pe_id, node)
             if vertexid in tb.config.graph:
-                p = "{} (origin={}): ".format(vertexid, tb.config.graph.node[vertexid]["origin"])
-                state = convert_int_to_record((yield self.mem[node]), tb.config.addresslayout.node_storage_layout)
-                p += str(state)
+                p = "{} (origin={}): ".format(vertexid, tb.config.graph.node[vertexid].get("origin", vertexid))
+                if "master" in tb.config.graph.node[vertexid]:
+                    p = "{} (mirror of {}): ".format(vertexid, tb.config.graph.node[vertexid]["master"])
+                p += str(tb.config.final_state((yield self.mem[node])))
                 if vertexid < 32:
                     logger.info(p)
                 else:
@@ -16,8 +16,8 @@ class Barriercounter(Module):
         self.apply_interface_out = ApplyInterface(name="barriercounter_out", **config.addresslayout.get_params())
         self.round_accepting = Signal(config.addresslayout.channel_bits)
 
-        apply_interface_in_fifo = InterfaceFIFO(layout=self.apply_interface_in.layout, depth=2)
-        self.submodules += apply_interface_in_fifo
+        apply_interface_in_fifo = InterfaceFIFO(layout=self.apply_interface_in.layout, depth=config.fifo_depth("Barriercounter.apply_interface_in_fifo", 2))
+        self.submodules.apply_interface_in_fifo = apply_interface_in_fifo
         self.comb += self.apply_interface_in.connect(apply_interface_in_fifo.din)
 
         num_pe = config.addresslayout.num_pe
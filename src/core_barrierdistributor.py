@@ -8,7 +8,7 @@ class BarrierDistributor(Module):
         self.network_interface_in = NetworkInterface(name="barrierdistributor_in", **config.addresslayout.get_params())
         self.network_interface_out = NetworkInterface(name="barrierdistributor_out", **config.addresslayout.get_params())
 
-        self.submodules.fifo = InterfaceFIFO(layout=self.network_interface_in.layout, depth=8)
+        self.submodules.fifo = InterfaceFIFO(layout=self.network_interface_in.layout, depth=config.fifo_depth("BarrierDistributor.fifo", 8))
 
         self.comb += [
             self.network_interface_in.connect(self.fifo.din)
@@ -369,3 +369,21 @@ class BRAMIO(Module):
             ]
 
             start_addr = end_addr
+
+def image_writes(images, start_addr, word_offset, addr_spacing):
+    """-> list of (address, data) writes that fill the endpoints of a BRAMIO
+    with images (one list of words per endpoint, in the same order)."""
+    writes = []
+    for image in images:
+        writes.extend((start_addr + (addr << word_offset), data) for addr, data in enumerate(image))
+        start_addr += addr_spacing
+    return writes
+
+def write_image(filename, writes):
+    with open(filename, "w") as f:
+        for adr, data in writes:
+            f.write("{:x} {:x}\n".format(adr, data))
+
+def read_image(filename):
+    with open(filename) as f:
+        return [tuple(int(x, 16) for x in line.split()) for line in f if line.strip()]
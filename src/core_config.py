@@ -16,7 +16,11 @@ def max_edges_per_pe(adj_dict, num_pe, num_nodes_per_pe):
     return max(max_pe)
 
 class CoreConfig:
-    def __init__(self, graph, node_storage_layout, update_layout, message_layout, edge_storage_layout=None, has_edgedata=False, partition="random", partition_ufactor=1, memtype="BRAM", updates_in_hmc=False, inverted=False, filter=False, **kwargs):
+    # graph-dependent kernel constants (names of config attributes), written
+    # by the host into registers of the kernels of designs sized by capacity
+    host_registers = ()
+
+    def __init__(self, graph, node_storage_layout, update_layout, message_layout, edge_storage_layout=None, has_edgedata=False, partition="random", partition_ufactor=1, reorder="none", split_degree=0, memtype="BRAM", updates_in_hmc=False, inverted=False, filter=False, local_bypass=False, direction_optimizing=False, pull_alpha=14, pull_beta=24, capacity_nodes_per_pe=0, capacity_edges_per_pe=0, updates_spill_depth=0, updates_hmc_burst_flits=1, hmc_vault_map=None, **kwargs):
 
         logger = logging.getLogger('init')
 
@@ -27,9 +31,62 @@ class CoreConfig:
         if self.has_edgedata and (self.memtype == "HMC" or self.memtype == "DDR"):
             raise NotImplementedError
 
+        # memories sized for up to capacity_*_per_pe vertices and edges per PE
+        # instead of for this graph, which is then loaded at runtime
+        if bool(capacity_nodes_per_pe) != bool(capacity_edges_per_pe):
+            raise ValueError("capacity_nodes_per_pe and capacity_edges_per_pe must be given together")
+        self.capacity = bool(capacity_nodes_per_pe)
+        if self.capacity and (inverted or memtype != "BRAM"):
+            raise NotImplementedError("Capacity-sized export needs the non-inverted architecture and BRAM")
+
         self.updates_in_hmc = updates_in_hmc
+        # Apply output queue of this many entries on chip, overflowing into HMC
+        if updates_spill_depth and (inverted or updates_in_hmc):
+            raise NotImplementedError("updates_spill_depth needs the non-inverted architecture without updates_in_hmc")
+        self.updates_spill_depth = updates_spill_depth
+        # flits per HMC command of the HMC-backed update queue
+        self.updates_hmc_burst_flits = updates_hmc_burst_flits
+        # depth overrides for FIFOs, see fifo_depth
+        self.fifo_depths = {}
         self.filter = filter
 
+        if local_bypass and inverted:
+            logger.warning("local_bypass has no effect in the inverted architecture. Ignored.")
+            local_bypass = False
+        self.local_bypass = local_bypass
+
+        if direction_optimizing and not (inverted and memtype == "BRAM" and getattr(self, "has_pull_mode", False)):
+            logger.warning("direction_optimizing needs the inverted architecture, BRAM and an algorithm with a pull mode. Ignored.")
+            direction_optimizing = False
+        self.direction_optimizing = direction_optimizing
+
+        # (number of vaults, bytes per block) to lay out adjacency lists for
+        if hmc_vault_map and not (inverted and memtype in ("HMC", "HMCO")):
+            logger.warning("hmc_vault_map needs the inverted architecture and memtype HMC or HMCO. Ignored.")
+            hmc_vault_map = None
+        self.hmc_vault_map = hmc_vault_map
+        self.pull_alpha = pull_alpha
+        self.pull_beta = pull_beta
+
+        if reorder != "none":
+            logger.info("Reorder: {}".format(reorder))
+            graph = reorder_graph(graph, reorder)
+
+        self.mirrors = {}
+        if split_degree:
+            if inverted:
+                logger.warning("Vertex splitting is not supported in the inverted architecture. Ignored.")
+            elif not hasattr(self, "init_mirror"):
+                logger.warning("Algorithm {} does not support vertex splitting. Ignored.".format(self.name))
+            else:
+                graph, mirrors = split_high_degree(graph, split_degree)
+                for master in mirrors:
+                    for mirror in mirrors[master]:
+                        self.init_mirror(graph, master, mirror)
+                logger.info("Split {} vertices with more than {} edges into {} mirrors".format(len(mirrors), split_degree, sum(len(m) for m in mirrors.values())))
+                for node in graph:
+                    graph.node[node]['presplit_label'] = node
+
         logger.info("Partition: {}".format(partition))
         if partition == "metis":
             assert kwargs["num_fpga"] > 1
@@ -37,19 +94,43 @@ class CoreConfig:
         elif partition == "greedy":
 
             graph, num_nodes_per_pe = partition_greedyedge(graph, kwargs["num_pe"])
+        elif partition == "contiguous":
+            graph, num_nodes_per_pe = partition_contiguous(graph, kwargs["num_pe"])
         elif partition == "random" or partition == "robin":
             graph, num_nodes_per_pe = partition_random(graph, kwargs["num_pe"])
         else:
-            logger.warning("Unrecognized partition option {} (options: metis, greedy, robin). Using roundrobin.".format(partition))
+            logger.warning("Unrecognized partition option {} (options: metis, greedy, contiguous, robin). Using roundrobin.".format(partition))
             graph, num_nodes_per_pe = partition_random(graph, kwargs["num_pe"])
+        if self.capacity:
+            graph = relabel_capacity(graph, num_nodes_per_pe, 2**bits_for(capacity_nodes_per_pe))
+            num_nodes_per_pe = 2**bits_for(capacity_nodes_per_pe)
         kwargs["num_nodes_per_pe"] = num_nodes_per_pe
 
         self.graph = graph
         self.adj_dict = make_adj_dict(graph)
 
+        if 'mirrors' in graph.graph:
+            # partitioning relabeled the vertices, translate the mirror table
+            relabel_d = {}
+            for node in graph:
+                relabel_d[graph.node[node].pop('presplit_label')] = node
+            for node in graph:
+                if 'master' in graph.node[node]:
+                    graph.node[node]['master'] = relabel_d[graph.node[node]['master']]
+            self.mirrors = {relabel_d[master] : [relabel_d[m] for m in mirrors] for master, mirrors in graph.graph['mirrors'].items()}
+            graph.graph['mirrors'] = self.mirrors
+
         self.graph.graph['partition'] = partition
+        self.graph.graph['reorder'] = reorder
+
+        logger.info("Fraction of edges crossing PEs: {:.3f}".format(cross_pe_edge_fraction(graph, num_nodes_per_pe)))
 
-        if memtype == "BRAM":
+        if self.capacity:
+            edges = max_edges_per_pe(self.adj_dict, kwargs["num_pe"], kwargs["num_nodes_per_pe"])
+            if edges > capacity_edges_per_pe:
+                raise ValueError("Graph needs {} edges per PE, capacity is {}".format(edges, capacity_edges_per_pe))
+            kwargs["max_edges_per_pe"] = 2**bits_for(capacity_edges_per_pe)
+        elif memtype == "BRAM":
             kwargs["max_edges_per_pe"] = 2**bits_for(max_edges_per_pe(self.adj_dict, kwargs["num_pe"], kwargs["num_nodes_per_pe"]))
         else:
             kwargs["max_edges_per_pe"] = 2**bits_for(len(graph.edges()))
@@ -79,7 +160,7 @@ class CoreConfig:
         if inverted:
             if memtype == "HMC":
                 assert not self.has_edgedata
-                adj_idx, adj_val = self.addresslayout.generate_partition_flat_inverted(self.adj_dict, edges_per_burst=4)
+                adj_idx, adj_val = self.addresslayout.generate_partition_flat_inverted(self.adj_dict, edges_per_burst=4, vault_map=hmc_vault_map)
             elif memtype == "HMCO":
                 if self.has_edgedata:
                     edgedatasize = self.addresslayout.edgedatasize
@@ -91,7 +172,7 @@ class CoreConfig:
                 bytes_per_edge = vertex_size//8
                 edges_per_burst = 8*16//bytes_per_edge
                 print("vertex_size = {}, bytes_per_edge = {}, edges_per_burst = {}".format(vertex_size, bytes_per_edge, edges_per_burst))
-                adj_idx, adj_val = self.addresslayout.generate_partition_flat_inverted(self.adj_dict, edges_per_burst=edges_per_burst, bytes_per_edge=bytes_per_edge, graph=graph)
+                adj_idx, adj_val = self.addresslayout.generate_partition_flat_inverted(self.adj_dict, edges_per_burst=edges_per_burst, bytes_per_edge=bytes_per_edge, graph=graph, vault_map=hmc_vault_map)
             elif memtype == "AXI":
                 assert not self.has_edgedata
                 adj_idx, adj_val = self.addresslayout.generate_partition_flat_inverted(self.adj_dict, edges_per_burst=16)
@@ -120,6 +201,14 @@ class CoreConfig:
                 adj_idx, adj_val = self.addresslayout.generate_partition(self.adj_dict)
         self.adj_idx = adj_idx
         self.adj_val = adj_val
+
+        if self.direction_optimizing:
+            # pull mode walks the incoming edges of each local vertex
+            reverse_adj_dict = {node : [] for node in self.adj_dict}
+            for node, neighbors in self.adj_dict.items():
+                for n in neighbors:
+                    reverse_adj_dict[n].append(node)
+            self.pull_adj_idx, self.pull_adj_val = self.addresslayout.generate_partition(reverse_adj_dict)
         self.start_addr = (1<<34)
 
 
@@ -147,6 +236,44 @@ class CoreConfig:
         else:
             self.init_edgedata = []
 
+    def master_of(self, vertexid):
+        """Master of a mirror (see split_degree); any other vertex is its own
+        master."""
+        if vertexid in self.graph and 'master' in self.graph.node[vertexid]:
+            return self.graph.node[vertexid]['master']
+        return vertexid
+
+    def final_state(self, data):
+        """State record of a vertex read back from memory at the end of the
+        run. Algorithms with a merge_mirror(state) hook translate references
+        to mirrors back to their masters there."""
+        state = convert_int_to_record(data, self.addresslayout.node_storage_layout)
+        if self.mirrors and hasattr(self, "merge_mirror"):
+            self.merge_mirror(state)
+        return state
+
+    def fifo_depth(self, site, default):
+        """Depth of the FIFO at site ("Class.attribute" of the module that
+        owns it): the [fifo_depths] override of the configuration, if any."""
+        return self.fifo_depths.get(site.lower(), default)
+
+    def memory_images(self):
+        """Contents of the graph memories in the order the host loads them:
+        vertex data of every PE, then CSR index, CSR values and (if any) edge
+        data. Designs sized by capacity add the registers of every PE: vertex
+        count, then the host_registers."""
+        num_pe = self.addresslayout.num_pe
+        edgeidsize = self.addresslayout.edgeidsize
+        images = [self.init_nodedata[pe] if self.init_nodedata else [] for pe in range(num_pe)]
+        images.extend([length << edgeidsize | index for index, length in self.adj_idx[pe]] for pe in range(num_pe))
+        images.extend(self.adj_val[pe] for pe in range(num_pe))
+        if self.has_edgedata:
+            images.extend(self.init_edgedata[pe] for pe in range(num_pe))
+        if self.capacity:
+            images.extend([len(self.adj_idx[pe])] for pe in range(num_pe))
+            images.extend([getattr(self, name)] for pe in range(num_pe) for name in self.host_registers)
+        return images
+
     def summary(self):
         return "{}: {}inverted {} with {} using {} FPGA/{} PE dataset {} partition {}\n".format(
             datetime.datetime.now().strftime("%Y-%m-%d %H:%M"),
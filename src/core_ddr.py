@@ -7,7 +7,8 @@ from migen.genlib.fifo import *
 from util.mem import FullyInitMemory
 
 import logging
-import random
+
+from sim_dram import DRAMModel
 
 _ddr_layout = [
     ("arid", "ID_WIDTH", DIR_M_TO_S),
@@ -168,17 +169,17 @@ class DDRPortSharer(Module):
         logger = logging.getLogger("ddr_sim")
         edges_per_burst = len(self.real_port.rdata)//32
         burst_bytes = len(self.real_port.rdata)//8
-        inflight_requests = []
-        # ddr_requests_file = open("ddr_requests2.log", 'w')
-        # ddr_responses_file = open("ddr_responses2.log", 'w')
+        dram = DRAMModel(**getattr(self.config, "ddr_timing", {}))
+        stats_logged = False
+        now = 0
         yield self.real_port.rvalid.eq(0)
         while True:
-            yield self.real_port.arready.eq(random.choice([0,1]))
+            yield self.real_port.arready.eq(dram.can_accept())
             if (yield self.real_port.rready):
-                if inflight_requests and random.choice([True, False]):
-                    tag, addr = inflight_requests[0]
-                    inflight_requests.pop(0)
-                    logger.debug("Request: addr = {}, tag = {}".format(hex(addr), tag))
+                response = dram.response(now)
+                if response:
+                    tag, addr = response
+                    logger.debug("Request: addr = %#x, tag = %d", addr, tag)
                     assert(addr % burst_bytes == 0)
                     idx = addr // 4
                     data = 0
@@ -187,10 +188,12 @@ class DDRPortSharer(Module):
                     yield self.real_port.rdata.eq(data)
                     yield self.real_port.rid.eq(tag)
                     yield self.real_port.rvalid.eq(1)
-                    # ddr_requests_file.write("{:0=33b}\n".format(addr))
-                    # ddr_responses_file.write("{:0=512b}\n".format(data))
                 else:
                     yield self.real_port.rvalid.eq(0)
             yield
+            now += 1
             if (yield self.real_port.arready) and (yield self.real_port.arvalid):
-                inflight_requests.append(((yield self.real_port.arid), (yield self.real_port.araddr)))
+                dram.request(now, (yield self.real_port.arid), (yield self.real_port.araddr))
+            if not stats_logged and (yield tb.global_inactive):
+                dram.log_stats(logger)
+                stats_logged = True
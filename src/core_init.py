@@ -11,17 +11,20 @@ from graph_manage import *
 
 from importlib import import_module
 
+from tbsupport import MONITOR_LEVELS
+
 logger = logging.getLogger('config')
 
 def read_config_files(configfiles='config.ini'):
     config = configparser.ConfigParser()
-    config.read(configfiles)
+    # later files override earlier ones, e.g. config.ini,fifo_depths.ini
+    config.read(configfiles.split(","))
     return config
 
 def parse_cmd_args(args, cmd_choices):
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument('-c', '--config-file', dest='configfiles',
-                        help='filename containing configuration options')
+                        help='filename containing configuration options (comma separated for several, later ones take precedence)')
     parser.add_argument('-f', '--from-file', dest='graphfile',
                         help='filename containing graph')
     parser.add_argument('-n', '--nodes', type=int,
@@ -35,6 +38,19 @@ def parse_cmd_args(args, cmd_choices):
     parser.add_argument('--save-graph', dest='graphsave', help='save graph to a file')
     parser.add_argument('command', choices=cmd_choices, help="operation to perform")
     parser.add_argument('-o', '--output', help="output file name to save verilog export (valid with command 'export' only)")
+    parser.add_argument('--mem-init-files', dest='mem_init_files', action="store_true", help="write memory contents to $readmemh files next to the Verilog instead of inlining them (valid with command 'export' only)")
+    parser.add_argument('--export-cache', dest='export_cache', help="keep exported designs in this directory and reuse them when the design has not changed (valid with command 'export' only)")
+    parser.add_argument('-j', '--jobs', type=int, default=1, help="export the designs of several FPGAs in this many processes in parallel (valid with command 'export' only)")
+    parser.add_argument('--kernel-lib', dest='kernel_lib', help="export the kernels once into this library directory and instantiate them as black boxes in every PE (valid with command 'export' only)")
+    parser.add_argument('--device', default="xcku060", help="FPGA to check the resource estimate against (valid with command 'estimate' only)")
+    parser.add_argument('--suggest-num-pe', dest='suggest_num_pe', action="store_true", help="also search for the largest num_pe that fits on the device (valid with command 'estimate' only)")
+    parser.add_argument('--bus-load', dest='bus_load', action="store_true", help="load graph data through the host interface instead of initializing memories directly (valid with command 'sim' only)")
+    parser.add_argument('--checkpoint-every', dest='checkpoint_every', type=int, default=0, help="save the simulation state every N supersteps (valid with command 'sim' only)")
+    parser.add_argument('--restore', help="start the simulation from a saved checkpoint (valid with command 'sim' only)")
+    parser.add_argument('--stop-after', dest='stop_after', type=int, default=0, help="stop the simulation after N supersteps (valid with command 'sim' only)")
+    parser.add_argument('--fifo-profile', dest='fifo_profile', help="record FIFO occupancy and stalls and write recommended depths to this file (valid with command 'sim' only)")
+    parser.add_argument('--trace', help="record all messages sent into the network to this file (command 'sim'), or replay the messages recorded in it (command 'replay')")
+    parser.add_argument('--network', help="comma separated network modules to replay the trace on (valid with command 'replay' only)")
     return parser.parse_args(args)
 
 def init_parse(args=None, cmd_choices=("sim", "export"), inverted=None):
@@ -46,6 +62,15 @@ def init_parse(args=None, cmd_choices=("sim", "export"), inverted=None):
         config = read_config_files()
 
     args, algo_config = extract_args(args, config, inverted=inverted)
+    algo_config.export_mem_init_files = args.mem_init_files
+    algo_config.export_cache = os.path.abspath(args.export_cache) if args.export_cache else None
+    algo_config.export_jobs = args.jobs
+    algo_config.sim_bus_load = args.bus_load
+    algo_config.sim_checkpoint_every = args.checkpoint_every
+    algo_config.sim_restore = args.restore
+    algo_config.sim_stop_after = args.stop_after
+    algo_config.sim_trace = args.trace
+    algo_config.sim_fifo_profile = args.fifo_profile
 
     logger.info("Algorithm: " + algo_config.name)
     logger.info("Using memory: " + algo_config.memtype)
@@ -62,6 +87,11 @@ def init_parse(args=None, cmd_choices=("sim", "export"), inverted=None):
     if algo_config.memtype == "BRAM":
         logger.info("Edges per PE: {}".format([(pe, len(algo_config.adj_val[pe])) for pe in range(algo_config.addresslayout.num_pe)]))
 
+    if args.command == "export" and args.kernel_lib:
+        from sim_export_apply_scatter_kernels import use_kernel_library
+        kernel_files = use_kernel_library(algo_config, os.path.abspath(args.kernel_lib))
+        logger.info("Kernel netlists to add to the project: " + " ".join(kernel_files))
+
     return args, algo_config
 
 class ANSIColorFormatter(logging.Formatter):
@@ -233,6 +263,8 @@ def resolve_defaults(config, graphfile=None, num_nodes=None, num_edges=None, dig
 
     if kwargs["memtype"] == "HMC" and kwargs["updates_in_hmc"]:
         raise NotImplementedError("Can't use HMC for edges in 2-phase mode")
+    if kwargs["memtype"] == "HMC" and kwargs.get("updates_spill_depth"):
+        raise NotImplementedError("Can't use HMC for edges and for spilling updates")
 
     updates_in_hmc = kwargs["updates_in_hmc"] if "updates_in_hmc" in kwargs else False
 
@@ -248,9 +280,16 @@ def resolve_defaults(config, graphfile=None, num_nodes=None, num_edges=None, dig
     else:
         kwargs["partition"] = "robin"
 
+    kwargs["reorder"] = config['graph'].get('reorder', fallback="none")
+    kwargs["split_degree"] = config['graph'].getint('split_degree', fallback=0)
+
     if "peidsize" not in kwargs:
         kwargs["peidsize"] = bits_for(kwargs["num_pe"])
 
+    # roots of multi-source algorithms, as labeled in the graph file
+    if 'sources' in config['app']:
+        kwargs["sources"] = [s.strip() for s in config['app']['sources'].split(",")]
+
     algo_config_module = "{}.config".format(config['app']['algo'])
     algo = import_module(algo_config_module)
 
@@ -263,6 +302,56 @@ def resolve_defaults(config, graphfile=None, num_nodes=None, num_edges=None, dig
 
     algo_config.alt_adj_val_data_name = alt_adj_val_data_name
 
+    algo_config.export_mem_init_files = False
+    algo_config.export_cache = None
+    algo_config.export_jobs = 1
+    algo_config.sim_bus_load = False
+    algo_config.sim_checkpoint_every = 0
+    algo_config.sim_restore = None
+    algo_config.sim_stop_after = 0
+    algo_config.sim_trace = None
+    algo_config.sim_fifo_profile = None
+
+    algo_config.sim_monitor = config['logging'].get('monitor', fallback='full')
+    if algo_config.sim_monitor not in MONITOR_LEVELS:
+        raise ValueError("monitor must be one of {}".format(", ".join(MONITOR_LEVELS)))
+    algo_config.sim_monitor_interval = config['logging'].getint('monitor_interval', fallback=64)
+
+    if config.has_section('ddr'):
+        algo_config.ddr_timing = {k : config['ddr'].getint(k) for k in config['ddr']}
+    else:
+        algo_config.ddr_timing = {}
+
+    if config.has_section('cosim'):
+        algo_config.cosim = {k : config['cosim'].getint(k) for k in config['cosim']}
+    else:
+        algo_config.cosim = {}
+
+    if config.has_section('waveform'):
+        algo_config.waveform = dict(config['waveform'])
+    else:
+        algo_config.waveform = {}
+
+    algo_config.sim_network = {}
+    if sim and config.has_section('sim_network'):
+        algo_config.sim_network = {k : eval(config['sim_network'].get(k)) for k in config['sim_network']}
+
+    algo_config.hmc_timing = {}
+    if config.has_section('hmc'):
+        for k in config['hmc']:
+            try:
+                algo_config.hmc_timing[k] = eval(config['hmc'].get(k))
+            except NameError:
+                algo_config.hmc_timing[k] = config['hmc'].get(k)
+    if algo_config.hmc_timing and algo_config.hmc_vault_map:
+        # simulate the address map the adjacency lists were laid out for
+        num_vaults, block_bytes = algo_config.hmc_vault_map
+        if algo_config.hmc_timing.setdefault("num_vaults", num_vaults) != num_vaults or algo_config.hmc_timing.setdefault("block_bytes", block_bytes) != block_bytes:
+            logger.warning("[hmc] num_vaults and block_bytes differ from hmc_vault_map")
+
+    if config.has_section('fifo_depths'):
+        algo_config.fifo_depths = {k : config['fifo_depths'].getint(k) for k in config['fifo_depths']}
+
     algo_config.hmc_fifo_bits = 20 if sim else 32-bits_for(algo_config.addresslayout.num_pe-1)
 
     for pe in range(algo_config.addresslayout.num_pe):
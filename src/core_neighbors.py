@@ -6,6 +6,7 @@ from util.mem import FullyInitMemory
 import logging
 
 from core_interfaces import _neighbor_in_layout, _neighbor_out_layout
+from tbsupport import every_cycle
 
 class Neighbors(Module):
     def __init__(self, pe_id, config, port=None):
@@ -14,6 +15,7 @@ class Neighbors(Module):
         num_nodes_per_pe = config.addresslayout.num_nodes_per_pe
         edgeidsize = config.addresslayout.edgeidsize
         max_edges_per_pe = config.addresslayout.max_edges_per_pe
+        num_edges = max_edges_per_pe if config.capacity else len(config.adj_val[pe_id]) + 2
 
         # input
         self.neighbor_in = Record(set_layout_parameters(_neighbor_in_layout, **config.addresslayout.get_params()))
@@ -26,13 +28,13 @@ class Neighbors(Module):
 
         # adjacency list storage (second half of CSR storage, index comes from input)
         # val: array of nodeids
-        self.specials.mem_val = FullyInitMemory(nodeidsize, len(config.adj_val[pe_id]) + 2, name="edge_csr_val", init=config.adj_val[pe_id])
+        self.specials.mem_val = FullyInitMemory(nodeidsize, num_edges, name="edge_csr_val", init=config.adj_val[pe_id])
         # self.specials.mem_val = FullyInitMemory(nodeidsize, max_edges_per_pe, init=adj_val)
         self.specials.rd_port_val = rd_port_val = self.mem_val.get_port(has_re=True)
         self.specials.wr_port_val = self.mem_val.get_port(write_capable=True)
 
         if config.has_edgedata:
-            self.specials.mem_edge = FullyInitMemory(config.addresslayout.edgedatasize, len(config.adj_val[pe_id]) + 2, init=config.init_edgedata[pe_id])
+            self.specials.mem_edge = FullyInitMemory(config.addresslayout.edgedatasize, num_edges, init=config.init_edgedata[pe_id])
             self.specials.rd_port_edge = rd_port_edge = self.mem_edge.get_port(has_re=True)
             self.specials.wr_port_edge = self.mem_edge.get_port(write_capable=True)
 
@@ -105,8 +107,10 @@ class Neighbors(Module):
         ]
 
 
+    @every_cycle
     def gen_selfcheck(self, tb):
         logger = logging.getLogger('sim.get_neighbors' + str(self.pe_id))
+        debug = logger.isEnabledFor(logging.DEBUG)
         graph = tb.config.adj_dict
         curr_sender = 0
         to_be_sent = []
@@ -120,7 +124,8 @@ class Neighbors(Module):
             if (yield self.neighbor_out.valid) and (yield self.neighbor_out.ack):
                 num_mem_reads += 1
                 neighbor = (yield self.neighbor_out.neighbor)
-                logger.debug("{}: Edge {} -> {} read.{}".format(num_cycles, curr_sender, neighbor, " Edgedata: " + str((yield self.edgedata_out)) if tb.config.has_edgedata else ""))
+                if debug:
+                    logger.debug("{}: Edge {} -> {} read.{}".format(num_cycles, curr_sender, neighbor, " Edgedata: " + str((yield self.edgedata_out)) if tb.config.has_edgedata else ""))
                 if not neighbor in to_be_sent:
                     if not neighbor in graph[curr_sender]:
                         logger.warning("{}: sending message to node {} which is not a neighbor of {}!".format(num_cycles, neighbor, curr_sender))
@@ -15,6 +15,7 @@ _data_layout = [
 ]
 
 from core_interfaces import _neighbor_in_layout, _neighbor_out_layout
+from tbsupport import every_cycle
 
 class getAnswer(Module):
     def __init__(self, config, update_rd_port, answer_rd_port):
@@ -291,8 +292,10 @@ class Neighbors(Module):
             )
         ]
 
+    @every_cycle
     def gen_selfcheck(self, tb):
         logger = logging.getLogger("sim.get_neighbors" + str(self.pe_id))
+        debug = logger.isEnabledFor(logging.DEBUG)
         graph = tb.config.adj_dict
         to_be_sent = dict()
         level = 0
@@ -307,9 +310,9 @@ class Neighbors(Module):
             if (yield self.neighbor_out.valid) and (yield self.neighbor_out.ack):
                 neighbor = (yield self.neighbor_out.neighbor)
                 curr_sender = (yield self.neighbor_out.sender)
-                logger.debug("{}: Message from node {} for node {}".format(num_cycles, curr_sender, neighbor))
-                if tb.config.has_edgedata:
-                    logger.debug("Edgedata: " + str((yield self.edgedata_out)))
+                logger.debug("%d: Message from node %d for node %d", num_cycles, curr_sender, neighbor)
+                if debug and tb.config.has_edgedata:
+                    logger.debug("Edgedata: %d", (yield self.edgedata_out))
                 if (not curr_sender in to_be_sent) or (not neighbor in to_be_sent[curr_sender]):
                     if not neighbor in graph[curr_sender]:
                         logger.warning("{}: sending message to node {} which is not a neighbor of {}!".format(num_cycles, neighbor, curr_sender))
@@ -319,7 +322,7 @@ class Neighbors(Module):
                     to_be_sent[curr_sender].remove(neighbor)
             if (yield self.neighbor_in.valid) and (yield self.neighbor_in.ack):
                 curr_sender = (yield self.neighbor_in.sender)
-                logger.debug("request for neighbors of node {}".format(curr_sender))
+                logger.debug("request for neighbors of node %d", curr_sender)
                 if not curr_sender in graph:
                     logger.warning("{}: invalid sender ({})".format(num_cycles, curr_sender))
                 else:
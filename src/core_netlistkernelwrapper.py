@@ -17,7 +17,6 @@ class NetlistGatherKernelWrapper(Module):
     def __init__(self, config):
         interfaces = import_module("{}.interfaces".format(config.name))
 
-        self.level_in = Signal(32)
         self.nodeid_in = Signal(config.addresslayout.nodeidsize)
         self.sender_in = Signal(config.addresslayout.nodeidsize)
         self.message_in = Record(set_layout_parameters(interfaces.message_layout, **config.addresslayout.get_params()))
@@ -34,7 +33,6 @@ class NetlistGatherKernelWrapper(Module):
         signals["i_sys_clk"] = ClockSignal()
         # signals["i_sys_rst"] = ResetSignal()
 
-        signals["i_level_in"] = self.level_in
         signals["i_nodeid_in"] = self.nodeid_in
         signals["i_sender_in"] = self.sender_in
         _add_fields(signals, self.message_in, "i")
@@ -53,6 +51,7 @@ class NetlistApplyKernelWrapper(Module):
     def __init__(self, config):
         interfaces = import_module("{}.interfaces".format(config.name))
 
+        self.level_in = Signal(32)
         self.nodeid_in = Signal(config.addresslayout.nodeidsize)
         self.state_in = Record(set_layout_parameters(interfaces.node_storage_layout, **config.addresslayout.get_params()))
         self.state_in_valid = Signal()
@@ -81,6 +80,7 @@ class NetlistApplyKernelWrapper(Module):
         signals["i_sys_clk"] = ClockSignal()
         # signals["i_sys_rst"] = ResetSignal()
 
+        signals["i_level_in"] = self.level_in
         signals["i_nodeid_in"] = self.nodeid_in
         _add_fields(signals, self.state_in, "i")
         signals["i_state_in_valid"] = self.state_in_valid
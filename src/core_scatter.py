@@ -36,7 +36,7 @@ class Scatter(Module):
 
         # CSR edge storage: (idx, val) tuple of arrays
         # idx: array of (start_adr, num_neighbors)
-        self.specials.mem_idx = FullyInitMemory(edgeidsize*2, max(2, len(config.adj_idx[pe_id])), name="edge_csr_idx", init=_pack_adj_idx(config.adj_idx[pe_id]))
+        self.specials.mem_idx = FullyInitMemory(edgeidsize*2, addresslayout.num_nodes_per_pe if config.capacity else max(2, len(config.adj_idx[pe_id])), name="edge_csr_idx", init=_pack_adj_idx(config.adj_idx[pe_id]))
         self.specials.rd_port_idx = rd_port_idx = self.mem_idx.get_port(has_re=True)
         self.specials.wr_port_idx = wr_port_idx = self.mem_idx.get_port(write_capable=True)
 
@@ -106,8 +106,9 @@ class Scatter(Module):
         # user modification based on edge data
 
         self.submodules.scatterkernel = config.scatterkernel(config)
+        self.scatterkernel.pe_id = pe_id
 
-        self.submodules.neighbor_out_fifo = InterfaceFIFO(layout=self.get_neighbors.neighbor_out.layout+([("edgedata", len(self.get_neighbors.edgedata_out), DIR_M_TO_S)] if config.has_edgedata else []), depth=8)
+        self.submodules.neighbor_out_fifo = InterfaceFIFO(layout=self.get_neighbors.neighbor_out.layout+([("edgedata", len(self.get_neighbors.edgedata_out), DIR_M_TO_S)] if config.has_edgedata else []), depth=config.fifo_depth("Scatter.neighbor_out_fifo", 8))
 
 
         self.comb += [
@@ -134,7 +135,7 @@ class Scatter(Module):
 
         self.submodules.barrierdistributor = BarrierDistributor(config)
 
-        self.submodules.scatterkerneloutfifo = InterfaceFIFO(layout=self.barrierdistributor.network_interface_in.layout, depth=8)
+        self.submodules.scatterkerneloutfifo = InterfaceFIFO(layout=self.barrierdistributor.network_interface_in.layout, depth=config.fifo_depth("Scatter.scatterkerneloutfifo", 8))
 
         self.comb += [
             self.scatterkerneloutfifo.din.msg.dest_id.eq(self.scatterkernel.neighbor_out),
@@ -149,11 +150,33 @@ class Scatter(Module):
         ]
 
         # buffer output
-        self.submodules.outfifo = InterfaceFIFO(layout=self.network_interface.layout, depth=8)
+        self.submodules.outfifo = InterfaceFIFO(layout=self.network_interface.layout, depth=config.fifo_depth("Scatter.outfifo", 8))
 
-        self.comb += [
-            self.barrierdistributor.network_interface_out.connect(self.outfifo.din),
-            self.outfifo.dout.connect(self.network_interface)
-        ]
+        if config.local_bypass:
+            # messages for vertices on this PE skip the network and go straight
+            # to the arbiter of this PE; barriers still take the network so the
+            # barriercounter sees the same message counts as before
+            self.local_interface = NetworkInterface(name="scatter_local_out", **addresslayout.get_params())
+            self.submodules.localfifo = InterfaceFIFO(layout=self.network_interface.layout, depth=config.fifo_depth("Scatter.localfifo", 8))
+
+            is_local = Signal()
+            self.comb += [
+                is_local.eq(~self.barrierdistributor.network_interface_out.msg.barrier & (self.barrierdistributor.network_interface_out.dest_pe == pe_id)),
+                self.barrierdistributor.network_interface_out.connect(self.outfifo.din, self.localfifo.din, omit={"valid", "ack"}),
+                self.outfifo.din.valid.eq(self.barrierdistributor.network_interface_out.valid & ~is_local),
+                self.localfifo.din.valid.eq(self.barrierdistributor.network_interface_out.valid & is_local),
+                If(is_local,
+                    self.barrierdistributor.network_interface_out.ack.eq(self.localfifo.din.ack)
+                ).Else(
+                    self.barrierdistributor.network_interface_out.ack.eq(self.outfifo.din.ack)
+                ),
+                self.localfifo.dout.connect(self.local_interface),
+                self.outfifo.dout.connect(self.network_interface)
+            ]
+        else:
+            self.comb += [
+                self.barrierdistributor.network_interface_out.connect(self.outfifo.din),
+                self.outfifo.dout.connect(self.network_interface)
+            ]
 
         self.total_num_messages = self.barrierdistributor.total_num_messages
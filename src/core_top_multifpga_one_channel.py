@@ -4,6 +4,7 @@ from migen.genlib.roundrobin import *
 from migen.genlib.cdc import *
 from migen.genlib.coding import PriorityEncoder
 from tbsupport import *
+from sim_waveform import simulate
 
 from functools import reduce
 from operator import and_, or_
@@ -249,13 +250,10 @@ def sim(config):
 
     generators = []
 
-    for core in tb.cores:
-        generators.extend([core.gen_barrier_monitor(tb)])
-
-    generators.extend(get_simulators(tb, 'gen_selfcheck', tb))
+    generators.extend(get_monitors(tb, config, tb.cores))
     generators.extend(get_simulators(tb, 'gen_simulation', tb))
 
-    run_simulation(tb, generators, vcd_name="tb.vcd")
+    simulate(tb, generators, config, "tb.vcd", levels=[a.level for core in tb.cores for a in core.apply])
 
 def export_one(config, filename='top.v'):
     assert not config.use_ddr
@@ -264,7 +262,8 @@ def export_one(config, filename='top.v'):
 
     verilog.convert(m,
                     name="top",
-                    ios={m.start, m.done, m.cycle_count}
+                    ios={m.start, m.done, m.cycle_count},
+                    special_overrides=get_special_overrides(config)
                     ).write(filename)
 
 def export(config, filename='top'):
@@ -296,7 +295,8 @@ def export(config, filename='top'):
 
             verilog.convert(m[i],
                             name="top",
-                            ios=ios
+                            ios=ios,
+                            special_overrides=get_special_overrides(config)
                             ).write(iname + ".v")
 
     if config.use_ddr:
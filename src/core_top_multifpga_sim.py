@@ -7,14 +7,20 @@ from migen.genlib.cdc import *
 from migen.genlib.fifo import *
 from migen.fhdl.decorators import ClockDomainsRenamer
 from tbsupport import *
+from sim_waveform import simulate
+from sim_trace import get_trace_generators
+from sim_fifo_profile import get_fifo_profilers
 
-from functools import reduce
-from operator import and_
+from functools import reduce, partial
+from operator import and_, or_
 
 import logging
 import random
 
 from core_init import init_parse
+from export_cache import convert_cached
+from sim_checkpoint import get_checkpoint_generators, SimulationStopped
+from sim_cosim import CoSim
 
 from util.recordfifo import *
 from core_interfaces import *
@@ -34,9 +40,9 @@ class Core(Module):
         num_nodes = len(config.adj_dict)
 
         self.submodules.network = Network(config, pe_start, pe_end)
-        self.submodules.apply = [Apply(config, i, config.init_nodedata[i] if config.init_nodedata else None) for i in range(pe_start, pe_end)]
+        self.submodules.apply = [Apply(config, i) for i in range(pe_start, pe_end)]
 
-        self.submodules.scatter = [Scatter(i, config, adj_mat=(config.adj_idx[i], config.adj_val[i])) for i in range(pe_start, pe_end)]
+        self.submodules.scatter = [Scatter(i, config) for i in range(pe_start, pe_end)]
 
         # connect within PEs
         self.comb += [self.apply[i].scatter_interface.connect(self.scatter[i].scatter_interface) for i in range(num_local_pe)]
@@ -49,16 +55,9 @@ class Core(Module):
         self.global_inactive = Signal()
         self.comb += self.global_inactive.eq(reduce(and_, [pe.inactive for pe in self.apply]))
 
+        # the initial vertices are active in the vertex data, a barrier starts the first round
         start_message = [a.start_message for a in self.network.arbiter]
-        layout = Message(**config.addresslayout.get_params()).layout
-        initdata = []
-        for i in range(pe_start, pe_end):
-            initdata.append([convert_record_to_int(layout, barrier=0, roundpar=config.addresslayout.num_channels-1, dest_id=msg['dest_id'], sender=msg['sender'], payload=msg['payload'], halt=0) for msg in config.init_messages[i]])
-        for i in initdata:
-            i.append(convert_record_to_int(layout, barrier=1, roundpar=config.addresslayout.num_channels-1))
-        initfifos = [RecordFIFO(layout=layout, depth=len(ini)+1, init=ini, name="initfifo_"+str(i)) for i, ini in enumerate(initdata)]
-
-        self.submodules += initfifos
+        injected = [Signal() for i in range(num_local_pe)]
 
         self.start = Signal()
         init = Signal()
@@ -66,23 +65,24 @@ class Core(Module):
         self.cycle_count = Signal(64)
 
         self.sync += [
-            init.eq(reduce(or_, [i.readable for i in initfifos]))
+            init.eq(self.start & ~reduce(and_, injected))
         ]
 
         self.comb += [
             self.done.eq(~init & self.global_inactive)
         ]
 
-        for i, initfifo in enumerate(initfifos):
+        for i in range(num_local_pe):
             self.comb += [
                 start_message[i].select.eq(init),
-                start_message[i].msg.eq(initfifo.dout),
-                start_message[i].valid.eq(initfifo.readable & self.start),
-                initfifo.re.eq(start_message[i].ack & self.start)
+                start_message[i].msg.barrier.eq(1),
+                start_message[i].msg.roundpar.eq(config.addresslayout.num_channels-1),
+                start_message[i].valid.eq(~injected[i])
             ]
 
         self.sync += [
-            If(init,
+            [If(start_message[i].ack, injected[i].eq(1)) for i in range(num_local_pe)],
+            If(~reduce(and_, injected),
                 self.cycle_count.eq(0)
             ).Elif(~self.global_inactive,
                 self.cycle_count.eq(self.cycle_count + 1)
@@ -97,7 +97,7 @@ class Core(Module):
         self.level = self.apply[0].level
 
         self.kernel_error = Signal()
-        self.comb += self.kernel_error.eq(reduce(or_, (a.applykernel.kernel_error for a in self.apply)))
+        self.comb += self.kernel_error.eq(reduce(or_, (a.gatherapplykernel.kernel_error for a in self.apply)))
 
     def gen_barrier_monitor(self, tb):
         logger = logging.getLogger('sim.barriermonitor')
@@ -111,9 +111,9 @@ class Core(Module):
                 if ((yield a.apply_interface.valid) and (yield a.apply_interface.ack)):
                     if (yield a.apply_interface.msg.barrier):
                         logger.debug(str(num_cycles) + ": Barrier enters Apply on PE " + str(a.pe_id))
-                if (yield a.gatherkernel.valid_in) and (yield a.gatherkernel.ready):
-                    if ((yield a.level) - 1) % self.config.addresslayout.num_channels != (yield a.roundpar):
-                        logger.warning("{}: received message's parity ({}) does not match current round ({})".format(num_cycles, (yield a.roundpar), (yield a.level)))
+                if (yield a.gatherapplykernel.valid_in) and (yield a.gatherapplykernel.ready):
+                    if (yield a.level) % self.config.addresslayout.num_channels != (yield a.gatherapplykernel.round_in):
+                        logger.warning("{}: received message's parity ({}) does not match current round ({})".format(num_cycles, (yield a.gatherapplykernel.round_in), (yield a.level)))
                 if ((yield a.scatter_interface.barrier) and (yield a.scatter_interface.valid) and (yield a.scatter_interface.ack)):
                     logger.debug(str(num_cycles) + ": Barrier exits Apply on PE " + str(a.pe_id))
             for s in self.scatter:
@@ -203,64 +203,88 @@ class UnCore(Module):
 def sim(config):
 
     tb = UnCore(config)
+    levels = [a.level for core in tb.cores for a in core.apply]
 
     generators = []
 
-    for core in tb.cores:
-        generators.extend([core.gen_barrier_monitor(tb)])
-
-    generators.extend(get_simulators(tb, 'gen_selfcheck', tb))
+    generators.extend(get_monitors(tb, config, tb.cores))
+    generators.extend(get_fifo_profilers(tb, config))
+    generators.extend(get_trace_generators(tb, config, [s for core in tb.cores for s in core.scatter]))
     generators.extend(get_simulators(tb, 'gen_simulation', tb))
+    generators.extend(get_checkpoint_generators(tb, config, levels))
+
+    try:
+        simulate(tb, generators, config, "{}.vcd".format(config.vcdname) if config.vcdname else None, levels=levels)
+    except SimulationStopped:
+        pass
+
+def cosim(config):
+    num_pe_per_fpga = config.addresslayout.num_pe_per_fpga
+
+    def make_core(fpga_id):
+        return Core(config, fpga_id*num_pe_per_fpga, min((fpga_id+1)*num_pe_per_fpga, config.addresslayout.num_pe))
+
+    def out_route(fpga_id, channel, dest_pe):
+        return dest_pe//num_pe_per_fpga, channel
 
-    run_simulation(tb, generators, vcd_name="tb.vcd")
+    CoSim(config, make_core, out_route, num_in=config.addresslayout.num_channels, interface=NetworkInterface, **config.cosim).run()
 
 def export_one(config, filename='top.v'):
 
-    m = UnCore(config)
-    verilog.convert(m,
-                    name="echo",
-                    ios={m.start, m.done, m.cycle_count}
-                    ).write(filename)
+    def build():
+        m = UnCore(config)
+        return m, {m.start, m.done, m.cycle_count}
+
+    convert_cached(config, build, filename,
+                   key="core_top_multifpga_sim one",
+                   name="echo",
+                   special_overrides=get_special_overrides(config)
+                   )
 
 def export(config, filename='top'):
 
-    m = [Core(config, i*config.addresslayout.num_pe_per_fpga, min((i+1)*config.addresslayout.num_pe_per_fpga, config.addresslayout.num_pe)) for i in range(config.addresslayout.num_fpga)]
+    def build(i):
+        m = Core(config, i*config.addresslayout.num_pe_per_fpga, min((i+1)*config.addresslayout.num_pe_per_fpga, config.addresslayout.num_pe))
 
-    for i in range(config.addresslayout.num_fpga):
-        iname = filename + "_" + str(i)
-        os.makedirs(iname, exist_ok=True)
-        with cd(iname):
+        ios={m.start, m.done, m.cycle_count, m.total_num_messages, m.level, m.kernel_error}
 
-            ios={m[i].start, m[i].done, m[i].cycle_count, m[i].total_num_messages, m[i].level, m[i].kernel_error}
+        for j in range(config.addresslayout.num_channels):
+            ios |= set(m.network.external_network_interface_in[j].flatten())
+            ios |= set(m.network.external_network_interface_out[j].flatten())
 
-            for j in range(config.addresslayout.num_channels):
-                ios |= set(m[i].network.external_network_interface_in[j].flatten())
-                ios |= set(m[i].network.external_network_interface_out[j].flatten())
+        # debug signals
+        for a in m.network.arbiter:
+            ios.add(a.barriercounter.all_messages_recvd)
+            ios.add(a.barriercounter.all_barriers_recvd)
+            # ios |= set(a.barriercounter.barrier_from_pe)
+            # ios |= set(a.barriercounter.num_from_pe)
+            # ios |= set(a.barriercounter.num_expected_from_pe)
+        ios.add(m.network.local_network_round)
 
-            # debug signals
-            for a in m[i].network.arbiter:
-                ios.add(a.barriercounter.all_messages_recvd)
-                ios.add(a.barriercounter.all_barriers_recvd)
-                # ios |= set(a.barriercounter.barrier_from_pe)
-                # ios |= set(a.barriercounter.num_from_pe)
-                # ios |= set(a.barriercounter.num_expected_from_pe)
-            ios.add(m[i].network.local_network_round)
+        return m, ios
 
-            verilog.convert(m[i],
-                            name="top",
-                            ios=ios
-                            ).write(iname + ".v")
+    def export_fpga(i):
+        iname = filename + "_" + str(i)
+        os.makedirs(iname, exist_ok=True)
+        with cd(iname):
+            convert_cached(config, lambda: build(i), iname + ".v",
+                           key="core_top_multifpga_sim fpga {}".format(i),
+                           name="top",
+                           special_overrides=get_special_overrides(config)
+                           )
+
+    run_parallel([partial(export_fpga, i) for i in range(config.addresslayout.num_fpga)], config.export_jobs)
 
 def export_async(config, filename='top'):
     print("Adding async FIFOs to external network interfaces")
 
-    m = [Core(config, i*config.addresslayout.num_pe_per_fpga, min((i+1)*config.addresslayout.num_pe_per_fpga, config.addresslayout.num_pe)) for i in range(config.addresslayout.num_fpga)]
+    def build(i):
+        core = Core(config, i*config.addresslayout.num_pe_per_fpga, min((i+1)*config.addresslayout.num_pe_per_fpga, config.addresslayout.num_pe))
 
-    for core in m:
         core.clock_domains.cd_sys = ClockDomain(reset_less=True)
         core.clock_domains.cd_ext = ClockDomain(reset_less=True)
-        core.submodules.asyncfifos_in = [ ClockDomainsRenamer({"write":"ext", "read":"sys"}) (AsyncFIFOBuffered(width=layout_len(core.network.external_network_interface_in[j].layout), depth=16)) for j in range(config.addresslayout.num_channels)]
-        core.submodules.asyncfifos_out = [ ClockDomainsRenamer({"write":"sys", "read":"ext"}) (AsyncFIFOBuffered(width=layout_len(core.network.external_network_interface_in[j].layout), depth=16)) for j in range(config.addresslayout.num_channels)]
+        core.submodules.asyncfifos_in = [ ClockDomainsRenamer({"write":"ext", "read":"sys"}) (AsyncFIFOBuffered(width=layout_len(core.network.external_network_interface_in[j].layout), depth=config.fifo_depth("Core.asyncfifos_in", 16))) for j in range(config.addresslayout.num_channels)]
+        core.submodules.asyncfifos_out = [ ClockDomainsRenamer({"write":"sys", "read":"ext"}) (AsyncFIFOBuffered(width=layout_len(core.network.external_network_interface_in[j].layout), depth=config.fifo_depth("Core.asyncfifos_out", 16))) for j in range(config.addresslayout.num_channels)]
         core.external_network_interface_in = [NetworkInterface(name="ext_network_in", **config.addresslayout.get_params()) for _ in range(config.addresslayout.num_channels)]
         core.external_network_interface_out = [NetworkInterface(name="ext_network_out", **config.addresslayout.get_params()) for _ in range(config.addresslayout.num_channels)]
         for j in range(config.addresslayout.num_channels):
@@ -285,41 +309,46 @@ def export_async(config, filename='top'):
                 core.asyncfifos_out[j].re.eq(core.external_network_interface_out[j].ack)
             ]
 
+        ios={core.start, core.done, core.cycle_count, core.total_num_messages, core.level, core.kernel_error, core.cd_sys.clk, core.cd_ext.clk}
+
+        for j in range(config.addresslayout.num_channels):
+            ios |= set(core.external_network_interface_in[j].flatten())
+            ios |= set(core.external_network_interface_out[j].flatten())
+
+        # debug signals
+        for a in core.network.arbiter:
+            ios.add(a.barriercounter.all_messages_recvd)
+            ios.add(a.barriercounter.all_barriers_recvd)
+            # ios |= set(a.barriercounter.barrier_from_pe)
+            # ios |= set(a.barriercounter.num_from_pe)
+            # ios |= set(a.barriercounter.num_expected_from_pe)
+        ios.add(core.network.local_network_round)
 
+        return core, ios
 
-    for i in range(config.addresslayout.num_fpga):
+    def export_fpga(i):
         iname = filename + "_" + str(i)
         os.makedirs(iname, exist_ok=True)
         with cd(iname):
+            convert_cached(config, lambda: build(i), iname + ".v",
+                           key="core_top_multifpga_sim async fpga {}".format(i),
+                           name="top",
+                           special_overrides=get_special_overrides(config)
+                           )
 
-            ios={m[i].start, m[i].done, m[i].cycle_count, m[i].total_num_messages, m[i].level, m[i].kernel_error, m[i].cd_sys.clk, m[i].cd_ext.clk}
-
-            for j in range(config.addresslayout.num_channels):
-                ios |= set(m[i].external_network_interface_in[j].flatten())
-                ios |= set(m[i].external_network_interface_out[j].flatten())
-
-            # debug signals
-            for a in m[i].network.arbiter:
-                ios.add(a.barriercounter.all_messages_recvd)
-                ios.add(a.barriercounter.all_barriers_recvd)
-                # ios |= set(a.barriercounter.barrier_from_pe)
-                # ios |= set(a.barriercounter.num_from_pe)
-                # ios |= set(a.barriercounter.num_expected_from_pe)
-            ios.add(m[i].network.local_network_round)
-
-            verilog.convert(m[i],
-                            name="top",
-                            ios=ios
-                            ).write(iname + ".v")
+    run_parallel([partial(export_fpga, i) for i in range(config.addresslayout.num_fpga)], config.export_jobs)
 
 def main():
-    args, config = init_parse()
+    args, config = init_parse(cmd_choices=("sim", "cosim", "export"))
 
     logger = logging.getLogger('config')
 
     if args.command=='sim':
         logger.info("Starting Simulation")
         sim(config)
+    if args.command=='cosim':
+        logger.info("Starting Co-Simulation")
+        cosim(config)
     if args.command=='export_one':
         filename = "top.v"
         if args.output:
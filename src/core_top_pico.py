@@ -1,5 +1,8 @@
 from migen import *
 from tbsupport import *
+from sim_waveform import simulate
+from sim_trace import get_trace_generators
+from sim_fifo_profile import get_fifo_profilers
 from migen.fhdl import verilog
 import migen.build.xilinx.common
 from migen.genlib.resetsync import AsyncResetSynchronizer
@@ -8,12 +11,15 @@ from migen.genlib.fifo import AsyncFIFO
 
 import logging
 
-from functools import reduce
+from functools import reduce, partial
 from operator import or_, and_
 
 from util.pico import PicoPlatform
 
 from core_init import init_parse
+from export_cache import convert_cached
+from resource_estimate import estimate, format_report, largest_num_pe
+from sim_hmc import use_hmc_model
 
 from util.recordfifo import RecordFIFO
 from core_interfaces import Message, ApplyInterface
@@ -60,7 +66,10 @@ class Core(Module):
             from core_apply import Apply
             from core_scatter import Scatter
             from fifo_network import Network, MultiNetwork
-            if config.addresslayout.num_fpga == 1:
+            if config.sim_network:
+                from sim_network import Network
+                self.submodules.network = Network(config, fpga_id)
+            elif config.addresslayout.num_fpga == 1:
                 self.submodules.network = Network(config)
             else:
                 self.submodules.network = MultiNetwork(config, fpga_id)
@@ -71,6 +80,8 @@ class Core(Module):
             # connect to network
             self.comb += [self.network.apply_interface[i].connect(self.apply[i].apply_interface) for i in range(num_local_pe)]
             self.comb += [self.scatter[i].network_interface.connect(self.network.network_interface[i]) for i in range(num_local_pe)]
+            if config.local_bypass:
+                self.comb += [self.scatter[i].local_interface.connect(self.network.local_interface[i]) for i in range(num_local_pe)]
 
         # state of calculation
         self.global_inactive = Signal()
@@ -398,48 +409,76 @@ class SimTB(Module):
         logger.info("Total number of messages: {}".format((yield self.total_num_messages)))
         logger.info("Kernel error: {}".format((yield self.kernel_error)))
 
+def num_hmc_ports(config):
+    """HMC ports of each FPGA: one per PE, for its adjacency lists or its
+    updates; none if everything is in BRAM."""
+    if config.memtype == "BRAM" and not (config.updates_in_hmc or config.updates_spill_depth):
+        return 0
+    return config.addresslayout.num_pe_per_fpga
+
 def export(config, filename='top'):
     logger = logging.getLogger('config')
-    config.platform = [PicoPlatform(0 if config.memtype == "BRAM" else config.addresslayout.num_pe_per_fpga, create_hmc_ios=True, bus_width=32, stream_width=128) for _ in range(config.addresslayout.num_fpga)]
-
-    m = [Top(config, i) for i in range(config.addresslayout.num_fpga)]
+    config.platform = [PicoPlatform(num_hmc_ports(config), create_hmc_ios=True, bus_width=32, stream_width=128) for _ in range(config.addresslayout.num_fpga)]
 
     logger.info("Exporting design to files {0}[0-{1}]/{0}.v".format(filename, config.addresslayout.num_fpga - 1))
 
-    for i in range(config.addresslayout.num_fpga):
+    def export_fpga(i):
         iname = filename + "_" + str(i)
         os.makedirs(iname, exist_ok=True)
         with cd(iname):
-            verilog.convert(m[i],
-                            name=filename,
-                            ios=config.platform[i].get_ios()
-                            ).write(filename + ".v")
+            convert_cached(config, lambda: (Top(config, i), config.platform[i].get_ios()), filename + ".v",
+                           key="core_top_pico fpga {}".format(i),
+                           name=filename,
+                           special_overrides=get_special_overrides(config)
+                           )
+
+    run_parallel([partial(export_fpga, i) for i in range(config.addresslayout.num_fpga)], config.export_jobs)
     if config.memtype != "BRAM":
         export_data(config.adj_val, "adj_val.data", data_size=config.addresslayout.adj_val_entry_size_in_bytes*8, backup=config.alt_adj_val_data_name)
 
+def estimate_resources(config, args):
+    logger = logging.getLogger('config')
+
+    def design(config):
+        config.platform = [PicoPlatform(num_hmc_ports(config), create_hmc_ios=True, bus_width=32, stream_width=128) for _ in range(config.addresslayout.num_fpga)]
+        return [Top(config, i) for i in range(config.addresslayout.num_fpga)]
+
+    for i, m in enumerate(design(config)):
+        print("FPGA {}".format(i))
+        print(format_report(estimate(m, args.device), args.device))
+    if args.suggest_num_pe:
+        num_pe = largest_num_pe(args, design, num_fpga=config.addresslayout.num_fpga, device=args.device)
+        logger.info("Largest num_pe that fits on {} {}: {}".format(config.addresslayout.num_fpga, args.device, num_pe))
+
 def sim(config):
-    config.platform = [PicoPlatform(0 if config.memtype == "BRAM" else config.addresslayout.num_pe_per_fpga, create_hmc_ios=True, bus_width=32, stream_width=128, init=(config.adj_val if config.memtype != "BRAM" else []), init_elem_size_bytes=config.addresslayout.adj_val_entry_size_in_bytes) for _ in range(config.addresslayout.num_fpga)]
+    config.platform = [PicoPlatform(num_hmc_ports(config), create_hmc_ios=True, bus_width=32, stream_width=128, init=(config.adj_val if config.memtype != "BRAM" else []), init_elem_size_bytes=config.addresslayout.adj_val_entry_size_in_bytes) for _ in range(config.addresslayout.num_fpga)]
 
     tb = SimTB(config)
     tb.submodules += [p.logic for p in config.platform]
 
+    if config.hmc_timing:
+        for p in config.platform:
+            use_hmc_model(p, num_hmc_ports(config), config, tb=tb)
+
     generators = config.platform[0].getSimGenerators()
     for i in range(1, len(config.platform)):
         g = config.platform[i].getSimGenerators()
         for cd in generators:
             generators[cd].extend(g[cd])
 
-    generators["sys"].extend([core.gen_barrier_monitor(tb) for core in tb.cores])
-    generators["sys"].extend(get_simulators(tb, 'gen_selfcheck', tb))
+    generators["sys"].extend(get_monitors(tb, config, tb.cores))
+    generators["sys"].extend(get_fifo_profilers(tb, config))
+    if not config.inverted:
+        generators["sys"].extend(get_trace_generators(tb, config, [s for core in tb.cores for s in core.scatter]))
     generators["sys"].extend(get_simulators(tb, 'gen_simulation', tb))
 
     # generators.extend([a.gen_stats(tb) for a in tb.apply])
     # generators.extend([tb.gen_network_stats()])
-    run_simulation(tb, generators, clocks={"sys": 10, "bus": 480, "stream": 8}, vcd_name="{}.vcd".format(config.vcdname))
+    simulate(tb, generators, config, "{}.vcd".format(config.vcdname) if config.vcdname else None, levels=[a.level for core in tb.cores for a in core.apply], clocks={"sys": 10, "bus": 480, "stream": 8})
 
 
 def main():
-    args, config = init_parse(cmd_choices=("sim", "export"))
+    args, config = init_parse(cmd_choices=("sim", "export", "estimate"))
 
     logger = logging.getLogger('config')
 
@@ -451,6 +490,8 @@ def main():
         if args.output:
             filename = args.output
         export(config, filename=filename)
+    elif args.command=='estimate':
+        estimate_resources(config, args)
     else:
         logger.error("Unrecognized command")
         raise NotImplementedError
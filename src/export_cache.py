@@ -0,0 +1,97 @@
+from migen.fhdl import verilog
+from tbsupport import cd
+
+import hashlib
+import shutil
+import logging
+import inspect
+import os
+
+# graph contents, only part of the design if it is not sized by capacity
+_graph_data = ("graph", "adj_dict", "adj_idx", "adj_val", "init_nodedata", "init_edgedata", "pull_adj_idx", "pull_adj_val", "mirrors")
+# simulation settings and per-run names, never part of the design
+_not_hardware = ("platform", "vcdname", "alt_adj_val_data_name", "cosim", "waveform", "sim_network", "hmc_timing", "ddr_timing", "export_cache", "export_jobs")
+
+_src_dir = os.path.dirname(os.path.abspath(__file__))
+
+def _stable_repr(x):
+    if inspect.isclass(x) or inspect.isfunction(x):
+        return "{}.{}".format(x.__module__, x.__qualname__)
+    if isinstance(x, dict):
+        return "{" + ", ".join("{}: {}".format(_stable_repr(k), _stable_repr(v)) for k, v in sorted(x.items(), key=lambda kv: repr(kv[0]))) + "}"
+    if isinstance(x, (list, tuple)):
+        return "[" + ", ".join(_stable_repr(v) for v in x) + "]"
+    if isinstance(x, (str, int, float, bool, type(None))):
+        return repr(x)
+    return type(x).__name__
+
+def source_files(config):
+    """Python files the design can be built from: those of this repository
+    except tests and other algorithms than the one of config. Modules are
+    also imported while the design is built, so the loaded ones are not
+    enough."""
+    algo = type(config).__module__.split(".")[0]
+    files = []
+    for dirpath, dirnames, filenames in os.walk(_src_dir):
+        dirnames[:] = sorted(d for d in dirnames if dirpath != _src_dir or d == algo or not os.path.exists(os.path.join(dirpath, d, "config.py")))
+        files.extend(os.path.join(dirpath, f) for f in sorted(filenames) if f.endswith(".py") and not f.startswith("unittest_"))
+    return files
+
+def design_key(config, key="", **kwargs):
+    """Hash of everything that determines the Verilog of one converted design:
+    the architecture parameters of config, the source files, `key` (which
+    design of the export) and the arguments to verilog.convert."""
+    h = hashlib.sha256()
+    h.update(key.encode())
+    h.update(_stable_repr(kwargs).encode())
+    h.update(_stable_repr(config.addresslayout.get_params()).encode())
+    for k, v in sorted(vars(config).items()):
+        if k in _not_hardware or k.startswith("sim_") or k == "addresslayout":
+            continue
+        if k in _graph_data or k in config.host_registers:
+            if config.capacity:
+                continue
+            h.update(k.encode())
+            h.update(repr(v if k != "graph" else (sorted(v.nodes(data=True)), sorted(v.edges()))).encode())
+        else:
+            h.update("{}={}".format(k, _stable_repr(v)).encode())
+    for filename in source_files(config):
+        h.update(os.path.relpath(filename, _src_dir).encode())
+        with open(filename, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def convert_cached(config, build, filename, key="", **kwargs):
+    """verilog.convert(m, ios=ios, **kwargs).write(filename) with m, ios from
+    build(). If config.export_cache is a directory, the output (Verilog and
+    data files) is kept there and an export with the same design key copies
+    it instead of building and converting the design again."""
+    logger = logging.getLogger('export')
+    if not getattr(config, "export_cache", None):
+        m, ios = build()
+        verilog.convert(m, ios=ios, **kwargs).write(filename)
+        return
+
+    entry = os.path.join(config.export_cache, design_key(config, key, **kwargs))
+    if os.path.isdir(entry):
+        logger.info("Reusing {} for {} from export cache".format(os.path.basename(entry)[:12], filename))
+    else:
+        logger.info("Converting {} (not in export cache)".format(filename))
+        m, ios = build()
+        output = verilog.convert(m, ios=ios, **kwargs)
+        tmp = entry + ".tmp{}".format(os.getpid())
+        os.makedirs(os.path.join(tmp, "data"), exist_ok=True)
+        with cd(tmp):
+            output.write("main.v")
+        for data_filename in output.data_files:
+            os.replace(os.path.join(tmp, data_filename), os.path.join(tmp, "data", data_filename))
+        # only complete entries are ever found
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # stored by someone else in the meantime
+            shutil.rmtree(tmp)
+
+    shutil.copyfile(os.path.join(entry, "main.v"), filename)
+    for data_filename in os.listdir(os.path.join(entry, "data")):
+        shutil.copyfile(os.path.join(entry, "data", data_filename), data_filename)
@@ -10,6 +10,7 @@ import math
 from util.recordfifo import *
 from core_interfaces import *
 from core_barriercounter import Barriercounter
+from tbsupport import every_cycle
 
 class Arbiter(Module):
     def __init__(self, pe_id, config):
@@ -43,6 +44,7 @@ class Arbiter(Module):
             ).Else(
                 self.barriercounter.apply_interface_out.connect(self.apply_interface_out)
             )
+    @every_cycle
     def gen_selfcheck(self, tb):
         logger = logging.getLogger("sim.arbiter" + str(self.pe_id))
         level = 0
@@ -117,7 +119,7 @@ class MuxTree(Module):
             raise ValueError("in_array should not be empty")
 
         mux_factor = 6
-        self.submodules.fifo = InterfaceFIFO(layout=in_array[0].layout, depth=fifo_depth)
+        self.submodules.fifo = InterfaceFIFO(layout=in_array[0].layout, depth=config.fifo_depth("MuxTree.fifo", fifo_depth))
         self.current_round = Signal(config.addresslayout.channel_bits)
 
         if len(in_array) == 1:
@@ -194,13 +196,21 @@ class Network(Module):
         self.apply_interface = [ApplyInterface(name="network_out", **config.addresslayout.get_params()) for _ in range(num_pe)]
         self.network_interface = [NetworkInterface(name="network_in", **config.addresslayout.get_params()) for _ in range(num_pe)]
 
-        fifos = [[InterfaceFIFO(layout=self.apply_interface[0].layout, depth=fifo_depth) for i in range(num_pe)] for j in range(num_pe)]
+        fifos = [[InterfaceFIFO(layout=self.apply_interface[0].layout, depth=config.fifo_depth("Network.fifos", fifo_depth)) for i in range(num_pe)] for j in range(num_pe)]
 
         self.submodules.fifos = fifos
 
         self.submodules.arbiter = [Arbiter(sink, config) for sink in range(num_pe)]
 
-        self.submodules.muxtree = [SimpleRoundrobin(config, [fifos[sink][source].dout for source in range(num_pe)], self.arbiter[sink].apply_interface_in) for sink in range(num_pe)]
+        if config.local_bypass:
+            # PE-local messages enter next to the crossbar output, in front of the arbiter
+            self.local_interface = [NetworkInterface(name="network_local_in", **config.addresslayout.get_params()) for _ in range(num_pe)]
+            crossbar_out = [ApplyInterface(name="crossbar_out", **config.addresslayout.get_params()) for _ in range(num_pe)]
+            self.submodules.muxtree = [SimpleRoundrobin(config, [fifos[sink][source].dout for source in range(num_pe)], crossbar_out[sink]) for sink in range(num_pe)]
+            self.submodules.localmux = [SimpleRoundrobin(config, [self.local_interface[sink], crossbar_out[sink]], self.arbiter[sink].apply_interface_in) for sink in range(num_pe)]
+            self.comb += [self.localmux[sink].current_round.eq(self.arbiter[sink].current_round) for sink in range(num_pe)]
+        else:
+            self.submodules.muxtree = [SimpleRoundrobin(config, [fifos[sink][source].dout for source in range(num_pe)], self.arbiter[sink].apply_interface_in) for sink in range(num_pe)]
 
         # connect PE incoming ports
         for sink in range(num_pe):
@@ -240,9 +250,9 @@ class MultiNetwork(Module):
 
         self.submodules.arbiter = [Arbiter(sink, config) for sink in range(num_local_pe)]
 
-        self.submodules.per_fpga_fifos = [[InterfaceFIFO(layout=self.network_interface[0].layout, depth=fifo_depth, name="ext_link_{}_{}".format(start_pe+source, sink)) for sink in range(num_fpga)] for source in range(num_local_pe)]
+        self.submodules.per_fpga_fifos = [[InterfaceFIFO(layout=self.network_interface[0].layout, depth=config.fifo_depth("MultiNetwork.per_fpga_fifos", fifo_depth), name="ext_link_{}_{}".format(start_pe+source, sink)) for sink in range(num_fpga)] for source in range(num_local_pe)]
 
-        self.submodules.fifos = [[InterfaceFIFO(layout=self.network_interface[0].layout, depth=fifo_depth, name="link_{}_{}".format(start_pe+source, start_pe+sink)) for sink in range(num_local_pe)] for source in range(num_local_pe + num_fpga - 1)]
+        self.submodules.fifos = [[InterfaceFIFO(layout=self.network_interface[0].layout, depth=config.fifo_depth("MultiNetwork.fifos", fifo_depth), name="link_{}_{}".format(start_pe+source, start_pe+sink)) for sink in range(num_local_pe)] for source in range(num_local_pe + num_fpga - 1)]
 
         # Synchronization
         # After the local PEs all switch to the next round, the last messages
@@ -283,9 +293,15 @@ class MultiNetwork(Module):
 
         self.submodules.muxtree = [MuxTree(config, [self.fifos[source][sink].dout for source in range(num_local_pe + num_fpga - 1)], fifo_depth=fifo_depth) for sink in range(num_local_pe)]
 
+        if config.local_bypass:
+            self.local_interface = [NetworkInterface(name="network_local_in", **config.addresslayout.get_params()) for _ in range(num_local_pe)]
+            self.submodules.localmux = [SimpleRoundrobin(config, [self.local_interface[sink], self.muxtree[sink].interface_out], self.arbiter[sink].apply_interface_in) for sink in range(num_local_pe)]
+            self.comb += [self.localmux[sink].current_round.eq(self.arbiter[sink].current_round) for sink in range(num_local_pe)]
+        else:
+            self.comb += [self.muxtree[sink].interface_out.connect(self.arbiter[sink].apply_interface_in, omit={'dest_pe', 'broadcast'}) for sink in range(num_local_pe)]
+
         for sink in range(num_local_pe):
             self.comb += [
-                self.muxtree[sink].interface_out.connect(self.arbiter[sink].apply_interface_in, omit={'dest_pe', 'broadcast'}),
                 self.muxtree[sink].current_round.eq(self.arbiter[sink].current_round),
                 self.arbiter[sink].apply_interface_out.connect(self.apply_interface[sink])
             ]
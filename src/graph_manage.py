@@ -1,7 +1,7 @@
 
 import networkx as nx
 import random_connected_graph
-from migen import bits_for
+from migen import bits_for, log2_int
 import logging
 import os
 import numpy
@@ -96,6 +96,16 @@ def relabel_with_parts(g, parts):
     log_stats(g)
     return g, 2**peid_offset
 
+def relabel_capacity(g, num_nodes_per_pe, capacity):
+    """Keep the partition of g, but with `capacity` local addresses per PE
+    instead of num_nodes_per_pe."""
+    if num_nodes_per_pe > capacity:
+        raise ValueError("Graph needs {} vertices per PE, capacity is {}".format(num_nodes_per_pe, capacity))
+    old = log2_int(num_nodes_per_pe)
+    new = log2_int(capacity)
+    relabel_d = {n : ((n >> old) << new) | (n & (num_nodes_per_pe - 1)) for n in g.nodes()}
+    return nx.relabel_nodes(g, relabel_d)
+
 def partition_metis(g, fpga, pe, ufactor=1):
     import nxmetis
     logger.debug("Dividing into {} partitions, ufactor: {}".format(fpga, ufactor))
@@ -148,6 +158,110 @@ def partition_greedyedge(g, pe):
     parts = _partition_greedy(g, pe, g.nodes())
     return relabel_with_parts(g, parts)
 
+def partition_contiguous(g, pe):
+    # split the vertex order into consecutive runs of roughly equal edge count
+    total = sum(g.degree(n) for n in g.nodes())
+    parts = [[] for _ in range(pe)]
+    idx = 0
+    acc = 0
+    for n in g.nodes():
+        if idx < pe - 1 and acc >= total*(idx + 1)/pe:
+            idx += 1
+        parts[idx].append(n)
+        acc += g.degree(n)
+    return relabel_with_parts(g, parts)
+
+def _order_degree(g):
+    return sorted(g.nodes(), key=lambda n: g.degree(n), reverse=True)
+
+def _order_bfs(g):
+    ug = g.to_undirected(as_view=True)
+    order = []
+    visited = set()
+    for root in _order_degree(g):
+        if root in visited:
+            continue
+        visited.add(root)
+        order.append(root)
+        for _, v in nx.bfs_edges(ug, root):
+            visited.add(v)
+            order.append(v)
+    return order
+
+def _order_rcm(g):
+    ug = g.to_undirected()
+    return list(nx.utils.reverse_cuthill_mckee_ordering(ug))
+
+def _order_community(g):
+    ug = g.to_undirected()
+    communities = sorted(nx.algorithms.community.label_propagation_communities(ug), key=len, reverse=True)
+    order = []
+    for c in communities:
+        order.extend(_order_bfs(g.subgraph(c)))
+    return order
+
+_reorder_methods = {
+    "degree" : _order_degree,
+    "bfs" : _order_bfs,
+    "rcm" : _order_rcm,
+    "community" : _order_community
+}
+
+def reorder_graph(g, method):
+    if method == "none":
+        return g
+    if method not in _reorder_methods:
+        logger.warning("Unrecognized reorder option {} (options: none, {}). Not reordering.".format(method, ", ".join(_reorder_methods)))
+        return g
+    order = _reorder_methods[method](g)
+    assert len(order) == nx.number_of_nodes(g)
+
+    # keep the original label so results can be mapped back after relabeling
+    for n in g.nodes():
+        if 'origin' not in g.node[n]:
+            g.node[n]['origin'] = n
+
+    relabel_d = {n : i for i, n in enumerate(order)}
+    h = nx.DiGraph()
+    h.graph.update(g.graph)
+    h.add_nodes_from((relabel_d[n], g.node[n]) for n in order)
+    h.add_edges_from((relabel_d[u], relabel_d[v], d) for u, v, d in g.edges(data=True))
+    h.graph['reorder'] = method
+    logger.debug("Reordered vertices ({})".format(method))
+    return h
+
+def split_high_degree(g, max_degree):
+    """Split vertices with more than max_degree outgoing edges into a master
+    and mirrors. The master keeps the first slice of its edges and sends to
+    its mirrors, each mirror takes over one of the remaining slices.
+    Returns the graph and a dict master -> list of mirrors."""
+    mirrors = {}
+    next_id = max(g.nodes()) + 1
+    for v in [n for n in g.nodes() if g.out_degree(n) > max_degree]:
+        edges = list(g.out_edges(v, data=True))
+        mirrors[v] = []
+        for start in range(max_degree, len(edges), max_degree):
+            m = next_id
+            next_id += 1
+            g.add_node(m, **g.node[v])
+            g.node[m]['master'] = v
+            for _, u, d in edges[start:start+max_degree]:
+                g.remove_edge(v, u)
+                g.add_edge(m, u, **d)
+            g.add_edge(v, m)
+            mirrors[v].append(m)
+        logger.debug("Split vertex {} (degree {}) into {} mirrors".format(v, len(edges), len(mirrors[v])))
+    g.graph['mirrors'] = mirrors
+    return g, mirrors
+
+def cross_pe_edge_fraction(g, num_nodes_per_pe):
+    num_edges = nx.number_of_edges(g)
+    if num_edges == 0:
+        return 0.0
+    shift = log2_int(num_nodes_per_pe)
+    crossing = sum(1 for u, v in g.edges() if (u >> shift) != (v >> shift))
+    return crossing/num_edges
+
 def make_adj_dict(g):
     d = {}
     for node in g:
@@ -7,9 +7,20 @@ from util.pico import *
 from util.mem import FullyInitMemory
 
 class HMCBackedFIFO(Module):
-    def __init__(self, width, start_addr, end_addr, port):
-        self.submodules.port = HMCPortWriteUnifier(port)
-        assert width <= len(self.port.rd_data)
+    """FIFO stored in the region start_addr to end_addr of an HMC port.
+
+    Entries are packed into lines of burst_flits flits (as many entries per
+    flit as fit) and each line is written and read back with one command,
+    so the HMC sees full bursts instead of one command per entry. Lines are
+    read ahead into a reorder buffer with one slot per tag. While nothing
+    is in HMC, entries are passed directly from the write side to dout;
+    partial lines never go to HMC. Read responses are expected to return
+    the flits of one command back to back."""
+    def __init__(self, width, start_addr, end_addr, port, burst_flits=1):
+        self.port = port
+        flit_width = len(port.rd_data)
+        assert width <= flit_width
+        assert burst_flits in (1, 2, 4, 8)
         print("Using memory region {:x} to {:x}".format(start_addr, end_addr))
 
         self.din = Signal(width)
@@ -21,112 +32,276 @@ class HMCBackedFIFO(Module):
         self.re = Signal()
 
         self.full = Signal()
+        self.level = Signal(32)
+
+        # statistics
         self.num_writes = Signal(32)
         self.num_reads = Signal(32)
         self.max_level = Signal(32)
+        self.num_bypassed = Signal(32)
+        self.num_hmc_writes = Signal(32)
+        self.num_hmc_reads = Signal(32)
+        self.num_active_cycles = Signal(32)
 
-        word_offset = log2_int(len(self.port.rd_data)) - 3
+        entries_per_flit = 2**((flit_width//width).bit_length() - 1)
+        entry_width = flit_width//entries_per_flit
+        entries_per_line = entries_per_flit*burst_flits
+        self.line_bytes = burst_flits*flit_width//8
+        line_offset = log2_int(self.line_bytes)
 
-        # storage area
-        word_start_addr = start_addr >> word_offset
-        word_end_addr = end_addr >> word_offset
-        mem_area_size = word_end_addr - word_start_addr
-        rd_ptr = Signal(len(self.port.addr)-word_offset)
-        wr_ptr = Signal(len(self.port.addr)-word_offset)
-        level = Signal(max=mem_area_size+1)
+        # storage area, in lines
+        line_start_addr = start_addr >> line_offset
+        mem_area_size = (end_addr >> line_offset) - line_start_addr
+        rd_ptr = Signal(max=mem_area_size)
+        wr_ptr = Signal(max=mem_area_size)
+        hmc_level = Signal(max=mem_area_size+1)
 
+        # tags: one per reorder buffer slot, line n uses slot n mod num_tags
+        tag_sz = port.effective_max_tag_size - 1
+        num_tags = min(2**tag_sz, mem_area_size)
+        assert mem_area_size % num_tags == 0
+        tag_in_use = Array(Signal() for _ in range(num_tags))
+        rd_tag = Signal(max=num_tags)
+        wr_tag = Signal(max=num_tags)
         self.comb += [
-            self.full.eq(level == mem_area_size)
+            rd_tag.eq(rd_ptr[:log2_int(num_tags)]),
+            wr_tag.eq(wr_ptr[:log2_int(num_tags)])
+        ]
+
+        pushed = Signal()
+        popped = Signal()
+        self.comb += [
+            pushed.eq(self.writable & self.we),
+            popped.eq(self.readable & self.re),
+            self.full.eq(hmc_level == mem_area_size)
         ]
         self.sync += [
-            If(self.writable & self.we,
+            If(pushed & ~popped,
+                self.level.eq(self.level + 1)
+            ).Elif(popped & ~pushed,
+                self.level.eq(self.level - 1)
+            ),
+            If(pushed,
                 self.num_writes.eq(self.num_writes + 1)
             ),
-            If(self.readable & self.re,
+            If(popped,
                 self.num_reads.eq(self.num_reads + 1)
             ),
-            If(level > self.max_level,
-                self.max_level.eq(level)
+            If(self.level > self.max_level,
+                self.max_level.eq(self.level)
+            ),
+            If(self.level != 0,
+                self.num_active_cycles.eq(self.num_active_cycles + 1)
             )
         ]
 
-        # tags
-        tag_sz = self.port.effective_max_tag_size - 1
-        num_tags = min(2**tag_sz, mem_area_size)
-        self.tag_in_use = Array(Signal() for _ in range(num_tags))
-        tag = Signal(self.port.effective_max_tag_size - 1)
-        self.comb += tag.eq(self.port.addr[word_offset:word_offset+tag_sz])
+        # write side: entries wait here until a full line is assembled
+        self.submodules.writebuffer = writebuffer = SyncFIFO(width=width, depth=2*entries_per_line)
+        line = Signal(entries_per_line*entry_width)
+        line_level = Signal(max=entries_per_line+1)
+        send_buffer = Signal(entries_per_line*entry_width)
+        sending = Signal()
+        send_flit = Signal(max=max(2, burst_flits))
 
-        # reorder buffer for returned results
-        self.specials.reorder_buffer = FullyInitMemory(width, num_tags)
+        # read side: lines returned from HMC, consumed entry by entry
+        self.specials.reorder_buffer = FullyInitMemory(flit_width, num_tags*burst_flits)
         self.specials.wr_port = wr_port = self.reorder_buffer.get_port(write_capable=True, mode=READ_FIRST)
         self.specials.rd_port = rd_port = self.reorder_buffer.get_port(async_read=True, mode=READ_FIRST)
         reorderbuffer_valid = Array(Signal() for _ in range(num_tags))
-        reorder_rd_ptr = Signal(len(rd_port.adr))
+        reorder_rd_ptr = Signal(max=num_tags)
+        reorder_rd_entry = Signal(max=max(2, entries_per_line))
+        response_flit = Signal(max=max(2, burst_flits))
+        num_rd_inflight = Signal(max=num_tags+1)
 
-        # enforce ordering of accesses to same memory address
-        no_hazard = Signal()
-        self.comb += no_hazard.eq(~self.tag_in_use[tag])
+        # everything older than the write buffer has been read out
+        bypass = Signal()
+        assemble = Signal()
+        self.comb += [
+            bypass.eq((hmc_level == 0) & (num_rd_inflight == 0) & ~reorderbuffer_valid[reorder_rd_ptr] & (line_level == 0)),
+            assemble.eq((line_level != entries_per_line) & ((line_level != 0) | ((writebuffer.level >= entries_per_line) & ~(bypass & self.re)))),
+            writebuffer.din.eq(self.din),
+            writebuffer.we.eq(self.we),
+            self.writable.eq(writebuffer.writable),
+            writebuffer.re.eq(assemble | (bypass & self.re))
+        ]
+        self.sync += [
+            If(assemble,
+                Case(line_level, {i: line[i*entry_width:(i+1)*entry_width].eq(writebuffer.dout) for i in range(entries_per_line)}),
+                line_level.eq(line_level + 1)
+            ),
+            If(bypass & popped,
+                self.num_bypassed.eq(self.num_bypassed + 1)
+            )
+        ]
 
-        # choose read or write; only one port so no simultaneous access
+        # choose read or write, taking turns if both are possible
+        want_rd = Signal()
+        want_wr = Signal()
         do_rd = Signal()
-        self.sync += do_rd.eq(~do_rd & (level > 0) & ~reorderbuffer_valid[rd_ptr[word_offset:word_offset+tag_sz]] & ~self.tag_in_use[rd_ptr[word_offset:word_offset+tag_sz]]) # read if (a) there is something to read (b) the place to store the return value is free and (c) not going to be filled by an in-flight read
+        prefer_rd = Signal()
+        rd_issued = Signal()
+        rd_returned = Signal()
+        self.comb += [
+            want_rd.eq((hmc_level != 0) & ~reorderbuffer_valid[rd_tag] & ~tag_in_use[rd_tag]),
+            want_wr.eq((line_level == entries_per_line) & ~sending & ~self.full & ~tag_in_use[wr_tag]),
+            do_rd.eq(want_rd & (~want_wr | prefer_rd)),
+            rd_issued.eq(port.cmd_ready & port.cmd_valid & do_rd),
+            rd_returned.eq(port.rd_data_valid & port.rd_data_tag[0] & (response_flit == burst_flits - 1))
+        ]
 
         # issue commands
         self.comb += [
             If(do_rd,
-                self.port.cmd.eq(port.HMC_CMD_RD),
-                self.port.addr[word_offset:].eq(word_start_addr + rd_ptr),
-                self.port.cmd_valid.eq(no_hazard),
-                self.writable.eq(0)
-            ).Elif(~self.full,
-                self.port.cmd.eq(port.HMC_CMD_WR_NP),
-                self.port.addr[word_offset:].eq(word_start_addr + wr_ptr),
-                self.port.cmd_valid.eq(self.we & no_hazard),
-                self.writable.eq(no_hazard & self.port.cmd_ready)
+                port.cmd.eq(port.HMC_CMD_RD),
+                port.addr[line_offset:].eq(line_start_addr + rd_ptr),
+                port.tag.eq(Cat(1, rd_tag))
             ).Else(
-                self.port.cmd_valid.eq(0),
-                self.writable.eq(0)
+                port.cmd.eq(port.HMC_CMD_WR_NP),
+                port.addr[line_offset:].eq(line_start_addr + wr_ptr),
+                port.tag.eq(Cat(0, wr_tag))
             ),
-            self.port.tag.eq(Cat(do_rd, tag)),
-            self.port.wr_data.eq(self.din),
-            self.port.size.eq(1)
+            port.size.eq(burst_flits),
+            port.cmd_valid.eq(want_rd | want_wr),
+            port.wr_data.eq(Array(send_buffer[i*flit_width:(i+1)*flit_width] for i in range(burst_flits))[send_flit]),
+            port.wr_data_valid.eq(sending)
         ]
 
         # accounting
         self.sync += [
-            If(self.port.cmd_ready & self.port.cmd_valid,
-                self.tag_in_use[tag].eq(1),
-                If(self.port.cmd == port.HMC_CMD_RD,
+            If(port.cmd_ready & port.cmd_valid,
+                prefer_rd.eq(~do_rd),
+                If(do_rd,
+                    tag_in_use[rd_tag].eq(1),
                     _inc(rd_ptr, mem_area_size),
-                    level.eq(level-1)
+                    hmc_level.eq(hmc_level - 1),
+                    self.num_hmc_reads.eq(self.num_hmc_reads + 1)
                 ).Else(
+                    tag_in_use[wr_tag].eq(1),
                     _inc(wr_ptr, mem_area_size),
-                    level.eq(level+1)
+                    hmc_level.eq(hmc_level + 1),
+                    send_buffer.eq(line),
+                    sending.eq(1),
+                    line_level.eq(0),
+                    self.num_hmc_writes.eq(self.num_hmc_writes + 1)
+                )
+            ),
+            If(sending & port.wr_data_ready,
+                If(send_flit == burst_flits - 1,
+                    send_flit.eq(0),
+                    sending.eq(0)
+                ).Else(
+                    send_flit.eq(send_flit + 1)
                 )
             ),
-            If(self.port.rd_data_valid,
-                self.tag_in_use[self.port.rd_data_tag[1:]].eq(0),
-                If(self.port.rd_data_tag[0],
-                    reorderbuffer_valid[self.port.rd_data_tag[1:]].eq(1)
+            If(port.rd_data_valid,
+                If(port.rd_data_tag[0],
+                    If(response_flit == burst_flits - 1,
+                        response_flit.eq(0),
+                        tag_in_use[port.rd_data_tag[1:]].eq(0),
+                        reorderbuffer_valid[port.rd_data_tag[1:]].eq(1)
+                    ).Else(
+                        response_flit.eq(response_flit + 1)
+                    )
+                ).Else(
+                    tag_in_use[port.rd_data_tag[1:]].eq(0)
                 )
             ),
-            If(self.readable & self.re,
-                _inc(reorder_rd_ptr, num_tags),
-                reorderbuffer_valid[reorder_rd_ptr].eq(0)
+            If(rd_issued & ~rd_returned,
+                num_rd_inflight.eq(num_rd_inflight + 1)
+            ).Elif(rd_returned & ~rd_issued,
+                num_rd_inflight.eq(num_rd_inflight - 1)
+            ),
+            If(popped & ~bypass,
+                If(reorder_rd_entry == entries_per_line - 1,
+                    reorder_rd_entry.eq(0),
+                    _inc(reorder_rd_ptr, num_tags),
+                    reorderbuffer_valid[reorder_rd_ptr].eq(0)
+                ).Else(
+                    reorder_rd_entry.eq(reorder_rd_entry + 1)
+                )
             )
         ]
 
         # fill reorder buffer
         self.comb += [
-            self.wr_port.adr.eq(self.port.rd_data_tag[1:]),
-            self.wr_port.dat_w.eq(self.port.rd_data),
-            self.wr_port.we.eq(self.port.rd_data_valid & self.port.rd_data_tag[0])
+            wr_port.adr.eq(port.rd_data_tag[1:]*burst_flits + response_flit),
+            wr_port.dat_w.eq(port.rd_data),
+            wr_port.we.eq(port.rd_data_valid & port.rd_data_tag[0])
         ]
 
-        # read from reorder buffer
+        # read from reorder buffer or directly from the write buffer
+        flit_entry_bits = log2_int(entries_per_flit)
+        if entries_per_flit > 1:
+            rd_entry = Array(rd_port.dat_r[i*entry_width:i*entry_width+width] for i in range(entries_per_flit))[reorder_rd_entry[:flit_entry_bits]]
+        else:
+            rd_entry = rd_port.dat_r[:width]
         self.comb += [
-            self.rd_port.adr.eq(reorder_rd_ptr),
-            self.dout.eq(self.rd_port.dat_r),
-            self.readable.eq(reorderbuffer_valid[reorder_rd_ptr])
+            rd_port.adr.eq(reorder_rd_ptr*burst_flits + reorder_rd_entry[flit_entry_bits:]),
+            If(bypass,
+                self.dout.eq(writebuffer.dout),
+                self.readable.eq(writebuffer.readable)
+            ).Else(
+                self.dout.eq(rd_entry),
+                self.readable.eq(reorderbuffer_valid[reorder_rd_ptr])
+            )
+        ]
+
+class SpillFIFO(Module):
+    """FIFO of `depth` entries on chip that overflows into `backend` (a FIFO
+    with the same interface, e.g. an HMCBackedFIFO) when full. Order is kept:
+    once an entry has been spilled, later entries go to the backend as well
+    until it has been drained back into the on-chip FIFO."""
+    def __init__(self, width, depth, backend):
+        self.din = Signal(width)
+        self.writable = Signal()
+        self.we = Signal()
+
+        self.dout = Signal(width)
+        self.readable = Signal()
+        self.re = Signal()
+
+        self.full = Signal()
+        self.level = Signal(32)
+        self.spill_level = Signal(32)
+        self.num_spilled = Signal(32)
+
+        self.submodules.onchip = onchip = SyncFIFO(width=width, depth=depth)
+        self.submodules.backend = backend
+
+        spilling = Signal()
+        self.comb += [
+            spilling.eq((self.spill_level != 0) | ~onchip.writable),
+            If(self.spill_level != 0,
+                onchip.din.eq(backend.dout),
+                onchip.we.eq(backend.readable),
+                backend.re.eq(onchip.writable)
+            ).Else(
+                onchip.din.eq(self.din),
+                onchip.we.eq(self.we)
+            ),
+            backend.din.eq(self.din),
+            backend.we.eq(self.we & spilling),
+            self.writable.eq(Mux(spilling, backend.writable, onchip.writable)),
+            self.dout.eq(onchip.dout),
+            self.readable.eq(onchip.readable),
+            onchip.re.eq(self.re),
+            self.full.eq(getattr(backend, "full", ~backend.writable)),
+            self.level.eq(onchip.level + self.spill_level)
+        ]
+
+        spill = Signal()
+        refill = Signal()
+        self.comb += [
+            spill.eq(backend.we & backend.writable),
+            refill.eq(backend.readable & backend.re)
+        ]
+        self.sync += [
+            If(spill & ~refill,
+                self.spill_level.eq(self.spill_level + 1)
+            ).Elif(refill & ~spill,
+                self.spill_level.eq(self.spill_level - 1)
+            ),
+            If(spill,
+                self.num_spilled.eq(self.num_spilled + 1)
+            )
         ]
@@ -34,8 +34,8 @@ class Apply(Module):
 
         ####
 
-        apply_interface_in_fifo = InterfaceFIFO(layout=self.apply_interface.layout, depth=8, name="apply_in_fifo")
-        self.submodules += apply_interface_in_fifo
+        apply_interface_in_fifo = InterfaceFIFO(layout=self.apply_interface.layout, depth=config.fifo_depth("Apply.apply_interface_in_fifo", 8), name="apply_in_fifo")
+        self.submodules.apply_interface_in_fifo = apply_interface_in_fifo
         self.comb += self.apply_interface.connect(apply_interface_in_fifo.din)
 
         # local node data storage
@@ -182,9 +182,13 @@ class Apply(Module):
 
         # User code
         if hasattr(config, "gatherapplykernel"):
-            self.submodules.gatherapplykernel = config.gatherapplykernel(config)
+            self.submodules.gatherapplykernel = kernel = config.gatherapplykernel(config)
         else:
-            self.submodules.gatherapplykernel = GatherApplyWrapper(config.gatherkernel(config), config.applykernel(config))
+            kernel = config.applykernel(config)
+            self.submodules.gatherapplykernel = GatherApplyWrapper(config.gatherkernel(config), kernel)
+        # PE and vertex memory of the kernel, for its selfcheck
+        kernel.pe_id = pe_id
+        kernel.mem = self.mem
 
         self.comb += [
             self.gatherapplykernel.level_in.eq(self.level),
@@ -237,7 +241,7 @@ class Apply(Module):
         outfifo_out = Message(**addresslayout.get_params())
 
         if config.updates_in_hmc:
-            self.submodules.outfifo = HMCBackedFIFO(width=len(outfifo_in), start_addr=pe_id*(1<<config.hmc_fifo_bits), end_addr=(pe_id + 1)*(1<<config.hmc_fifo_bits), port=config.platform.getHMCPort(pe_id))
+            self.submodules.outfifo = HMCBackedFIFO(width=len(outfifo_in), start_addr=pe_id*(1<<config.hmc_fifo_bits), end_addr=(pe_id + 1)*(1<<config.hmc_fifo_bits), port=config.platform.getHMCPort(pe_id), burst_flits=config.updates_hmc_burst_flits)
 
             self.sync += [
                 If(self.outfifo.full, self.deadlock.eq(1))
@@ -273,7 +277,7 @@ class Apply(Module):
         for node in range(num_valid_nodes):
             vertexid = tb.config.addresslayout.global_adr(self.pe_id, node)
             if vertexid in tb.config.graph:
-                p = "{} (origin={}): ".format(vertexid, tb.config.graph.node[vertexid]["origin"])
+                p = "{} (origin={}): ".format(vertexid, tb.config.graph.node[vertexid].get("origin", vertexid))
                 state = convert_int_to_record((yield self.mem[node]), tb.config.addresslayout.node_storage_layout)
                 p += str(state)
                 if vertexid < 32:
@@ -8,7 +8,7 @@ class BarrierDistributorApply(Module):
         self.apply_interface_in = ApplyInterface(name="barrierdistributor_in", **config.addresslayout.get_params())
         self.apply_interface_out = ApplyInterface(name="barrierdistributor_out", **config.addresslayout.get_params())
 
-        self.submodules.fifo = InterfaceFIFO(layout=self.apply_interface_in.layout, depth=8)
+        self.submodules.fifo = InterfaceFIFO(layout=self.apply_interface_in.layout, depth=config.fifo_depth("BarrierDistributorApply.fifo", 8))
 
         self.comb += [
             self.apply_interface_in.connect(self.fifo.din)
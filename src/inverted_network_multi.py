@@ -53,7 +53,7 @@ class RecipientFilter(Module):
         self.apply_interface_in = ApplyInterface(name="filter_in", **config.addresslayout.get_params())
         self.apply_interface_out = ApplyInterface(name="filter_out", **config.addresslayout.get_params())
 
-        self.submodules.fifo = InterfaceFIFO(layout=self.apply_interface_in.layout, depth=8)
+        self.submodules.fifo = InterfaceFIFO(layout=self.apply_interface_in.layout, depth=config.fifo_depth("RecipientFilter.fifo", 8))
 
         self.comb += [
             self.apply_interface_in.connect(self.fifo.din)
@@ -99,9 +99,11 @@ class RecipientFilter(Module):
     @passive
     def gen_selfcheck(self, tb):
         logger = logging.getLogger("sim.filter")
+        debug = logger.isEnabledFor(logging.DEBUG)
         while True:
             if (yield self.filter) and (yield self.fifo.dout.ack):
-                logger.debug("Filtering update from node {} which has no neighbors on FPGA {}. (self.num_messages_filtered[{}] += 1)".format((yield self.fifo.dout.msg.sender), self.fpga_id, (yield self.filter_origin_pe)))
+                if debug:
+                    logger.debug("Filtering update from node {} which has no neighbors on FPGA {}. (self.num_messages_filtered[{}] += 1)".format((yield self.fifo.dout.msg.sender), self.fpga_id, (yield self.filter_origin_pe)))
             yield
 
 class UpdateNetwork(Module):
@@ -0,0 +1,206 @@
+from migen import *
+from migen.genlib.fsm import FSM, NextState, NextValue
+from tbsupport import every_cycle
+
+from util.mem import FullyInitMemory
+
+import logging
+
+from core_interfaces import ApplyInterface
+
+class PullSweep(Module):
+    """Bottom-up BFS step: every local vertex that has not been seen yet looks
+    for a neighbor in the frontier and, on the first hit, sends itself a message
+    from that neighbor."""
+    def __init__(self, pe_id, config):
+        self.pe_id = pe_id
+        addresslayout = config.addresslayout
+        nodeidsize = addresslayout.nodeidsize
+        num_nodes = addresslayout.num_pe*addresslayout.num_nodes_per_pe
+
+        pull_adj_idx = config.pull_adj_idx[pe_id]
+        pull_adj_val = config.pull_adj_val[pe_id]
+        idxsize = bits_for(len(pull_adj_val))
+        num_local_nodes = len(pull_adj_idx)
+
+        # input: frontier as it arrives
+        self.update_valid = Signal()
+        self.update_sender = Signal(nodeidsize)
+        self.update_num_neighbors = Signal(addresslayout.edgeidsize)
+
+        # input: end of round
+        self.barrier = Signal()
+        self.roundpar = Signal(addresslayout.channel_bits)
+
+        # control
+        self.pull = Signal()
+        self.start = Signal()
+        self.done = Signal()
+
+        # output
+        self.apply_interface = ApplyInterface(name="pull_out", **addresslayout.get_params())
+
+        ###
+
+        # one bit per vertex in the graph, set once its update has been received
+        # a vertex that has been seen in an earlier round has already visited all
+        # its neighbors, so any seen neighbor of an unseen vertex is in the frontier
+        self.specials.mem_seen = Memory(1, num_nodes)
+        self.specials.rd_port_seen = rd_port_seen = self.mem_seen.get_port(has_re=True)
+        self.specials.wr_port_seen = wr_port_seen = self.mem_seen.get_port(write_capable=True)
+
+        self.comb += [
+            wr_port_seen.adr.eq(self.update_sender),
+            wr_port_seen.dat_w.eq(1),
+            wr_port_seen.we.eq(self.update_valid)
+        ]
+
+        # reverse adjacency of local vertices
+        def _pack_adj_idx(adj_idx):
+            return [b<<idxsize | a for a,b in adj_idx]
+
+        self.specials.mem_idx = FullyInitMemory(idxsize*2, max(2, num_local_nodes), name="pull_csr_idx", init=_pack_adj_idx(pull_adj_idx))
+        self.specials.rd_port_idx = rd_port_idx = self.mem_idx.get_port(has_re=True)
+
+        self.specials.mem_val = FullyInitMemory(nodeidsize, len(pull_adj_val) + 2, name="pull_csr_val", init=pull_adj_val)
+        self.specials.rd_port_val = rd_port_val = self.mem_val.get_port(has_re=True)
+
+        # direction heuristic (Beamer et al.): pull once the frontier's edges outweigh
+        # the remaining unexplored edges by pull_alpha, push again once the frontier
+        # is smaller than a pull_beta-th of the graph
+        num_frontier = Signal(32)
+        num_frontier_prev = Signal(32)
+        frontier_edges = Signal(32)
+        unexplored_edges = Signal(32, reset=len(pull_adj_val))
+
+        self.sync += [
+            If(self.barrier,
+                If(~self.pull,
+                    If((frontier_edges*config.pull_alpha > unexplored_edges) & (num_frontier > num_frontier_prev),
+                        self.pull.eq(1)
+                    )
+                ).Else(
+                    If((num_frontier*config.pull_beta < num_nodes) & (num_frontier < num_frontier_prev),
+                        self.pull.eq(0)
+                    )
+                ),
+                num_frontier_prev.eq(num_frontier),
+                num_frontier.eq(0),
+                frontier_edges.eq(0)
+            ).Elif(self.update_valid,
+                num_frontier.eq(num_frontier + 1),
+                frontier_edges.eq(frontier_edges + self.update_num_neighbors),
+                unexplored_edges.eq(Mux(unexplored_edges > self.update_num_neighbors, unexplored_edges - self.update_num_neighbors, 0))
+            )
+        ]
+
+        # sweep over local vertices
+        node = Signal(max=max(2, num_local_nodes + 1))
+        node_global = Signal(nodeidsize)
+        next_idx = Signal(idxsize)
+        end_idx = Signal(idxsize)
+        parent = Signal(nodeidsize)
+
+        self.comb += node_global.eq(addresslayout.global_adr(pe_id, node))
+
+        self.submodules.fsm = fsm = FSM()
+        fsm.act("IDLE",
+            If(self.start,
+                NextValue(node, 0),
+                NextState("READ_NODE")
+            )
+        )
+        fsm.act("READ_NODE",
+            If(node == num_local_nodes,
+                NextState("DONE")
+            ).Else(
+                rd_port_seen.adr.eq(node_global),
+                rd_port_seen.re.eq(1),
+                rd_port_idx.adr.eq(node),
+                rd_port_idx.re.eq(1),
+                NextState("CHECK_NODE")
+            )
+        )
+        fsm.act("CHECK_NODE",
+            NextValue(next_idx, rd_port_idx.dat_r[:idxsize]),
+            NextValue(end_idx, rd_port_idx.dat_r[:idxsize] + rd_port_idx.dat_r[idxsize:]),
+            If(rd_port_seen.dat_r | (rd_port_idx.dat_r[idxsize:] == 0) | (node_global == 0),
+                NextValue(node, node + 1),
+                NextState("READ_NODE")
+            ).Else(
+                NextState("READ_EDGE")
+            )
+        )
+        fsm.act("READ_EDGE",
+            If(next_idx == end_idx,
+                NextValue(node, node + 1),
+                NextState("READ_NODE")
+            ).Else(
+                rd_port_val.adr.eq(next_idx),
+                rd_port_val.re.eq(1),
+                NextValue(next_idx, next_idx + 1),
+                NextState("READ_NEIGHBOR")
+            )
+        )
+        fsm.act("READ_NEIGHBOR",
+            rd_port_seen.adr.eq(rd_port_val.dat_r),
+            rd_port_seen.re.eq(1),
+            NextValue(parent, rd_port_val.dat_r),
+            NextState("CHECK_NEIGHBOR")
+        )
+        fsm.act("CHECK_NEIGHBOR",
+            If(rd_port_seen.dat_r,
+                NextState("SEND")
+            ).Else(
+                NextState("READ_EDGE")
+            )
+        )
+        fsm.act("SEND",
+            self.apply_interface.valid.eq(1),
+            If(self.apply_interface.ack,
+                NextValue(node, node + 1),
+                NextState("READ_NODE")
+            )
+        )
+        fsm.act("DONE",
+            self.done.eq(1),
+            # start stays up if the next barrier follows right away
+            If(self.barrier | ~self.start,
+                NextState("IDLE")
+            )
+        )
+
+        self.comb += [
+            self.apply_interface.msg.dest_id.eq(node_global),
+            self.apply_interface.msg.sender.eq(parent),
+            self.apply_interface.msg.roundpar.eq(self.roundpar),
+            self.apply_interface.msg.barrier.eq(0)
+        ]
+
+        self.num_pull_rounds = Signal(32)
+        self.num_messages_pulled = Signal(32)
+        self.sync += [
+            If(self.barrier & self.pull,
+                self.num_pull_rounds.eq(self.num_pull_rounds + 1)
+            ),
+            If(self.apply_interface.valid & self.apply_interface.ack,
+                self.num_messages_pulled.eq(self.num_messages_pulled + 1)
+            )
+        ]
+
+    @every_cycle
+    def gen_selfcheck(self, tb):
+        logger = logging.getLogger("sim.pullsweep" + str(self.pe_id))
+        debug = logger.isEnabledFor(logging.DEBUG)
+        level = 0
+        num_cycles = 0
+        while not (yield tb.global_inactive):
+            num_cycles += 1
+            if (yield self.barrier):
+                level += 1
+                logger.debug("{}: round {} done in {} mode".format(num_cycles, level, "pull" if (yield self.pull) else "push"))
+            if (yield self.apply_interface.valid) and (yield self.apply_interface.ack):
+                if debug:
+                    logger.debug("{}: node {} pulled from parent {}".format(num_cycles, (yield self.apply_interface.msg.dest_id), (yield self.apply_interface.msg.sender)))
+            yield
+        logger.info("{} of {} rounds in pull mode, {} messages pulled.".format((yield self.num_pull_rounds), level, (yield self.num_messages_pulled)))
@@ -90,16 +90,41 @@ class Scatter(Module):
 
         # ask get_neighbors submodule for all neighbors of input node
         # upstream_ack will only go up again when all neighbors done
-        self.comb +=[
-            self.get_neighbors.neighbor_in.start_idx.eq(rd_port_idx.dat_r[:edgeidsize]),
-            self.get_neighbors.neighbor_in.num_neighbors.eq(rd_port_idx.dat_r[edgeidsize:]),
-            self.get_neighbors.neighbor_in.valid.eq(scatter_msg_valid1),
-            self.get_neighbors.neighbor_in.barrier.eq(scatter_barrier1),
-            self.get_neighbors.neighbor_in.message.eq(scatter_msg1),
-            self.get_neighbors.neighbor_in.sender.eq(scatter_sender1),
-            self.get_neighbors.neighbor_in.round.eq(scatter_round1),
-            upstream_ack.eq(self.get_neighbors.neighbor_in.ack)
-        ]
+        if config.direction_optimizing:
+            from inverted_pull import PullSweep
+            self.submodules.pullsweep = PullSweep(pe_id, config)
+
+            # in pull rounds, only record the frontier and hold the barrier
+            # until the sweep has sent its messages
+            hold_barrier = Signal()
+            self.comb += [
+                hold_barrier.eq(scatter_barrier1 & self.pullsweep.pull & ~self.pullsweep.done),
+                self.pullsweep.start.eq(scatter_barrier1 & self.pullsweep.pull),
+                self.pullsweep.roundpar.eq(scatter_round1),
+                self.pullsweep.update_valid.eq(scatter_msg_valid1 & upstream_ack),
+                self.pullsweep.update_sender.eq(scatter_sender1),
+                self.pullsweep.update_num_neighbors.eq(rd_port_idx.dat_r[edgeidsize:]),
+                self.pullsweep.barrier.eq(scatter_barrier1 & upstream_ack),
+                self.get_neighbors.neighbor_in.start_idx.eq(rd_port_idx.dat_r[:edgeidsize]),
+                self.get_neighbors.neighbor_in.num_neighbors.eq(rd_port_idx.dat_r[edgeidsize:]),
+                self.get_neighbors.neighbor_in.valid.eq(scatter_msg_valid1 & ~self.pullsweep.pull),
+                self.get_neighbors.neighbor_in.barrier.eq(scatter_barrier1 & ~hold_barrier),
+                self.get_neighbors.neighbor_in.message.eq(scatter_msg1),
+                self.get_neighbors.neighbor_in.sender.eq(scatter_sender1),
+                self.get_neighbors.neighbor_in.round.eq(scatter_round1),
+                upstream_ack.eq(self.get_neighbors.neighbor_in.ack & ~hold_barrier)
+            ]
+        else:
+            self.comb +=[
+                self.get_neighbors.neighbor_in.start_idx.eq(rd_port_idx.dat_r[:edgeidsize]),
+                self.get_neighbors.neighbor_in.num_neighbors.eq(rd_port_idx.dat_r[edgeidsize:]),
+                self.get_neighbors.neighbor_in.valid.eq(scatter_msg_valid1),
+                self.get_neighbors.neighbor_in.barrier.eq(scatter_barrier1),
+                self.get_neighbors.neighbor_in.message.eq(scatter_msg1),
+                self.get_neighbors.neighbor_in.sender.eq(scatter_sender1),
+                self.get_neighbors.neighbor_in.round.eq(scatter_round1),
+                upstream_ack.eq(self.get_neighbors.neighbor_in.ack)
+            ]
 
 
         ## stage 3
@@ -107,6 +132,7 @@ class Scatter(Module):
         # user modification based on edge data
 
         self.submodules.scatterkernel = config.scatterkernel(config)
+        self.scatterkernel.pe_id = pe_id
 
         self.submodules.neighbor_out_fifo = InterfaceFIFO(layout=self.get_neighbors.neighbor_out.layout+([("edgedata", len(self.get_neighbors.edgedata_out), DIR_M_TO_S)] if config.has_edgedata else []), depth=8)
 
@@ -132,7 +158,7 @@ class Scatter(Module):
         # scatterkernel output
         self.submodules.scatterkerneloutfifo = InterfaceFIFO(layout=self.apply_interface.layout, depth=8)
 
-        self.comb += [
+        scatterkernel_out = [
             self.scatterkerneloutfifo.din.msg.dest_id.eq(self.scatterkernel.neighbor_out),
             self.scatterkerneloutfifo.din.msg.payload.eq(self.scatterkernel.message_out.raw_bits()),
             self.scatterkerneloutfifo.din.msg.sender.eq(self.scatterkernel.sender_out),
@@ -142,6 +168,17 @@ class Scatter(Module):
             self.scatterkernel.message_ack.eq(self.scatterkerneloutfifo.din.ack),
         ]
 
+        if config.direction_optimizing:
+            # the neighbor pipeline is empty while the sweep runs: the previous
+            # barrier has left it and no frontier was expanded in this round
+            self.comb += If(self.pullsweep.start,
+                self.pullsweep.apply_interface.connect(self.scatterkerneloutfifo.din)
+            ).Else(
+                *scatterkernel_out
+            )
+        else:
+            self.comb += scatterkernel_out
+
         self.comb += self.scatterkerneloutfifo.dout.connect(self.apply_interface)
 
         self.total_num_messages = Signal(32)
@@ -2,6 +2,7 @@ from migen.fhdl import verilog
 
 from migen import *
 from tbsupport import *
+from sim_waveform import simulate
 
 import logging
 from contextlib import ExitStack
@@ -60,12 +61,14 @@ class Core(Module):
         # state of calculation
         self.global_inactive = self.network.inactive
 
-        # # I/O interface
-        # internal_mem_ports = [a.external_wr_port for a in self.apply]
-        # internal_mem_ports.extend([s.wr_port_idx for s in self.scatter])
-        # internal_mem_ports.extend([s.get_neighbors.wr_port_val for s in self.scatter])
-        # self.submodules.bramio = BRAMIO(start_addr=config.start_addr, endpoints=internal_mem_ports)
-        # self.init_complete = Signal()
+        # memories come up with their init values, so simulation only needs the
+        # host interface when the load path itself is being tested
+        self.init_complete = Signal()
+        if config.sim_bus_load:
+            internal_mem_ports = [a.external_wr_port for a in self.apply]
+            internal_mem_ports.extend([s.wr_port_idx for s in self.scatter])
+            internal_mem_ports.extend([s.get_neighbors.wr_port_val for s in self.scatter])
+            self.submodules.bramio = BRAMIO(start_addr=config.start_addr, endpoints=internal_mem_ports)
 
     def gen_barrier_monitor(self, tb):
         logger = logging.getLogger('sim.barriermonitor')
@@ -92,7 +95,7 @@ class Core(Module):
                         logger.debug(str(num_cycles) + ": Barrier exits Scatter on PE " + str(s.pe_id))
             yield
 
-    def gen_simulation(self, tb):
+    def gen_bus_load(self):
         word_offset = self.bramio.word_offset
         addr_spacing = self.bramio.addr_spacing
         start_addr = self.config.start_addr
@@ -110,20 +113,37 @@ class Core(Module):
             for addr, data in enumerate(self.config.adj_val[pe_id]):
                 yield from self.bramio.axi_port.write(adr=start_addr + (addr << word_offset), wdata=data)
             start_addr += addr_spacing
-        yield self.init_complete.eq(1)
-        while not (yield tb.global_inactive):
-            yield
+
+    def gen_bus_readback(self):
+        word_offset = self.bramio.word_offset
+        addr_spacing = self.bramio.addr_spacing
         start_addr = self.config.start_addr
         for pe_id in range(self.config.addresslayout.num_pe):
-            num_valid_nodes = tb.config.addresslayout.max_node_per_pe(tb.config.adj_dict)[pe_id] + 1
+            num_valid_nodes = self.config.addresslayout.max_node_per_pe(self.config.adj_dict)[pe_id] + 1
             for addr in range(num_valid_nodes):
                 data = (yield from self.bramio.axi_port.read(adr=start_addr + (addr << word_offset)))
                 r = convert_int_to_record(data, self.config.addresslayout.node_storage_layout)
                 vertexid = self.config.addresslayout.global_adr(pe_id, addr)
                 if vertexid != 0:
-                    print("Data of Vertex {}:\t {}".format(self.config.graph.node[vertexid]["origin"], [(f[0], r[f[0]]) for f in self.config.addresslayout.node_storage_layout]))
+                    print("Data of Vertex {}:\t {}".format(self.config.graph.node[vertexid].get("origin", vertexid), [(f[0], r[f[0]]) for f in self.config.addresslayout.node_storage_layout]))
             start_addr += addr_spacing
 
+    def gen_simulation(self, tb):
+        if self.config.sim_bus_load:
+            yield from self.gen_bus_load()
+        yield self.init_complete.eq(1)
+        while not (yield tb.global_inactive):
+            yield
+        if self.config.sim_bus_load:
+            yield from self.gen_bus_readback()
+        else:
+            for pe_id in range(self.config.addresslayout.num_pe):
+                for addr in range(self.config.addresslayout.max_node_per_pe(self.config.adj_dict)[pe_id] + 1):
+                    r = convert_int_to_record((yield self.apply[pe_id].mem[addr]), self.config.addresslayout.node_storage_layout)
+                    vertexid = self.config.addresslayout.global_adr(pe_id, addr)
+                    if vertexid != 0:
+                        print("Data of Vertex {}:\t {}".format(self.config.graph.node[vertexid].get("origin", vertexid), [(f[0], r[f[0]]) for f in self.config.addresslayout.node_storage_layout]))
+
 class UnCore(Module):
     def __init__(self, config):
         self.config = config
@@ -182,13 +202,13 @@ def sim(config):
     generators = []
 
     for core in tb.cores:
-        generators.extend([core.gen_barrier_monitor(tb)])
-        generators.extend([core.bramio.axi_port.gen_radr(), core.bramio.axi_port.gen_rdata(), core.bramio.axi_port.gen_wadr(), core.bramio.axi_port.gen_wdata(), core.bramio.axi_port.gen_wresp()])
+        if config.sim_bus_load:
+            generators.extend([core.bramio.axi_port.gen_radr(), core.bramio.axi_port.gen_rdata(), core.bramio.axi_port.gen_wadr(), core.bramio.axi_port.gen_wdata(), core.bramio.axi_port.gen_wresp()])
 
-    generators.extend(get_simulators(tb, 'gen_selfcheck', tb))
+    generators.extend(get_monitors(tb, config, tb.cores))
     generators.extend(get_simulators(tb, 'gen_simulation', tb))
 
-    run_simulation(tb, generators, vcd_name="{}.vcd".format(config.vcdname))
+    simulate(tb, generators, config, "{}.vcd".format(config.vcdname) if config.vcdname else None, levels=[a.level for core in tb.cores for a in core.apply])
 
 def export(config, filename='top.v'):
 
@@ -197,7 +217,8 @@ def export(config, filename='top.v'):
 
     verilog.convert(m,
                     name="top",
-                    ios={m.start, m.done, m.cycle_count, m.cd_sys.clk}
+                    ios={m.start, m.done, m.cycle_count, m.cd_sys.clk},
+                    special_overrides=get_special_overrides(config)
                     ).write(filename)
 
 def main():
@@ -1,5 +1,6 @@
 from migen import *
 from tbsupport import *
+from sim_waveform import simulate
 from migen.fhdl import verilog
 import migen.build.xilinx.common
 from migen.genlib.resetsync import AsyncResetSynchronizer
@@ -14,6 +15,7 @@ from operator import or_, and_
 from util.pico import PicoPlatform
 
 from core_init import init_parse
+from sim_hmc import use_hmc_model
 
 from util.recordfifo import RecordFIFO
 from core_interfaces import *
@@ -277,7 +279,7 @@ def export(config, filename='top.v'):
 
     m = Top(config)
 
-    so = dict(migen.build.xilinx.common.xilinx_special_overrides)
+    so = get_special_overrides(config, migen.build.xilinx.common.xilinx_special_overrides)
     verilog.convert(m,
                     name="top",
                     ios=config.platform.get_ios(),
@@ -292,15 +294,17 @@ def sim(config):
     tb = UnCore(config)
     tb.submodules += config.platform
 
+    if config.hmc_timing:
+        use_hmc_model(config.platform, 0 if config.memtype == "BRAM" else config.addresslayout.num_pe_per_fpga, config, tb=tb)
+
     generators = config.platform.getSimGenerators()
 
-    generators["sys"].extend([core.gen_barrier_monitor(tb) for core in tb.cores])
-    generators["sys"].extend(get_simulators(tb, 'gen_selfcheck', tb))
+    generators["sys"].extend(get_monitors(tb, config, tb.cores))
     generators["sys"].extend(get_simulators(tb, 'gen_simulation', tb))
 
     # generators.extend([a.gen_stats(tb) for a in tb.apply])
     # generators.extend([tb.gen_network_stats()])
-    run_simulation(tb, generators, clocks={"sys": 10, "bus": 480, "stream": 8}, vcd_name="{}.vcd".format(config.vcdname))
+    simulate(tb, generators, config, "{}.vcd".format(config.vcdname) if config.vcdname else None, levels=[a.level for core in tb.cores for a in core.apply], clocks={"sys": 10, "bus": 480, "stream": 8})
 
 
 def main():
@@ -1,5 +1,6 @@
 from migen import *
 from tbsupport import *
+from sim_waveform import simulate
 from migen.fhdl import verilog
 import migen.build.xilinx.common
 from migen.genlib.resetsync import AsyncResetSynchronizer
@@ -8,12 +9,17 @@ from migen.genlib.fifo import *
 
 import logging
 
-from functools import reduce
+from functools import reduce, partial
 from operator import or_, and_
 
 from util.pico import PicoPlatform
 
 from core_init import init_parse
+from export_cache import convert_cached
+from sim_hmc import use_hmc_model
+from sim_checkpoint import get_checkpoint_generators, SimulationStopped
+from sim_fifo_profile import get_fifo_profilers
+from sim_cosim import CoSim
 
 from util.recordfifo import RecordFIFO
 from core_interfaces import *
@@ -365,18 +371,19 @@ def export(config, filename='top'):
     logger = logging.getLogger('config')
     config.platform = [PicoPlatform(config.addresslayout.num_pe_per_fpga, create_hmc_ios=True, bus_width=32, stream_width=128) for _ in range(config.addresslayout.num_fpga)]
 
-    m = [Top(config, i) for i in range(config.addresslayout.num_fpga)]
-
     logger.info("Exporting design to files {0}[0-{1}]/{0}.v".format(filename, config.addresslayout.num_fpga - 1))
 
-    for i in range(config.addresslayout.num_fpga):
+    def export_fpga(i):
         iname = filename + "_" + str(i)
         os.makedirs(iname, exist_ok=True)
         with cd(iname):
-            verilog.convert(m[i],
-                            name=filename,
-                            ios=config.platform[i].get_ios()
-                            ).write(filename + ".v")
+            convert_cached(config, lambda: (Top(config, i), config.platform[i].get_ios()), filename + ".v",
+                           key="inverted_top_pico_multi fpga {}".format(i),
+                           name=filename,
+                           special_overrides=get_special_overrides(config)
+                           )
+
+    run_parallel([partial(export_fpga, i) for i in range(config.addresslayout.num_fpga)], config.export_jobs)
     if not config.memtype == "BRAM":
         export_data(config.adj_val, "adj_val.data", data_size=config.addresslayout.adj_val_entry_size_in_bytes*8, backup=config.alt_adj_val_data_name)
 
@@ -385,6 +392,11 @@ def sim(config):
 
     tb = SimTB(config)
     tb.submodules += [p.logic for p in config.platform]
+    levels = [a.level for core in tb.cores for a in core.apply]
+
+    if config.hmc_timing:
+        for p in config.platform:
+            use_hmc_model(p, config.addresslayout.num_pe, config, tb=tb)
 
     generators = config.platform[0].getSimGenerators()
     for i in range(1, len(config.platform)):
@@ -392,23 +404,54 @@ def sim(config):
         for cd in generators:
             generators[cd].extend(g[cd])
 
-    generators["sys"].extend([core.gen_barrier_monitor(tb) for core in tb.cores])
-    generators["sys"].extend(get_simulators(tb, 'gen_selfcheck', tb))
+    generators["sys"].extend(get_monitors(tb, config, tb.cores))
+    generators["sys"].extend(get_fifo_profilers(tb, config))
     generators["sys"].extend(get_simulators(tb, 'gen_simulation', tb))
+    generators["sys"].extend(get_checkpoint_generators(tb, config, levels))
 
     # generators.extend([a.gen_stats(tb) for a in tb.apply])
     # generators.extend([tb.gen_network_stats()])
-    run_simulation(tb, generators, clocks={"sys": 10, "bus": 480, "stream": 8}, vcd_name="{}.vcd".format(config.vcdname))
+    try:
+        simulate(tb, generators, config, "{}.vcd".format(config.vcdname) if config.vcdname else None, levels=levels, clocks={"sys": 10, "bus": 480, "stream": 8})
+    except SimulationStopped:
+        pass
+
+
+def cosim(config):
+    platform_args = dict(bus_width=32, init=(config.adj_val if config.memtype != "BRAM" else []), init_elem_size_bytes=config.addresslayout.adj_val_entry_size_in_bytes)
+
+    def make_core(fpga_id):
+        # each process only needs the platform of its own FPGA
+        config.platform = [PicoPlatform(config.addresslayout.num_pe, **platform_args) if i == fpga_id else None for i in range(config.addresslayout.num_fpga)]
+        return Core(config, fpga_id)
+
+    def setup(fpga_id, tb):
+        platform = config.platform[fpga_id]
+        tb.submodules += platform.logic
+        if config.hmc_timing:
+            use_hmc_model(platform, config.addresslayout.num_pe, config, tb=tb)
+        return platform.getSimGenerators()
+
+    def out_route(fpga_id, j, dest_pe):
+        # same wiring as SimTB: one interface per other FPGA, in order
+        if j < fpga_id:
+            return j, fpga_id - 1
+        else:
+            return j + 1, fpga_id
 
+    CoSim(config, make_core, out_route, num_in=config.addresslayout.num_fpga - 1, interface=ApplyInterface, setup=setup, clocks={"sys": 10, "bus": 480, "stream": 8}, **config.cosim).run()
 
 def main():
-    args, config = init_parse(inverted=True, cmd_choices=("sim", "export"))
+    args, config = init_parse(inverted=True, cmd_choices=("sim", "cosim", "export"))
 
     logger = logging.getLogger('config')
 
     if args.command=='sim':
         logger.info("Starting Simulation")
         sim(config)
+    elif args.command=='cosim':
+        logger.info("Starting Co-Simulation")
+        cosim(config)
     elif args.command=='export':
         filename = "top"
         if args.output:
@@ -0,0 +1,82 @@
+from migen import *
+from migen.genlib.record import *
+from tbsupport import every_cycle
+
+from msbfs.interfaces import *
+
+import logging
+
+class ApplyKernel(Module):
+    def __init__(self, config):
+        nodeidsize = config.addresslayout.nodeidsize
+
+        self.level_in = Signal(32)
+        self.nodeid_in = Signal(nodeidsize)
+        self.state_in = Record(set_layout_parameters(node_storage_layout, **config.addresslayout.get_params()))
+        self.state_in_valid = Signal()
+        self.valid_in = Signal()
+        self.round_in = Signal(config.addresslayout.channel_bits)
+        self.barrier_in = Signal()
+        self.ready = Signal()
+
+        self.nodeid_out = Signal(nodeidsize)
+        self.state_out = Record(set_layout_parameters(node_storage_layout, **config.addresslayout.get_params()))
+        self.state_valid = Signal()
+        self.state_barrier = Signal()
+        self.state_ack = Signal()
+
+        self.update_out = Record(set_layout_parameters(update_layout, **config.addresslayout.get_params()))
+        self.update_sender = Signal(nodeidsize)
+        self.update_valid = Signal()
+        self.update_round = Signal(config.addresslayout.channel_bits)
+        self.barrier_out = Signal()
+        self.update_ack = Signal()
+
+        self.kernel_error = Signal()
+
+        ###
+
+        self.comb += [
+            self.nodeid_out.eq(self.nodeid_in),
+            self.state_out.visited.eq(self.state_in.visited),
+            self.state_out.frontier.eq(0),
+            self.state_out.active.eq(0),
+            self.state_valid.eq(self.valid_in & self.state_in_valid & self.update_ack),
+            self.state_barrier.eq(self.barrier_in & self.valid_in),
+
+            self.update_out.frontier.eq(self.state_in.frontier),
+            self.update_sender.eq(self.nodeid_in),
+            self.update_round.eq(self.round_in),
+            self.update_valid.eq(self.valid_in & ((self.state_in_valid & self.state_in.active) | self.barrier_in) & self.state_ack),
+            self.barrier_out.eq(self.barrier_in),
+
+            self.ready.eq(self.update_ack & self.state_ack)
+        ]
+
+    @every_cycle
+    def gen_selfcheck(self, tb):
+        logger = logging.getLogger("sim.applykernel")
+        debug = logger.isEnabledFor(logging.DEBUG)
+        num_pe = tb.config.addresslayout.num_pe
+        num_sources = tb.config.addresslayout.num_sources
+        pe_id = self.pe_id
+        level = 0
+        num_cycles = 0
+        num_messages_in = 0
+        num_messages_out = 0
+        while not (yield tb.global_inactive):
+            num_cycles += 1
+            if (yield self.valid_in) and (yield self.ready) and not (yield self.barrier_in):
+                num_messages_in += 1
+            if (yield self.update_valid) and (yield self.update_ack):
+                if (yield self.barrier_out):
+                    level += 1
+                    logger.info("{}: PE {} raised to level {}".format(num_cycles, pe_id, level))
+                else:
+                    num_messages_out += 1
+                    frontier = (yield self.update_out.frontier)
+                    if debug:
+                        logger.debug("{}: Node {} visited in round {} from sources {}".format(num_cycles, (yield self.nodeid_out), level, [i for i in range(num_sources) if frontier & (1 << i)]))
+            yield
+        logger.info("PE {}: {} cycles taken for {} supersteps. {} messages received, {} updates sent.".format(pe_id, num_cycles, level, num_messages_in, num_messages_out))
+        logger.info("Average throughput: In: {:.1f} cycles/message Out: {:.1f} cycles/message".format(num_cycles/num_messages_in if num_messages_in!=0 else 0, num_cycles/num_messages_out if num_messages_out!=0 else 0))
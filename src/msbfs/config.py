@@ -0,0 +1,64 @@
+from migen import *
+from tbsupport import *
+from core_config import *
+
+from msbfs.interfaces import *
+from msbfs.gatherkernel import GatherKernel
+from msbfs.applykernel import ApplyKernel
+from msbfs.scatterkernel import ScatterKernel
+
+import logging
+
+class Config(CoreConfig):
+    """BFS from several roots at once. Only reachability is computed: bit i
+    of a vertex's visited vector is set if it can be reached from root i,
+    there are no per-source levels or parents.
+
+    sources are the roots by their label in the graph file (the vertex
+    number for generated graphs), root i owns bit i. Without sources, the
+    first num_sources vertices are the roots."""
+    def __init__(self, graph, num_sources=8, sources=None, **kwargs):
+        logger = logging.getLogger("config.msbfs")
+
+        self.name = "msbfs"
+
+        self.gatherkernel = GatherKernel
+        self.applykernel = ApplyKernel
+        self.scatterkernel = ScatterKernel
+
+        if sources is None:
+            roots = list(graph)[:num_sources]
+        else:
+            by_origin = {str(graph.nodes[node].get('origin', node)): node for node in graph}
+            roots = []
+            for source in sources:
+                if str(source) not in by_origin:
+                    raise ValueError("BFS source {} is not a vertex of the graph".format(source))
+                if by_origin[str(source)] in roots:
+                    raise ValueError("BFS source {} is given more than once".format(source))
+                roots.append(by_origin[str(source)])
+        if not roots:
+            raise ValueError("msbfs needs at least one source")
+        num_sources = len(roots)
+
+        for node in graph:
+            graph.nodes[node]['visited'] = 0
+            graph.nodes[node]['frontier'] = 0
+            graph.nodes[node]['active'] = 0
+        for i, node in enumerate(roots):
+            graph.nodes[node]['visited'] = 1 << i
+            graph.nodes[node]['frontier'] = 1 << i
+            graph.nodes[node]['active'] = 1
+
+        super().__init__(graph, node_storage_layout, update_layout, message_layout,
+            num_sources = num_sources,
+            **kwargs)
+
+        for node in self.graph:
+            if self.graph.nodes[node]['active'] and 'master' not in self.graph.nodes[node]:
+                logger.info("Source {}: node {}. State: {}".format(bits_for(self.graph.nodes[node]['visited']) - 1, node, self.graph.nodes[node]))
+
+    def init_mirror(self, graph, master, mirror):
+        # visited bits only record reachability from each source, which the
+        # extra hop through the mirror does not change
+        pass
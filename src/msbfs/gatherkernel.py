@@ -0,0 +1,35 @@
+from migen import *
+from migen.genlib.record import *
+
+from msbfs.interfaces import *
+
+import logging
+
+class GatherKernel(Module):
+    def __init__(self, config):
+        nodeidsize = config.addresslayout.nodeidsize
+
+        self.nodeid_in = Signal(nodeidsize)
+        self.sender_in = Signal(nodeidsize)
+        self.message_in = Record(set_layout_parameters(message_layout, **config.addresslayout.get_params()))
+        self.state_in = Record(set_layout_parameters(node_storage_layout, **config.addresslayout.get_params()))
+        self.valid_in = Signal()
+        self.ready = Signal()
+
+        self.nodeid_out = Signal(nodeidsize)
+        self.state_out = Record(set_layout_parameters(node_storage_layout, **config.addresslayout.get_params()))
+        self.state_valid = Signal()
+        self.state_ack = Signal()
+
+        # sources that reach this node for the first time
+        new = Signal(config.addresslayout.num_sources)
+        self.comb += new.eq(self.message_in.frontier & ~self.state_in.visited)
+
+        self.comb += [
+            self.state_out.visited.eq(self.state_in.visited | self.message_in.frontier),
+            self.state_out.frontier.eq(self.state_in.frontier | new),
+            self.state_out.active.eq(self.state_in.active | (new != 0)),
+            self.state_valid.eq(self.valid_in),
+            self.nodeid_out.eq(self.nodeid_in),
+            self.ready.eq(self.state_ack)
+        ]
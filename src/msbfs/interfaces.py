@@ -0,0 +1,20 @@
+from migen import *
+from migen.genlib.record import *
+
+
+### user-defined ###
+
+## message payload format (user-defined)
+# one bit per BFS source: set if the sender was reached from that source in the last round
+
+message_layout = update_layout = [
+    ("frontier", "num_sources", DIR_M_TO_S)
+]
+
+### Memory Interfaces ###
+
+node_storage_layout = [
+    ("visited", "num_sources"),
+    ("frontier", "num_sources"),
+    ("active", 1)
+]
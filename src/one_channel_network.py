@@ -10,6 +10,7 @@ import math
 from util.recordfifo import *
 from core_interfaces import *
 from core_barriercounter import Barriercounter
+from tbsupport import every_cycle
 
 class Arbiter(Module):
     def __init__(self, pe_id, config):
@@ -43,6 +44,7 @@ class Arbiter(Module):
             ).Else(
                 self.barriercounter.apply_interface_out.connect(self.apply_interface_out)
             )
+    @every_cycle
     def gen_selfcheck(self, tb):
         logger = logging.getLogger("sim.arbiter" + str(self.pe_id))
         level = 0
@@ -213,6 +215,8 @@ class ExtGuard(Module):
 
 class Network(Module):
     def __init__(self, config, pe_start, pe_end):
+        if config.local_bypass:
+            raise NotImplementedError("local_bypass needs a network with a local lane (fifo_network or sim_network)")
         self.config = config
         num_local_pe = pe_end - pe_start
         num_pe = config.addresslayout.num_pe
@@ -1,6 +1,6 @@
 from migen import *
 from migen.genlib.record import *
-from tbsupport import convert_32b_int_to_float, convert_int_to_record
+from tbsupport import convert_32b_int_to_float, convert_int_to_record, every_cycle
 
 from pr.interfaces import *
 from faddsub import FAddSub
@@ -45,7 +45,11 @@ class ApplyKernel(Module):
 
         # float constants
         const_base = Signal(floatsize)
-        self.comb += const_base.eq(config.const_base) # init to 0.15/num_nodes
+        if config.capacity:
+            # 0.15/num_nodes of the loaded graph, written by the host
+            self.const_base = const_base
+        else:
+            self.comb += const_base.eq(config.const_base) # init to 0.15/num_nodes
         const_0_85 = Signal(floatsize)
         self.comb += const_0_85.eq(0x3f59999a)
 
@@ -112,12 +116,13 @@ class ApplyKernel(Module):
             self.update_round.eq(m_round[-1])
         ]
 
+    @every_cycle
     def gen_selfcheck(self, tb):
         logger = logging.getLogger("sim.applykernel")
+        debug = logger.isEnabledFor(logging.DEBUG)
         num_nodes_per_pe = tb.config.addresslayout.num_nodes_per_pe
         num_pe = tb.config.addresslayout.num_pe
-        pe_id = [a.gatherapplykernel.applykernel for core in tb.cores for a in core.apply].index(self)
-        applys = [a for core in tb.cores for a in core.apply]
+        pe_id = self.pe_id
         state_level = 0
         out_level = 0
         in_level = 0
@@ -135,7 +140,8 @@ class ApplyKernel(Module):
                     out_level += 1
                 else:
                     num_messages_out += 1
-                    logger.debug("{}: Node {} updated in round {}. New rank: {}".format(num_cycles, (yield self.update_sender), out_level, convert_32b_int_to_float((yield self.update_out.rank))))
+                    if debug:
+                        logger.debug("{}: Node {} updated in round {}. New rank: {}".format(num_cycles, (yield self.update_sender), out_level, convert_32b_int_to_float((yield self.update_out.rank))))
                     if out_level >= tb.config.total_pr_rounds:
                         logger.warning("{}: message sent after inactivity level reached".format(num_cycles))
             if (yield self.valid_in) and (yield self.ready):
@@ -143,7 +149,7 @@ class ApplyKernel(Module):
                     in_level += 1
                 else:
                     node = tb.config.addresslayout.local_adr((yield self.nodeid_in))
-                    data = (yield applys[pe_id].mem[node])
+                    data = (yield self.mem[node])
                     s = convert_int_to_record(data, set_layout_parameters(node_storage_layout, **tb.config.addresslayout.get_params()))
                     num_messages_in += s['nrecvd']
                     if s['nrecvd'] != s['nneighbors']:
@@ -12,6 +12,8 @@ from pr.scatterkernel import ScatterKernel
 import logging
 
 class Config(CoreConfig):
+    host_registers = ("const_base",)
+
     def __init__(self, graph, **kwargs):
         self.name = "pr"
         self.total_pr_rounds = 30
@@ -0,0 +1,215 @@
+"""First-order FPGA resource estimate of an elaborated design, to find out
+whether a configuration fits before exporting and synthesizing it.
+
+Memories are mapped to block RAM (in 18Kb halves), UltraRAM or LUT RAM the
+way the vendor tools usually infer them. Logic is estimated from the
+operators and multiplexers of the statements: roughly one LUT per bit of
+adders and multiplexers, a third per compared bit, and one FF per bit of
+signals assigned synchronously. Good to tens of percent, not more."""
+
+from migen import *
+from migen.fhdl.specials import Memory, Instance
+from migen.fhdl.visit import NodeVisitor
+from migen.fhdl.tools import list_targets
+
+from core_init import read_config_files, extract_args
+
+from collections import Counter
+import logging
+
+# BRAM36 blocks, UltraRAM blocks, LUTs, FFs, DSPs
+devices = {
+    "xcku060": dict(bram36=1080, uram=0, lut=331680, ff=663360, dsp=2760),
+    "xcku115": dict(bram36=2160, uram=0, lut=663360, ff=1326720, dsp=5520),
+    "xcvu9p": dict(bram36=2160, uram=960, lut=1182240, ff=2364480, dsp=6840),
+    "xcvu37p": dict(bram36=2016, uram=960, lut=1303680, ff=2607360, dsp=9024)
+}
+
+# depth x width configurations of a BRAM18 (simple dual port for 36 bits)
+_bram18_shapes = [(16384, 1), (8192, 2), (4096, 4), (2048, 9), (1024, 18), (512, 36)]
+
+def _ceil(a, b):
+    return -(-a // b)
+
+def memory_usage(memory, uram=False, lutram_bits=2048, uram_depth=4096):
+    """Resources of one Memory. Memories with an asynchronous read port or
+    of at most lutram_bits bits go to LUT RAM, those at least uram_depth
+    deep to UltraRAM if the device has it (needs ram_style = "ultra" in
+    synthesis), the rest to BRAM. A memory is replicated for each read port
+    beyond the first one that is not also a write port."""
+    width, depth = memory.width, memory.depth
+    read_ports = [p for p in memory.ports if p.we is None]
+    copies = max(1, len(read_ports) if len(memory.ports) > 2 else 1)
+    usage = Counter()
+    if any(p.async_read for p in memory.ports) or width*depth <= lutram_bits:
+        # RAM32M stores 32x6 bits in 4 LUTs, RAM64X1D 64x1 bits in 2
+        if depth <= 32:
+            usage["lutram"] += copies*4*_ceil(width, 6)
+        else:
+            usage["lutram"] += copies*2*_ceil(depth, 64)*width
+    elif uram and depth >= uram_depth:
+        usage["uram"] += copies*_ceil(depth, 4096)*_ceil(width, 72)
+    else:
+        usage["bram18"] += copies*min(_ceil(depth, d)*_ceil(width, w) for d, w in _bram18_shapes)
+    return usage
+
+class _LogicCounter(NodeVisitor):
+    def __init__(self):
+        self.usage = Counter()
+        self.depth = 0
+
+    def visit_Operator(self, node):
+        width = max(len(o) for o in node.operands)
+        op = node.op
+        if op in ("+", "-"):
+            self.usage["lut"] += width
+        elif op == "*":
+            self.usage["dsp"] += _ceil(len(node.operands[0]), 27)*_ceil(len(node.operands[1]), 18)
+        elif op in ("==", "!=", "<", "<=", ">", ">="):
+            self.usage["lut"] += _ceil(width, 3)
+        elif op in ("<<", ">>", "<<<", ">>>"):
+            if not isinstance(node.operands[1], Constant):
+                self.usage["lut"] += width*max(1, len(node.operands[1]))//2
+        elif op == "m":
+            self.usage["lut"] += width
+        elif op != "~":
+            self.usage["lut"] += _ceil(width, 2)
+        NodeVisitor.visit_Operator(self, node)
+
+    def visit_ArrayProxy(self, node):
+        self.usage["lut"] += max(len(c) for c in node.choices)*_ceil(len(node.choices), 4)
+        NodeVisitor.visit_ArrayProxy(self, node)
+
+    def visit_Assign(self, node):
+        # a multiplexer in front of the target for each conditional assignment
+        if self.depth:
+            self.usage["lut"] += _ceil(len(node.l), 2)
+        NodeVisitor.visit_Assign(self, node)
+
+    def visit_If(self, node):
+        self.depth += 1
+        NodeVisitor.visit_If(self, node)
+        self.depth -= 1
+
+    def visit_Case(self, node):
+        self.depth += 1
+        NodeVisitor.visit_Case(self, node)
+        self.depth -= 1
+
+def logic_usage(comb, sync):
+    """LUT, FF and DSP estimate of comb statements and sync (dict clock
+    domain -> statements)."""
+    counter = _LogicCounter()
+    counter.visit(comb)
+    for statements in sync.values():
+        counter.visit(statements)
+        counter.usage["ff"] += sum(len(s) for s in list_targets(statements))
+    return counter.usage
+
+def _modules(m):
+    yield m
+    for name, submodule in m._submodules:
+        yield from _modules(submodule)
+
+def estimate(m, device="xcku060"):
+    """Resources of Module m -> dict module type -> (number of instances,
+    Counter of resources). Only the statements and memories of a module
+    itself are attributed to it, not those of its submodules."""
+    if device not in devices:
+        raise ValueError("Unknown device {} (known: {})".format(device, ", ".join(devices)))
+    uram = devices[device]["uram"] > 0
+    m.get_fragment()
+    usage = dict()
+    for module in _modules(m):
+        own = module._fragment
+        sub_comb, sub_sync, sub_specials = set(), set(), set()
+        for name, submodule in module._submodules:
+            sub_comb |= set(id(s) for s in submodule._fragment.comb)
+            sub_sync |= set(id(s) for statements in submodule._fragment.sync.values() for s in statements)
+            sub_specials |= submodule._fragment.specials
+        comb = [s for s in own.comb if id(s) not in sub_comb]
+        sync = {cd: [s for s in statements if id(s) not in sub_sync] for cd, statements in own.sync.items()}
+        u = logic_usage(comb, sync)
+        for special in own.specials - sub_specials:
+            if isinstance(special, Memory):
+                u += memory_usage(special, uram=uram)
+            elif isinstance(special, Instance):
+                u["instance"] += 1
+        name = type(module).__name__
+        count, u_type = usage.get(name, (0, Counter()))
+        usage[name] = (count + 1, u_type + u)
+    return usage
+
+def total(usage):
+    t = Counter()
+    for count, u in usage.values():
+        t += u
+    return t
+
+def _used(u):
+    """Device resources used, LUT RAM counted as LUTs."""
+    return dict(bram36=u["bram18"]/2, uram=u["uram"], lut=u["lut"] + u["lutram"], ff=u["ff"], dsp=u["dsp"])
+
+def fits(u, device="xcku060", utilization=0.8):
+    """Whether resources u fit into `utilization` of every resource of the
+    device; routing gets hard beyond that."""
+    return all(v <= utilization*devices[device][k] for k, v in _used(u).items())
+
+def format_report(usage, device="xcku060", utilization=0.8):
+    lines = ["{:<32} {:>5} {:>8} {:>6} {:>8} {:>9} {:>9} {:>5}".format("module", "count", "BRAM36", "URAM", "LUTRAM", "LUT", "FF", "DSP")]
+    for name, (count, u) in sorted(usage.items(), key=lambda x: (-x[1][1]["bram18"], -x[1][1]["lut"], x[0])):
+        lines.append("{:<32} {:>5} {:>8.1f} {:>6} {:>8} {:>9} {:>9} {:>5}".format(name, count, u["bram18"]/2, u["uram"], u["lutram"], u["lut"], u["ff"], u["dsp"]))
+    t = total(usage)
+    lines.append("{:<32} {:>5} {:>8.1f} {:>6} {:>8} {:>9} {:>9} {:>5}".format("total", "", t["bram18"]/2, t["uram"], t["lutram"], t["lut"], t["ff"], t["dsp"]))
+    used = _used(t)
+    lines.append("{}: ".format(device) + ", ".join("{} {:.0%}".format(k.upper(), v/devices[device][k]) for k, v in used.items() if devices[device][k]))
+    if t["instance"]:
+        lines.append("{} black box instances not included".format(t["instance"]))
+    lines.append("fits into {:.0%} of {}: {}".format(utilization, device, "yes" if fits(t, device, utilization) else "NO"))
+    return "\n".join(lines)
+
+def largest_num_pe(args, make_design, num_fpga=1, device="xcku060", utilization=0.8, inverted=None, max_num_pe=1024):
+    """Largest num_pe for which the design fits on num_fpga devices, with
+    the graph and other settings of args and the configuration files.
+    make_design(config) returns the modules to estimate, e.g. one per FPGA.
+    Doubles num_pe until the design no longer fits, then bisects."""
+    logger = logging.getLogger('config')
+
+    def fits_with(num_pe):
+        if args.configfiles:
+            configparser = read_config_files(args.configfiles)
+        else:
+            configparser = read_config_files()
+        configparser['arch']['num_pe'] = str(num_pe)
+        configparser['arch']['num_fpga'] = str(num_fpga)
+        configparser.remove_option('arch', 'num_pe_per_fpga')
+        # keep the log of the candidates quiet and out of log files
+        configparser['logging']['console_log_level'] = 'WARNING'
+        configparser['logging']['disable_logfile'] = 'True'
+        root = logging.getLogger()
+        handlers = list(root.handlers)
+        try:
+            _, config = extract_args(args, configparser, inverted=inverted)
+        except (ValueError, AssertionError) as e:
+            logger.info("num_pe = {}: no configuration ({})".format(num_pe, e))
+            return False
+        finally:
+            root.handlers = handlers
+        ok = all(fits(total(estimate(m, device)), device, utilization) for m in make_design(config))
+        logger.info("num_pe = {}: {}".format(num_pe, "fits" if ok else "does not fit"))
+        return ok
+
+    if not fits_with(num_fpga):
+        return 0
+    lo, hi = num_fpga, 2*num_fpga
+    while hi <= max_num_pe and fits_with(hi):
+        lo, hi = hi, hi*2
+    if hi > max_num_pe:
+        return lo
+    while hi - lo > 1:
+        mid = (lo + hi)//2
+        if fits_with(mid):
+            lo = mid
+        else:
+            hi = mid
+    return lo
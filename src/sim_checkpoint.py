@@ -0,0 +1,111 @@
+from migen import *
+from migen.fhdl.structure import _Assign
+from migen.fhdl.tools import list_targets
+
+import pickle
+import logging
+
+class SimulationStopped(Exception):
+    pass
+
+def _memories(module):
+    memories = {special for special in module._fragment.specials if isinstance(special, Memory)}
+    for _, submodule in module._submodules:
+        memories |= _memories(submodule)
+    return memories
+
+def _assigns(statements):
+    for statement in statements:
+        if isinstance(statement, _Assign):
+            yield statement
+        elif isinstance(statement, If):
+            yield from _assigns(statement.t)
+            yield from _assigns(statement.f)
+
+def state_signals(tb, first_sim_duid, memories=set()):
+    """All registers of tb in an order that is the same for every build of the
+    same design: design registers, the read address registers the simulator
+    adds to synchronous memory ports, then memory contents. Signals created
+    by the simulator (duid >= first_sim_duid) are only reached through the
+    memory they belong to, since their creation order is not deterministic.
+    The simulator drops the memories of tb itself from its fragment, pass them
+    in memories."""
+    fragment = tb._fragment
+    targets = set()
+    for cd in fragment.sync:
+        targets |= list_targets(fragment.sync[cd])
+    registers = sorted((s for s in targets if s.duid < first_sim_duid), key=lambda s: s.duid)
+
+    memories = sorted(memories | _memories(tb), key=lambda m: m.duid)
+    locations = [m[i] for m in memories for i in range(m.depth)]
+
+    adr_regs = dict()
+    for cd in fragment.sync:
+        for a in _assigns(fragment.sync[cd]):
+            if isinstance(a.l, Signal) and a.l.duid >= first_sim_duid and isinstance(a.r, Signal):
+                adr_regs[a.r.duid] = a.l
+    registers += [adr_regs[port.adr.duid] for m in memories for port in m.ports if port.adr.duid in adr_regs]
+
+    return registers + locations
+
+def _widths(signals):
+    return [len(s) if isinstance(s, Signal) else s.memory.width for s in signals]
+
+def save_checkpoint(filename, signals, values, **meta):
+    with open(filename, 'wb') as f:
+        pickle.dump(dict(meta, widths=_widths(signals), values=values), f)
+
+def load_checkpoint(filename, signals):
+    with open(filename, 'rb') as f:
+        checkpoint = pickle.load(f)
+    if checkpoint['widths'] != _widths(signals):
+        raise ValueError("Checkpoint {} was taken from a different design".format(filename))
+    return checkpoint
+
+@passive
+def gen_checkpoint(tb, levels, basename, first_sim_duid, memories, every=0, restore=None, stop_after=0):
+    """Save the complete register state every time all PEs have passed another
+    `every` barriers, and/or start from the state saved in `restore`.
+
+    The state is exact for the hardware; state kept by simulation generators
+    (monitors, memory models) starts over. It is therefore only exact at a
+    barrier where no memory requests are in flight. With stop_after, the
+    simulation is stopped by raising SimulationStopped once that many more
+    supersteps have completed."""
+    logger = logging.getLogger('sim.checkpoint')
+    # the simulator has lowered the fragment by the time generators run
+    signals = state_signals(tb, first_sim_duid, memories)
+    num_cycles = 0
+    level = 0
+
+    if restore:
+        checkpoint = load_checkpoint(restore, signals)
+        yield [s.eq(v) for s, v in zip(signals, checkpoint['values'])]
+        level = checkpoint['level']
+        num_cycles = checkpoint['cycle']
+        logger.info("Restored {} registers from {} (superstep {}, cycle {})".format(len(signals), restore, level, num_cycles))
+    start_level = level
+
+    while True:
+        yield
+        num_cycles += 1
+        if (yield levels[0]) <= level:
+            continue
+        current_levels = yield levels
+        if min(current_levels) != max(current_levels):
+            continue
+        level = current_levels[0]
+        if every and level % every == 0:
+            filename = "{}.level{}.ckpt".format(basename, level)
+            save_checkpoint(filename, signals, (yield signals), level=level, cycle=num_cycles)
+            logger.info("{}: superstep {} done, saved {} registers to {}".format(num_cycles, level, len(signals), filename))
+        if stop_after and level - start_level >= stop_after:
+            logger.info("{}: stopping after {} supersteps".format(num_cycles, level - start_level))
+            raise SimulationStopped()
+
+def get_checkpoint_generators(tb, config, levels):
+    if not (config.sim_checkpoint_every or config.sim_restore or config.sim_stop_after):
+        return []
+    # everything created from here on belongs to the simulator
+    first_sim_duid = Signal().duid
+    return [gen_checkpoint(tb, levels, config.vcdname or config.name, first_sim_duid, _memories(tb), every=config.sim_checkpoint_every, restore=config.sim_restore, stop_after=config.sim_stop_after)]
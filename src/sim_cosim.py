@@ -0,0 +1,214 @@
+from migen import *
+from tbsupport import get_simulators, get_monitors
+from sim_waveform import simulate
+
+from multiprocessing import Process, Barrier, RawArray
+from threading import BrokenBarrierError
+import ctypes
+import logging
+
+class ShmRing:
+    """Single producer, single consumer ring of fixed size records (lists of
+    64-bit words) in shared memory. Must be created before forking.
+
+    Slots freed by the consumer are only returned to the producer with
+    release(window) at the end of a window; can_push(window) counts the
+    slots released up to the end of the previous window, so it does not
+    depend on how far the consumer has got in the current one."""
+    def __init__(self, capacity, slot_words):
+        self.capacity = capacity
+        self.slot_words = slot_words
+        # [0]: number of records pushed, [1]: number of records popped,
+        # [2], [3]: number popped at the end of even and odd windows
+        self.buf = RawArray(ctypes.c_uint64, 4 + capacity*slot_words)
+
+    def release(self, window):
+        self.buf[2 + window % 2] = self.buf[1]
+
+    def can_push(self, window):
+        return self.buf[0] - self.buf[2 + (window - 1) % 2] < self.capacity
+
+    def empty(self):
+        return self.buf[0] == self.buf[1]
+
+    def push(self, words):
+        head = self.buf[0]
+        base = 4 + (head % self.capacity)*self.slot_words
+        self.buf[base:base + self.slot_words] = words
+        self.buf[0] = head + 1
+
+    def peek(self):
+        tail = self.buf[1]
+        if tail == self.buf[0]:
+            return None
+        base = 4 + (tail % self.capacity)*self.slot_words
+        return self.buf[base:base + self.slot_words]
+
+    def pop(self):
+        self.buf[1] += 1
+
+def _payload(interface):
+    return [s for s in interface.flatten() if s is not interface.valid and s is not interface.ack]
+
+def _pack(values, signals, num_words):
+    x = 0
+    for v, s in zip(reversed(values), reversed(signals)):
+        x = (x << len(s)) | v
+    return [(x >> (64*i)) & (2**64 - 1) for i in range(num_words)]
+
+def _unpack(words, signals):
+    x = 0
+    for w in reversed(words):
+        x = (x << 64) | w
+    values = []
+    for s in signals:
+        values.append(x & (2**len(s) - 1))
+        x >>= len(s)
+    return values
+
+class CoSimTB(Module):
+    def __init__(self, config, core):
+        self.config = config
+        self.submodules.core = core
+        # set by the synchronization generator once all FPGAs are done
+        self.global_inactive = Signal()
+
+    def gen_simulation(self, tb):
+        yield self.core.start.eq(1)
+
+class CoSim:
+    """Simulate each FPGA of a multi-FPGA design in its own process.
+
+    The external network interfaces of the cores are bridged through shared
+    memory rings. Time advances in windows of `lookahead` cycles separated by
+    a barrier across all processes (conservative synchronization): a message
+    sent in cycle t is delivered no earlier than cycle t + lookahead, so it
+    can only be needed in a later window. The link therefore looks like a
+    pipeline of `lookahead` cycles with `ring_depth` entries of buffering,
+    instead of the single FIFO stage of the one-process testbench. Entries
+    the receiver frees are only returned to the sender at the next window
+    boundary, so backpressure does not depend on process scheduling.
+
+    make_core(fpga_id) builds the core of one FPGA; it must have start and
+    global_inactive signals and network.external_network_interface_in/out.
+    out_route(fpga_id, out_index, dest_pe) gives the (fpga, in_index) that a
+    message leaving on external_network_interface_out[out_index] goes to
+    (dest_pe is None if the interface has no dest_pe). setup(fpga_id, tb),
+    if given, may add modules to tb and returns extra generators by clock
+    domain."""
+    def __init__(self, config, make_core, out_route, num_in, interface, setup=None, clocks={"sys": 10}, lookahead=16, ring_depth=64):
+        assert lookahead >= 1
+        self.config = config
+        self.make_core = make_core
+        self.out_route = out_route
+        self.setup = setup
+        self.clocks = clocks
+        self.lookahead = lookahead
+        self.num_fpga = config.addresslayout.num_fpga
+
+        payload_bits = sum(len(s) for s in _payload(interface(**config.addresslayout.get_params())))
+        self.payload_words = (payload_bits + 63)//64
+
+        self.rings = dict()
+        for src in range(self.num_fpga):
+            for dst in range(self.num_fpga):
+                if src != dst:
+                    for k in range(num_in):
+                        self.rings[(src, dst, k)] = ShmRing(ring_depth, 1 + self.payload_words)
+
+        self.barrier = Barrier(self.num_fpga)
+        # done flags of each FPGA, double buffered by window parity
+        self.status = RawArray('b', 2*self.num_fpga)
+        # window of this process, counted by gen_sync
+        self.window = 0
+
+    def gen_out(self, fpga_id, out_index, interface):
+        payload = _payload(interface)
+        rings = [ring for (src, dst, k), ring in self.rings.items() if src == fpga_id]
+        now = 0
+        while True:
+            # the destination is not known before the message is, so only accept
+            # if every ring this interface might use has room
+            yield interface.ack.eq(all(ring.can_push(self.window) for ring in rings))
+            yield
+            now += 1
+            if (yield interface.valid) and (yield interface.ack):
+                values = yield payload
+                dest_pe = (yield interface.dest_pe) if hasattr(interface, "dest_pe") else None
+                dst, k = self.out_route(fpga_id, out_index, dest_pe)
+                self.rings[(fpga_id, dst, k)].push([now] + _pack(values, payload, self.payload_words))
+
+    def gen_in(self, fpga_id, in_index, interface):
+        payload = _payload(interface)
+        rings = [ring for (src, dst, k), ring in sorted(self.rings.items()) if dst == fpga_id and k == in_index]
+        current = None
+        now = 0
+        while True:
+            if current is None:
+                heads = [(words[0], i) for i, words in ((i, ring.peek()) for i, ring in enumerate(rings)) if words and words[0] + self.lookahead <= now]
+                if heads:
+                    current = rings[min(heads)[1]]
+                    yield [s.eq(v) for s, v in zip(payload, _unpack(current.peek()[1:], payload))]
+                    yield interface.valid.eq(1)
+                else:
+                    yield interface.valid.eq(0)
+            yield
+            now += 1
+            if current is not None and (yield interface.ack):
+                current.pop()
+                current = None
+
+    def gen_sync(self, fpga_id, tb):
+        logger = logging.getLogger('sim.cosim')
+        window = 0
+        while True:
+            for _ in range(self.lookahead):
+                yield
+            for (src, dst, k), ring in self.rings.items():
+                if dst == fpga_id:
+                    ring.release(window)
+            done = (yield tb.core.global_inactive) and all(ring.empty() for (src, dst, k), ring in self.rings.items() if fpga_id in (src, dst))
+            self.status[(window % 2)*self.num_fpga + fpga_id] = done
+            self.barrier.wait()
+            if all(self.status[(window % 2)*self.num_fpga:(window % 2 + 1)*self.num_fpga]):
+                break
+            window += 1
+            self.window = window
+        if fpga_id == 0:
+            logger.info("All FPGAs done after {} windows of {} cycles".format(window + 1, self.lookahead))
+        yield tb.global_inactive.eq(1)
+        yield
+
+    def run_fpga(self, fpga_id):
+        try:
+            core = self.make_core(fpga_id)
+            tb = CoSimTB(self.config, core)
+            generators = {"sys": []}
+            if self.setup:
+                for cd, g in self.setup(fpga_id, tb).items():
+                    generators.setdefault(cd, []).extend(g)
+            generators["sys"].extend(get_monitors(tb, self.config, [core] if hasattr(core, "gen_barrier_monitor") else []))
+            generators["sys"].extend(get_simulators(tb, 'gen_simulation', tb))
+            generators["sys"].extend(passive(self.gen_out)(fpga_id, j, i) for j, i in enumerate(core.network.external_network_interface_out))
+            generators["sys"].extend(passive(self.gen_in)(fpga_id, j, i) for j, i in enumerate(core.network.external_network_interface_in))
+            generators["sys"].append(self.gen_sync(fpga_id, tb))
+            vcd_name = "{}_fpga{}.vcd".format(self.config.vcdname, fpga_id) if self.config.vcdname else None
+            simulate(tb, generators, self.config, vcd_name, levels=[a.level for a in getattr(core, "apply", [])], clocks=self.clocks)
+        except BrokenBarrierError:
+            # another process failed
+            raise SystemExit(1)
+        except BaseException:
+            self.barrier.abort()
+            raise
+
+    def run(self):
+        logger = logging.getLogger('sim.cosim')
+        logger.info("Co-simulating {} FPGAs in separate processes, lookahead {} cycles".format(self.num_fpga, self.lookahead))
+        processes = [Process(target=self.run_fpga, args=(i,), name="fpga{}".format(i)) for i in range(self.num_fpga)]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+        failed = [p.name for p in processes if p.exitcode != 0]
+        if failed:
+            raise RuntimeError("Co-simulation failed in {}".format(", ".join(failed)))
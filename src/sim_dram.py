@@ -0,0 +1,83 @@
+from collections import deque
+import logging
+
+class DRAMModel:
+    """Cycle-level timing model of a DRAM channel behind a memory controller.
+
+    Addresses are interleaved over banks at row granularity. Each bank keeps
+    one row open; a request to the open row pays tCAS, a request to a closed
+    bank tRCD + tCAS and a request to a different row tRP + tRCD + tCAS, on
+    top of a fixed controller latency. The data bus returns at most one burst
+    every cycles_per_burst cycles. All times are in cycles of the port clock."""
+
+    def __init__(self, num_banks=16, row_bytes=8192, tcas=11, trcd=11, trp=11, controller_latency=20, queue_depth=32, cycles_per_burst=1):
+        self.num_banks = num_banks
+        self.row_bytes = row_bytes
+        self.tcas = tcas
+        self.trcd = trcd
+        self.trp = trp
+        self.controller_latency = controller_latency
+        self.queue_depth = queue_depth
+        self.cycles_per_burst = cycles_per_burst
+
+        self.open_row = [None for _ in range(num_banks)]
+        self.bank_free = [0 for _ in range(num_banks)]
+        self.bus_free = 0
+        self.queue = deque()
+
+        self.num_requests = 0
+        self.num_responses = 0
+        self.row_hits = 0
+        self.row_empty = 0
+        self.row_conflicts = 0
+        self.total_latency = 0
+        self.max_occupancy = 0
+
+    def can_accept(self):
+        return len(self.queue) < self.queue_depth
+
+    def request(self, now, tag, addr):
+        assert self.can_accept()
+        row = addr // self.row_bytes
+        bank = row % self.num_banks
+        row = row // self.num_banks
+
+        if self.open_row[bank] == row:
+            self.row_hits += 1
+            access = self.tcas
+        elif self.open_row[bank] is None:
+            self.row_empty += 1
+            access = self.trcd + self.tcas
+        else:
+            self.row_conflicts += 1
+            access = self.trp + self.trcd + self.tcas
+        self.open_row[bank] = row
+
+        start = max(now, self.bank_free[bank])
+        self.bank_free[bank] = start + access - self.tcas + self.cycles_per_burst
+        ready = start + access + self.controller_latency
+
+        self.queue.append((ready, now, tag, addr))
+        self.num_requests += 1
+        self.max_occupancy = max(self.max_occupancy, len(self.queue))
+
+    def response(self, now):
+        """Return (tag, addr) of the request whose data is on the bus this
+        cycle, or None. Responses leave in request order."""
+        if not self.queue or now < self.bus_free:
+            return None
+        ready, issued, tag, addr = self.queue[0]
+        if ready > now:
+            return None
+        self.queue.popleft()
+        self.bus_free = now + self.cycles_per_burst
+        self.total_latency += now - issued
+        self.num_responses += 1
+        return tag, addr
+
+    def log_stats(self, logger):
+        if self.num_requests == 0:
+            logger.info("No DRAM requests.")
+            return
+        logger.info("{} DRAM requests: {} row hits, {} row empty, {} row conflicts".format(self.num_requests, self.row_hits, self.row_empty, self.row_conflicts))
+        logger.info("Average latency: {:.1f} cycles, max queue occupancy {}/{}".format(self.total_latency/max(1, self.num_responses), self.max_occupancy, self.queue_depth))
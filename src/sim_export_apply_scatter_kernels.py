@@ -1,6 +1,14 @@
 from migen import *
 from migen.fhdl import verilog
 from core_init import init_parse
+from core_netlistkernelwrapper import *
+from export_cache import source_files
+from tbsupport import cd
+
+import hashlib
+import shutil
+import logging
+import os
 
 def GatherApplyScatter(config):
 
@@ -9,8 +17,6 @@ def GatherApplyScatter(config):
 
     ios = {
         gatherkernel.cd_sys.clk,
-        gatherkernel.cd_sys.rst,
-        gatherkernel.level_in,
         gatherkernel.nodeid_in,
         gatherkernel.sender_in,
         gatherkernel.valid_in,
@@ -25,7 +31,7 @@ def GatherApplyScatter(config):
     ios |= set(getattr(gatherkernel.state_out, s[0]) for s in gatherkernel.state_out.layout)
 
     verilog.convert(gatherkernel,
-                    name="gather",
+                    name="{}_gather".format(config.name),
                     ios=ios
                     ).write("gather.v")
 
@@ -34,7 +40,7 @@ def GatherApplyScatter(config):
 
     ios = {
         applykernel.cd_sys.clk,
-        applykernel.cd_sys.rst,
+        applykernel.level_in,
         applykernel.nodeid_in,
         applykernel.valid_in,
         applykernel.state_in_valid,
@@ -49,7 +55,8 @@ def GatherApplyScatter(config):
         applykernel.update_valid,
         applykernel.update_round,
         applykernel.barrier_out,
-        applykernel.update_ack
+        applykernel.update_ack,
+        applykernel.kernel_error
     }
 
     ios |= set(getattr(applykernel.state_in, s[0]) for s in applykernel.state_in.layout)
@@ -57,7 +64,7 @@ def GatherApplyScatter(config):
     ios |= set(getattr(applykernel.update_out, s[0]) for s in applykernel.update_out.layout)
 
     verilog.convert(applykernel,
-                    name="apply",
+                    name="{}_apply".format(config.name),
                     ios=ios
                     ).write("apply.v")
 
@@ -66,7 +73,6 @@ def GatherApplyScatter(config):
 
     ios = {
         scatterkernel.cd_sys.clk,
-        scatterkernel.cd_sys.rst,
         scatterkernel.num_neighbors_in,
         scatterkernel.neighbor_in,
         scatterkernel.sender_in,
@@ -89,7 +95,7 @@ def GatherApplyScatter(config):
         ios |= set(getattr(scatterkernel.edgedata_in, s[0]) for s in scatterkernel.edgedata_in.layout)
 
     verilog.convert(scatterkernel,
-                    name="scatter",
+                    name="{}_scatter".format(config.name),
                     ios=ios
                     ).write("scatter.v")
 
@@ -100,7 +106,6 @@ def MixedGAS(config):
 
     ios = {
         gatherapplykernel.cd_sys.clk,
-        gatherapplykernel.cd_sys.rst,
         gatherapplykernel.level_in,
         gatherapplykernel.nodeid_in,
         gatherapplykernel.sender_in,
@@ -131,7 +136,7 @@ def MixedGAS(config):
     ios |= set(getattr(gatherapplykernel.update_out, s[0]) for s in gatherapplykernel.update_out.layout)
 
     verilog.convert(gatherapplykernel,
-                    name="gatherapply",
+                    name="{}_gatherapply".format(config.name),
                     ios=ios
                     ).write("gatherapply.v")
 
@@ -140,7 +145,6 @@ def MixedGAS(config):
 
     ios = {
         scatterkernel.cd_sys.clk,
-        scatterkernel.cd_sys.rst,
         scatterkernel.num_neighbors_in,
         scatterkernel.neighbor_in,
         scatterkernel.sender_in,
@@ -163,10 +167,62 @@ def MixedGAS(config):
         ios |= set(getattr(scatterkernel.edgedata_in, s[0]) for s in scatterkernel.edgedata_in.layout)
 
     verilog.convert(scatterkernel,
-                    name="scatter",
+                    name="{}_scatter".format(config.name),
                     ios=ios
                     ).write("scatter.v")
 
+_netlist_wrappers = (NetlistGatherKernelWrapper, NetlistApplyKernelWrapper, NetlistGatherApplyKernelWrapper, NetlistScatterKernelWrapper)
+
+def kernel_key(config):
+    """Hash of what the kernels are built from: the algorithm, the layout
+    parameters, the scalar settings of config (like pr's const_base) and the
+    source files."""
+    h = hashlib.sha256()
+    h.update(config.name.encode())
+    h.update(repr(sorted(config.addresslayout.get_params().items())).encode())
+    for k, v in sorted(vars(config).items()):
+        if isinstance(v, (str, int, float, bool)) and not k.startswith("export_") and not k.startswith("sim_"):
+            h.update("{}={!r}".format(k, v).encode())
+    for filename in source_files(config):
+        with open(filename, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def use_kernel_library(config, directory):
+    """Export the kernels of config into the kernel library `directory`
+    unless it already holds them, and make the cores instantiate them as
+    black boxes through the netlist wrappers. Returns the Verilog files of
+    the kernels, which have to be added to the synthesis project."""
+    logger = logging.getLogger('export')
+    kernels = ["gatherapplykernel"] if hasattr(config, "gatherapplykernel") else ["gatherkernel", "applykernel"]
+    kernels.append("scatterkernel")
+    if any(getattr(config, k) in _netlist_wrappers for k in kernels):
+        raise ValueError("{} already uses netlist kernels".format(config.name))
+
+    entry = os.path.join(directory, "{}_{}".format(config.name, kernel_key(config)[:16]))
+    if os.path.isdir(entry):
+        logger.info("Using kernels from {}".format(entry))
+    else:
+        logger.info("Exporting kernels to {}".format(entry))
+        tmp = entry + ".tmp{}".format(os.getpid())
+        os.makedirs(tmp, exist_ok=True)
+        with cd(tmp):
+            if hasattr(config, "gatherapplykernel"):
+                MixedGAS(config)
+            else:
+                GatherApplyScatter(config)
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp)
+
+    if hasattr(config, "gatherapplykernel"):
+        config.gatherapplykernel = NetlistGatherApplyKernelWrapper
+    else:
+        config.gatherkernel = NetlistGatherKernelWrapper
+        config.applykernel = NetlistApplyKernelWrapper
+    config.scatterkernel = NetlistScatterKernelWrapper
+    return [os.path.join(entry, f) for f in sorted(os.listdir(entry))]
 
 def main():
     args, config = init_parse()
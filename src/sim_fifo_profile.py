@@ -0,0 +1,142 @@
+"""Occupancy profile of the FIFOs of a design in simulation.
+
+Every FIFO-like module (we/re/readable/writable or din/dout records with
+valid/ack) is watched at its ports: high-water mark, cycles in which a
+write was refused because it was full (full stalls) and cycles in which the
+reader was ready but it was empty (empty stalls). The recommended depth of
+a FIFO that stalled when full is its depth plus the longest run of full
+stalls, rounded up to a power of two, i.e. enough to have taken the entries
+that waited; FIFOs that never filled keep their depth.
+
+Recommendations are per site, "Class.attribute" of the module owning the
+FIFO, the maximum over all its instances, and are written as a
+[fifo_depths] section that is read back with -c config.ini,FILE. Only sites
+that pass their depth through CoreConfig.fifo_depth take the override."""
+
+from migen import *
+
+import logging
+
+def _pow2ceil(n):
+    return 1 << max(0, n - 1).bit_length()
+
+def _is_fifo(m):
+    if all(hasattr(m, a) for a in ("we", "re", "readable", "writable")):
+        return True
+    din, dout = getattr(m, "din", None), getattr(m, "dout", None)
+    return all(hasattr(r, "valid") and hasattr(r, "ack") for r in (din, dout))
+
+def _depth(m):
+    if isinstance(getattr(m, "depth", None), int):
+        return m.depth
+    for name, submodule in m._submodules:
+        depth = _depth(submodule)
+        if depth is not None:
+            return depth
+    return None
+
+def find_fifos(m, path=None, owner=None, attr=None):
+    """-> list of (path, site, FIFO module) below Module m. Modules that
+    are clock domain renamed run outside sys and are left out."""
+    path = path or type(m).__name__
+    if "get_fragment" in vars(m):
+        return []
+    if owner is not None and _is_fifo(m):
+        site = "{}.{}".format(type(owner).__name__, attr if attr else type(m).__name__)
+        return [(path, site, m)]
+    fifos = []
+    names = [name for name, submodule in m._submodules]
+    for i, (name, submodule) in enumerate(m._submodules):
+        if name is None:
+            subpath = "{}.{}{}".format(path, type(submodule).__name__, i)
+        elif names.count(name) > 1:
+            # list of submodules
+            subpath = "{}.{}{}".format(path, name, names[:i].count(name))
+        else:
+            subpath = "{}.{}".format(path, name)
+        fifos.extend(find_fifos(submodule, subpath, m, name))
+    return fifos
+
+class FIFOProfile:
+    def __init__(self, path, site, depth):
+        self.path = path
+        self.site = site
+        self.depth = depth
+        self.level = 0
+        self.high_water = 0
+        self.pushes = 0
+        self.full_stalls = 0
+        self.empty_stalls = 0
+        self.full_run = 0
+        self.max_full_run = 0
+
+    def sample(self, push, pop, full_stall, empty_stall):
+        self.level += push - pop
+        self.pushes += push
+        self.high_water = max(self.high_water, self.level)
+        self.full_stalls += full_stall
+        self.empty_stalls += empty_stall
+        self.full_run = self.full_run + 1 if full_stall else 0
+        self.max_full_run = max(self.max_full_run, self.full_run)
+
+    def recommended_depth(self):
+        if self.depth is None or not self.full_stalls:
+            return self.depth
+        return _pow2ceil(self.depth + self.max_full_run)
+
+def _ports(fifo):
+    """-> (write request, write accepted, read request, read accepted)"""
+    if hasattr(fifo, "we"):
+        return fifo.we, fifo.writable, fifo.re, fifo.readable
+    return fifo.din.valid, fifo.din.ack, fifo.dout.ack, fifo.dout.valid
+
+def recommendations(profiles):
+    """-> dict site -> (current depth, recommended depth), maximum over the
+    instances of each site."""
+    sites = {}
+    for p in profiles:
+        if p.depth is None:
+            continue
+        depth, recommended = sites.get(p.site, (0, 0))
+        sites[p.site] = (max(depth, p.depth), max(recommended, p.recommended_depth()))
+    return sites
+
+def write_fifo_depths(filename, profiles):
+    with open(filename, "w") as f:
+        f.write("# recommended FIFO depths from simulation, use with -c config.ini,{}\n".format(filename))
+        f.write("[fifo_depths]\n")
+        for site, (depth, recommended) in sorted(recommendations(profiles).items()):
+            if recommended != depth:
+                f.write("# was {}\n".format(depth))
+                f.write("{} = {}\n".format(site, recommended))
+
+def format_profile(profiles, num_cycles):
+    lines = ["{:<60} {:>6} {:>6} {:>9} {:>9} {:>9} {:>6}".format("FIFO", "depth", "max", "pushes", "full", "empty", "rec.")]
+    for p in sorted(profiles, key=lambda p: (-p.full_stalls, p.path)):
+        lines.append("{:<60} {:>6} {:>6} {:>9} {:>9} {:>9} {:>6}".format(p.path, p.depth if p.depth is not None else "?", p.high_water, p.pushes, p.full_stalls, p.empty_stalls, p.recommended_depth() if p.depth is not None else "?"))
+    lines.append("{} cycles; full/empty: stall cycles of writer/reader".format(num_cycles))
+    return "\n".join(lines)
+
+def gen_fifo_profile(tb, filename):
+    logger = logging.getLogger('sim.fifo_profile')
+    fifos = find_fifos(tb)
+    profiles = [FIFOProfile(path, site, _depth(fifo)) for path, site, fifo in fifos]
+    ports = [s for path, site, fifo in fifos for s in _ports(fifo)]
+    num_cycles = 0
+    try:
+        while not (yield tb.global_inactive):
+            values = yield ports
+            for i, p in enumerate(profiles):
+                wreq, wok, rreq, rok = values[4*i:4*i+4]
+                p.sample(wreq & wok, rreq & rok, wreq & ~wok, rreq & ~rok)
+            yield
+            num_cycles += 1
+    finally:
+        logger.info("FIFO occupancy:\n" + format_profile(profiles, num_cycles))
+        write_fifo_depths(filename, profiles)
+        logger.info("Recommended FIFO depths written to {}".format(filename))
+
+def get_fifo_profilers(tb, config):
+    if not config.sim_fifo_profile:
+        return []
+    return [gen_fifo_profile(tb, config.sim_fifo_profile)]
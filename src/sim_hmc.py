@@ -0,0 +1,252 @@
+from collections import deque
+import heapq
+import random
+import logging
+
+from migen.sim import passive
+
+class HMCModel:
+    """Timing model of an HMC device shared by several controller ports.
+
+    Each port has an input queue from which requests are dispatched to the vault
+    owning their address (addresses are interleaved over vaults in blocks of
+    block_bytes). A vault serves one request at a time, for vault_cycles_per_flit
+    cycles per flit, and holds at most vault_queue_depth requests. The access
+    latency is drawn per request: latency_dist "fixed", "uniform" (latency plus
+    0..latency_spread) or "exponential" (latency plus an exponential tail of mean
+    latency_spread), or replayed from latency_trace, a file of whitespace
+    separated cycle counts used round robin. Responses are returned per port as
+    soon as they are ready, so tags come back out of order unless in_order is
+    set. The links carry at most link_flits_per_cycle flits per cycle in each
+    direction, counting one header flit per packet. All times are in cycles of
+    the port clock."""
+
+    def __init__(self, num_ports=9, num_vaults=16, block_bytes=128, flit_bytes=16, latency=100, latency_dist="fixed", latency_spread=0, latency_trace=None, vault_queue_depth=16, vault_cycles_per_flit=1, port_queue_depth=16, link_flits_per_cycle=8, in_order=False, seed=0):
+        if latency_dist not in ("fixed", "uniform", "exponential"):
+            raise ValueError("Unknown latency distribution \"{}\"".format(latency_dist))
+        self.num_ports = num_ports
+        self.num_vaults = num_vaults
+        self.block_bytes = block_bytes
+        self.flit_bytes = flit_bytes
+        self.latency = latency
+        self.latency_dist = latency_dist
+        self.latency_spread = latency_spread
+        self.vault_queue_depth = vault_queue_depth
+        self.vault_cycles_per_flit = vault_cycles_per_flit
+        self.port_queue_depth = port_queue_depth
+        self.link_flits_per_cycle = link_flits_per_cycle
+        self.in_order = in_order
+        self.random = random.Random(seed)
+
+        self.trace = None
+        if latency_trace:
+            with open(latency_trace) as f:
+                self.trace = [int(x) for line in f for x in line.split('#')[0].split()]
+            if not self.trace:
+                raise ValueError("Latency trace {} is empty".format(latency_trace))
+        self.trace_pos = 0
+
+        self.now = -1
+        self.seq = 0
+        self.req_credit = link_flits_per_cycle
+        self.rsp_credit = link_flits_per_cycle
+        self.input = [deque() for _ in range(num_ports)]
+        self.vault_free = [0 for _ in range(num_vaults)]
+        self.vault_occupancy = [0 for _ in range(num_vaults)]
+        self.ready = [[] for _ in range(num_ports)]
+        self.outstanding = [dict() for _ in range(num_ports)]
+        self.current = [None for _ in range(num_ports)]
+
+        self.num_reads = 0
+        self.num_writes = 0
+        self.num_responses = 0
+        self.num_reordered = 0
+        self.total_latency = 0
+        self.max_latency = 0
+        self.vault_requests = [0 for _ in range(num_vaults)]
+        self.port_vault_requests = [[0 for _ in range(num_vaults)] for _ in range(num_ports)]
+        self.vault_wait_cycles = 0
+        self.max_vault_occupancy = 0
+        self.max_outstanding = [0 for _ in range(num_ports)]
+        self.link_stall_cycles = 0
+
+    def vault(self, addr):
+        return (addr // self.block_bytes) % self.num_vaults
+
+    def sample_latency(self):
+        if self.trace:
+            latency = self.trace[self.trace_pos % len(self.trace)]
+            self.trace_pos += 1
+            return latency
+        if self.latency_dist == "uniform":
+            return self.latency + self.random.randint(0, self.latency_spread)
+        if self.latency_dist == "exponential" and self.latency_spread:
+            return self.latency + int(self.random.expovariate(1/self.latency_spread))
+        return self.latency
+
+    def _advance(self, now):
+        if now <= self.now:
+            return
+        if self.link_flits_per_cycle:
+            elapsed = now - max(self.now, 0)
+            self.req_credit = min(self.link_flits_per_cycle, self.req_credit + elapsed*self.link_flits_per_cycle)
+            self.rsp_credit = min(self.link_flits_per_cycle, self.rsp_credit + elapsed*self.link_flits_per_cycle)
+        self.now = now
+
+        for port in range(self.num_ports):
+            if not self.input[port]:
+                continue
+            issued, seq, tag, addr, size, write = self.input[port][0]
+            v = self.vault(addr)
+            if self.vault_occupancy[v] == self.vault_queue_depth:
+                continue
+            self.input[port].popleft()
+            self.vault_occupancy[v] += 1
+            self.max_vault_occupancy = max(self.max_vault_occupancy, self.vault_occupancy[v])
+            start = max(now, self.vault_free[v])
+            self.vault_wait_cycles += start - now
+            self.vault_free[v] = start + size*self.vault_cycles_per_flit
+            ready = start + self.sample_latency()
+            heapq.heappush(self.ready[port], (seq if self.in_order else ready, ready, seq, issued, tag, addr, size, write))
+
+    def can_accept(self, now, port):
+        self._advance(now)
+        if self.link_flits_per_cycle and self.req_credit < 1:
+            self.link_stall_cycles += 1
+            return False
+        return len(self.input[port]) < self.port_queue_depth
+
+    def request(self, now, port, tag, addr, size=1, write=False):
+        assert self.can_accept(now, port)
+        assert tag not in self.outstanding[port], "Tag {} reused on port {} while in flight".format(tag, port)
+        size = max(1, size)
+        if self.link_flits_per_cycle:
+            self.req_credit -= 1 + (size if write else 0)
+        self.outstanding[port][tag] = self.seq
+        self.max_outstanding[port] = max(self.max_outstanding[port], len(self.outstanding[port]))
+        self.input[port].append((now, self.seq, tag, addr, size, write))
+        self.seq += 1
+        self.vault_requests[self.vault(addr)] += 1
+        self.port_vault_requests[port][self.vault(addr)] += 1
+        if write:
+            self.num_writes += 1
+        else:
+            self.num_reads += 1
+
+    def response(self, now, port):
+        """Return (tag, addr, flit, write) of the response flit on the port this
+        cycle, or None. Reads return size flits back to back, writes one flit."""
+        self._advance(now)
+        if self.current[port] is None and (not self.ready[port] or self.ready[port][0][1] > now):
+            return None
+        if self.link_flits_per_cycle and self.rsp_credit < 1:
+            self.link_stall_cycles += 1
+            return None
+        if self.current[port] is None:
+            _, _, seq, issued, tag, addr, size, write = heapq.heappop(self.ready[port])
+            if seq != min(self.outstanding[port].values()):
+                self.num_reordered += 1
+            self.total_latency += now - issued
+            self.max_latency = max(self.max_latency, now - issued)
+            self.current[port] = [tag, addr, 0, 1 if write else size, write]
+            cost = 1
+        else:
+            cost = 0
+        tag, addr, flit, nflits, write = self.current[port]
+        cost += 0 if write else 1
+        if self.link_flits_per_cycle:
+            self.rsp_credit -= cost
+        self.current[port][2] += 1
+        if flit + 1 == nflits:
+            self.current[port] = None
+            del self.outstanding[port][tag]
+            self.vault_occupancy[self.vault(addr)] -= 1
+            self.num_responses += 1
+        return tag, addr, flit, write
+
+    def log_stats(self, logger):
+        if self.num_reads + self.num_writes == 0:
+            logger.info("No HMC requests.")
+            return
+        logger.info("{} HMC reads, {} writes, {} responses returned out of order".format(self.num_reads, self.num_writes, self.num_reordered))
+        logger.info("Average latency: {:.1f} cycles, max {} cycles, {} cycles stalled on link bandwidth".format(self.total_latency/max(1, self.num_responses), self.max_latency, self.link_stall_cycles))
+        logger.info("Max tags in flight per port: {}".format(self.max_outstanding))
+        logger.info("Requests per vault: {}, max vault occupancy {}/{}".format(self.vault_requests, self.max_vault_occupancy, self.vault_queue_depth))
+        logger.info("Vault balance: busiest vault {:.2f}x the mean, {} cycles waited for busy vaults".format(self.vault_imbalance(), self.vault_wait_cycles))
+        for port, requests in enumerate(self.port_vault_requests):
+            if any(requests):
+                logger.debug("Port {} requests per vault: {}".format(port, requests))
+
+    def vault_imbalance(self):
+        """Requests to the busiest vault relative to the mean, 1 if perfectly
+        balanced."""
+        total = sum(self.vault_requests)
+        return max(self.vault_requests)*self.num_vaults/total if total else 1
+
+
+def init_memory(init, init_elem_size_bytes, flit_bytes=16):
+    """Pack init (a list of init_elem_size_bytes sized elements stored from
+    address 0, as in PicoPlatform) into a dict of flits keyed by flit address."""
+    memory = dict()
+    for i, x in enumerate(init):
+        addr = i*init_elem_size_bytes
+        flit = addr // flit_bytes
+        memory[flit] = memory.get(flit, 0) | (x << ((addr % flit_bytes)*8))
+    return memory
+
+@passive
+def gen_hmc_port(port, port_id, model, memory, tb=None):
+    """Drive the controller side of an HMC port from model. memory is shared by
+    all ports of the device. If tb is given, the model statistics are logged
+    once tb.global_inactive is reached."""
+    logger = logging.getLogger("sim.hmc")
+    flit_bytes = len(port.rd_data)//8
+    pending_writes = deque()
+    write_data = deque()
+    stats_logged = tb is None or port_id != 0
+    now = 0
+    yield port.rd_data_valid.eq(0)
+    yield port.wr_data_ready.eq(1)
+    while True:
+        yield port.cmd_ready.eq(model.can_accept(now, port_id))
+        response = model.response(now, port_id)
+        if response:
+            tag, addr, flit, write = response
+            yield port.rd_data.eq(0 if write else memory.get(addr//flit_bytes + flit, 0))
+            yield port.rd_data_tag.eq(tag)
+            yield port.dinv.eq(write)
+            yield port.rd_data_valid.eq(1)
+        else:
+            yield port.rd_data_valid.eq(0)
+        yield
+        now += 1
+        if (yield port.wr_data_valid):
+            write_data.append((yield port.wr_data))
+        if (yield port.cmd_ready) and (yield port.cmd_valid):
+            addr = (yield port.addr)
+            size = max(1, (yield port.size))
+            write = (yield port.cmd) != port.HMC_CMD_RD
+            if write:
+                pending_writes.extend(addr//flit_bytes + i for i in range(size))
+            model.request(now, port_id, (yield port.tag), addr, size=size, write=write)
+        while pending_writes and write_data:
+            memory[pending_writes.popleft()] = write_data.popleft()
+        if not stats_logged and (yield tb.global_inactive):
+            model.log_stats(logger)
+            stats_logged = True
+
+def use_hmc_model(platform, num_ports, config, tb=None):
+    """Replace the fixed-behavior responders of the first num_ports HMC ports of
+    platform by gen_hmc_port, with the model parameters from config.hmc_timing.
+    Call before platform.getSimGenerators()."""
+    model = HMCModel(num_ports=num_ports, **config.hmc_timing)
+    init = config.adj_val if config.memtype != "BRAM" else []
+    memory = init_memory(init, config.addresslayout.adj_val_entry_size_in_bytes, flit_bytes=model.flit_bytes)
+    def responder(port, port_id):
+        def gen_responses(*args, **kwargs):
+            return gen_hmc_port(port, port_id, model, memory, tb=tb)
+        return gen_responses
+    for i in range(num_ports):
+        port = platform.picoHMCports[i]
+        port.gen_responses = responder(port, i)
+    return model
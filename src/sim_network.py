@@ -2,7 +2,9 @@ from migen import *
 
 from core_interfaces import ApplyInterface, NetworkInterface
 from sim_barriercounter import Barriercounter
+from tbsupport import every_cycle
 
+from collections import deque
 import logging
 
 class Arbiter(Module):
@@ -39,6 +41,7 @@ class Arbiter(Module):
             ).Else(
                 self.barriercounter.apply_interface_out.connect(self.apply_interface_out)
             )
+    @every_cycle
     def gen_selfcheck(self, tb):
         logger = logging.getLogger("sim.arbiter" + str(self.pe_id))
         level = 0
@@ -58,39 +61,151 @@ class Arbiter(Module):
 
 
 
+class NetworkModel:
+    """Behavioural model of the message network between num_pe PEs grouped into
+    FPGAs of num_pe_per_fpga PEs.
+
+    Every ordered pair of PEs has a link that takes `latency` cycles and
+    carries up to `bandwidth` messages per cycle. Messages to another FPGA
+    additionally go through the link between the two FPGAs, which is shared by
+    all PEs and takes `fpga_latency` cycles at `fpga_bandwidth` messages per
+    cycle. Each PE can have `buffer_depth` messages in flight before it is
+    backpressured. All operations are O(1) per message."""
+    def __init__(self, num_pe, num_pe_per_fpga, num_channels, latency=1, bandwidth=1, fpga_latency=32, fpga_bandwidth=1, buffer_depth=16):
+        assert latency >= 1
+        self.num_pe_per_fpga = num_pe_per_fpga
+        self.latency = latency
+        self.fpga_latency = fpga_latency
+        self.interval = 1/bandwidth
+        self.fpga_interval = 1/fpga_bandwidth
+        self.buffer_depth = buffer_depth
+        # time at which each link can take the next message
+        self.link_free = dict()
+        # messages in flight, by arrival time, per destination PE
+        self.calendar = [dict() for _ in range(num_pe)]
+        # arrived messages per destination PE and round
+        self.ready = [[deque() for _ in range(num_channels)] for _ in range(num_pe)]
+        self.in_flight = [0 for _ in range(num_pe)]
+        self.advanced = [-1 for _ in range(num_pe)]
+
+        self.num_messages = 0
+        self.num_remote = 0
+        self.total_latency = 0
+        self.max_ready = 0
+
+    def fpga(self, pe):
+        return pe // self.num_pe_per_fpga
+
+    def _traverse(self, link, now, interval, latency):
+        start = max(now, self.link_free.get(link, 0))
+        self.link_free[link] = start + interval
+        return start + latency
+
+    def can_send(self, src):
+        return self.in_flight[src] < self.buffer_depth
+
+    def send(self, now, src, dest, roundpar, msg):
+        t = self._traverse((src, dest), now, self.interval, self.latency)
+        if self.fpga(src) != self.fpga(dest):
+            t = self._traverse((self.fpga(src), self.fpga(dest), None), t, self.fpga_interval, self.fpga_latency)
+            self.num_remote += 1
+        t = int(-(-t // 1))
+        if t <= self.advanced[dest]:
+            # the destination has already moved past t in this cycle
+            self.ready[dest][roundpar].append((src, msg))
+            self.total_latency += t - now
+        else:
+            self.calendar[dest].setdefault(t, []).append((now, src, roundpar, msg))
+        self.in_flight[src] += 1
+        self.num_messages += 1
+
+    def advance(self, now, dest):
+        self.advanced[dest] = now
+        arrived = self.calendar[dest].pop(now, None)
+        if arrived:
+            for sent, src, roundpar, msg in arrived:
+                self.ready[dest][roundpar].append((src, msg))
+                self.total_latency += now - sent
+            self.max_ready = max(self.max_ready, sum(len(q) for q in self.ready[dest]))
+
+    def peek(self, dest, roundpar):
+        q = self.ready[dest][roundpar]
+        return q[0][1] if q else None
+
+    def pop(self, dest, roundpar):
+        src, _ = self.ready[dest][roundpar].popleft()
+        self.in_flight[src] -= 1
+
+    def log_stats(self, logger):
+        logger.info("{} messages, {} between FPGAs, average latency {:.1f} cycles, at most {} waiting at a PE".format(self.num_messages, self.num_remote, self.total_latency/self.num_messages if self.num_messages else 0, self.max_ready))
+
 class Network(Module):
-    def __init__(self, config):
-        num_pe = config.addresslayout.num_pe
-        num_nodes_per_pe = config.addresslayout.num_nodes_per_pe
+    """Drop-in replacement for fifo_network.Network/MultiNetwork in simulation,
+    backed by a NetworkModel that is shared between the networks of all FPGAs
+    of the testbench. Parameters come from the [sim_network] section of
+    config.ini."""
+    def __init__(self, config, fpga_id=0):
+        addresslayout = config.addresslayout
+        self.pe_start = fpga_id*addresslayout.num_pe_per_fpga
+        self.pe_end = min((fpga_id+1)*addresslayout.num_pe_per_fpga, addresslayout.num_pe)
+        num_local_pe = self.pe_end - self.pe_start
+        self.fpga_id = fpga_id
 
-        self.apply_interface = [ApplyInterface(name="network_out", **config.addresslayout.get_params()) for _ in range(num_pe)]
-        self.network_interface = [NetworkInterface(name="network_in", **config.addresslayout.get_params()) for _ in range(num_pe)]
+        self.apply_interface = [ApplyInterface(name="network_out", **addresslayout.get_params()) for _ in range(num_local_pe)]
+        self.network_interface = [NetworkInterface(name="network_in", **addresslayout.get_params()) for _ in range(num_local_pe)]
+        if config.local_bypass:
+            self.local_interface = [NetworkInterface(name="network_local_in", **addresslayout.get_params()) for _ in range(num_local_pe)]
 
-        self.submodules.arbiter = [Arbiter(sink, config) for sink in range(num_pe)]
+        # traffic between FPGAs goes through the model, these stay idle
+        self.external_network_interface_in = [NetworkInterface(name="ext_network_in", **addresslayout.get_params()) for _ in range(addresslayout.num_fpga - 1)]
+        self.external_network_interface_out = [NetworkInterface(name="ext_network_out", **addresslayout.get_params()) for _ in range(addresslayout.num_fpga - 1)]
+
+        self.submodules.arbiter = [Arbiter(self.pe_start + sink, config) for sink in range(num_local_pe)]
         self.comb += [a.apply_interface_out.connect(self.apply_interface[i]) for i,a in enumerate(self.arbiter)]
 
+    @staticmethod
+    def get_model(tb):
+        if not hasattr(tb, "sim_network_model"):
+            addresslayout = tb.config.addresslayout
+            tb.sim_network_model = NetworkModel(addresslayout.num_pe, addresslayout.num_pe_per_fpga, addresslayout.num_channels, **tb.config.sim_network)
+        return tb.sim_network_model
+
     def gen_simulation(self, tb):
-        messages = [[list() for _ in range(tb.config.addresslayout.num_channels)] for _ in range(tb.config.addresslayout.num_pe)]
-        rnd = [0 for _ in range(tb.config.addresslayout.num_channels)]
+        logger = logging.getLogger('sim.network')
+        model = self.get_model(tb)
+        num_local_pe = len(self.arbiter)
+        sources = [self.network_interface]
+        if hasattr(self, "local_interface"):
+            sources.append(self.local_interface)
+        rnd = [0 for _ in range(num_local_pe)]
+        now = 0
         while not (yield tb.global_inactive):
-            for i in range(tb.config.addresslayout.num_pe):
-                yield self.network_interface[i].ack.eq(1)
+            for i in range(num_local_pe):
+                pe = self.pe_start + i
+                model.advance(now, pe)
+                for interfaces in sources:
+                    yield interfaces[i].ack.eq(model.can_send(pe))
 
                 rnd[i] = (yield self.arbiter[i].current_round)
-                if len(messages[i][rnd[i]]) > 0:
-                    msg = messages[i][rnd[i]][0]
+                msg = model.peek(pe, rnd[i])
+                if msg is not None:
                     yield self.arbiter[i].apply_interface_in.valid.eq(1)
                     yield self.arbiter[i].apply_interface_in.msg.raw_bits().eq(msg)
                 else:
                     yield self.arbiter[i].apply_interface_in.valid.eq(0)
             yield
+            now += 1
 
-            for i in range(tb.config.addresslayout.num_pe):
-                if (yield self.network_interface[i].valid):
-                    msg = (yield self.network_interface[i].msg.raw_bits())
-                    dest_pe = (yield self.network_interface[i].dest_pe)
-                    roundpar = (yield self.network_interface[i].msg.roundpar)
-                    messages[dest_pe][roundpar].append(msg)
+            for i in range(num_local_pe):
+                pe = self.pe_start + i
+                for interfaces in sources:
+                    if (yield interfaces[i].valid) and (yield interfaces[i].ack):
+                        msg = (yield interfaces[i].msg.raw_bits())
+                        dest_pe = (yield interfaces[i].dest_pe) if interfaces is self.network_interface else pe
+                        roundpar = (yield interfaces[i].msg.roundpar)
+                        model.send(now, pe, dest_pe, roundpar, msg)
 
                 if (yield self.arbiter[i].apply_interface_in.valid) and (yield self.arbiter[i].apply_interface_in.ack):
-                    messages[i][rnd[i]].pop(0)
+                    model.pop(pe, rnd[i])
+        if self.fpga_id == 0:
+            model.log_stats(logger)
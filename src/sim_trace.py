@@ -0,0 +1,235 @@
+from migen import *
+
+from core_init import init_parse
+
+from importlib import import_module
+from collections import deque
+import inspect
+import struct
+import logging
+
+# cycle, source PE, destination PE, flags (bit 0: barrier, bits 1-7: round)
+_header = struct.Struct("<4sHH")
+_record = struct.Struct("<IHHB")
+_magic = b"FGMT"
+_version = 1
+
+class TraceWriter:
+    def __init__(self, filename, num_pe):
+        self.f = open(filename, "wb")
+        self.f.write(_header.pack(_magic, _version, num_pe))
+
+    def write(self, cycle, src, dest, roundpar, barrier):
+        self.f.write(_record.pack(cycle, src, dest, (roundpar << 1) | barrier))
+
+    def close(self):
+        self.f.close()
+
+def read_trace(filename):
+    """-> num_pe, list of (cycle, src, dest, roundpar, barrier)"""
+    with open(filename, "rb") as f:
+        data = f.read()
+    magic, version, num_pe = _header.unpack_from(data)
+    if magic != _magic or version != _version:
+        raise ValueError("{} is not a message trace".format(filename))
+    records = [(cycle, src, dest, flags >> 1, flags & 1) for cycle, src, dest, flags in _record.iter_unpack(data[_header.size:])]
+    return num_pe, records
+
+@passive
+def gen_trace_capture(tb, scatter, filename):
+    """Record every message leaving a Scatter, through its network_interface
+    or, with local_bypass, its local_interface to its own PE."""
+    writer = TraceWriter(filename, tb.config.addresslayout.num_pe)
+    num_cycles = 0
+    try:
+        while True:
+            for s in scatter:
+                if (yield s.network_interface.valid) and (yield s.network_interface.ack):
+                    writer.write(num_cycles, s.pe_id, (yield s.network_interface.dest_pe), (yield s.network_interface.msg.roundpar), (yield s.network_interface.msg.barrier))
+                if hasattr(s, "local_interface") and (yield s.local_interface.valid) and (yield s.local_interface.ack):
+                    writer.write(num_cycles, s.pe_id, s.pe_id, (yield s.local_interface.msg.roundpar), (yield s.local_interface.msg.barrier))
+            yield
+            num_cycles += 1
+    finally:
+        writer.close()
+
+def get_trace_generators(tb, config, scatter):
+    if not config.sim_trace:
+        return []
+    return [gen_trace_capture(tb, scatter, config.sim_trace)]
+
+def _percentiles(values):
+    if not values:
+        return "-"
+    values = sorted(values)
+    return "min {} p50 {} p90 {} p99 {} max {}".format(values[0], *(values[min(len(values) - 1, len(values)*p//100)] for p in (50, 90, 99)), values[-1])
+
+class ReplayTB(Module):
+    def __init__(self, config, network):
+        self.config = config
+        self.submodules.network = network
+        self.global_inactive = Signal()
+        # round synchronization with other FPGAs: there are none
+        if hasattr(network, "efb"):
+            self.comb += network.efb.message_out_ack.eq(Replicate(1, len(network.efb.message_out_ack)))
+        elif hasattr(network, "nrs"):
+            self.comb += network.nrs.send_barrier_ack.eq(1)
+
+class MultiFPGANetwork(Module):
+    """The per-FPGA networks of a multi-FPGA design, connected the same way
+    as in the multi-FPGA tops, seen as one network."""
+    def __init__(self, config, MultiNetwork):
+        num_fpga = config.addresslayout.num_fpga
+        self.submodules.fpga = [MultiNetwork(config, fpga_id=i) for i in range(num_fpga)]
+        for i in range(num_fpga):
+            core_idx = 0
+            for j in range(num_fpga - 1):
+                if i == j:
+                    core_idx += 1
+                if_idx = i - 1 if j < i else i
+                self.comb += self.fpga[i].external_network_interface_out[j].connect(self.fpga[core_idx].external_network_interface_in[if_idx])
+                core_idx += 1
+        self.apply_interface = [x for n in self.fpga for x in n.apply_interface]
+        self.network_interface = [x for n in self.fpga for x in n.network_interface]
+        self.arbiter = [x for n in self.fpga for x in n.arbiter]
+
+def make_network(config, name):
+    """Network of the module `name` spanning all PEs; its MultiNetwork for
+    all FPGAs if there is more than one."""
+    module = import_module(name)
+    if hasattr(module, "ExtGuard"):
+        # its external ports only work behind the inter-FPGA switch of its top
+        raise NotImplementedError("{} can only be simulated in its top (core_top_multifpga_one_channel), not replayed on its own".format(name))
+    if config.addresslayout.num_fpga > 1 and hasattr(module, "MultiNetwork"):
+        return MultiFPGANetwork(config, module.MultiNetwork)
+    if "pe_start" in inspect.signature(module.Network).parameters:
+        return module.Network(config, 0, config.addresslayout.num_pe)
+    return module.Network(config)
+
+def replay(config, records, network, timeout=1000000):
+    """Feed a message trace into `network` (apply_interface and
+    network_interface per PE) and measure it.
+
+    Like the cores do, a barrier is first injected into the start_message
+    of every arbiter. Then each PE sends its messages in the order of the
+    trace, none earlier than the cycle (after the start) it was recorded in; barriers carry the number of messages sent
+    to their destination in that round. Message latency is measured from
+    network_interface to apply_interface, matching messages between each pair
+    of PEs in order. Returns a dict of statistics."""
+    logger = logging.getLogger('sim.replay')
+    addresslayout = config.addresslayout
+    num_pe = addresslayout.num_pe
+    tb = ReplayTB(config, network)
+
+    by_src = [deque() for _ in range(num_pe)]
+    num_expected = [0 for _ in range(num_pe)]
+    for r in records:
+        cycle, src, dest, roundpar, barrier = r
+        by_src[src].append(r)
+        # the network combines the barriers of all PEs into one per round
+        if not barrier or src == 0:
+            num_expected[dest] += 1
+    start = [a.start_message for a in getattr(network, "arbiter", []) if hasattr(a, "start_message")]
+    if start:
+        num_expected = [n + 1 for n in num_expected]
+    started = [False for _ in range(num_pe)]
+    in_flight = {(src, dest): deque() for src in range(num_pe) for dest in range(num_pe)}
+    stats = dict(latency=[], injection_delay=[], num_messages=0, num_barriers=0, last_delivery=0)
+
+    def gen_start(pe):
+        if start:
+            yield start[pe].select.eq(1)
+            yield start[pe].msg.barrier.eq(1)
+            yield start[pe].msg.roundpar.eq(addresslayout.num_channels - 1)
+            yield start[pe].valid.eq(1)
+            yield
+            while not (yield start[pe].ack):
+                yield
+            yield start[pe].valid.eq(0)
+            yield start[pe].select.eq(0)
+        started[pe] = True
+
+    # one cycle count for all generators, so that send and receive times compare
+    clock = [0]
+
+    @passive
+    def gen_clock():
+        while True:
+            yield
+            clock[0] += 1
+
+    def gen_source(pe):
+        interface = network.network_interface[pe]
+        num_sent = [0 for _ in range(num_pe)]
+        while not all(started):
+            yield
+        t0 = clock[0]
+        while by_src[pe]:
+            cycle, src, dest, roundpar, barrier = by_src[pe][0]
+            if clock[0] - t0 >= cycle:
+                yield interface.msg.barrier.eq(barrier)
+                yield interface.msg.roundpar.eq(roundpar)
+                yield interface.msg.sender.eq(addresslayout.global_adr(pe, 0))
+                yield interface.msg.dest_id.eq(num_sent[dest] if barrier else addresslayout.global_adr(dest, 0))
+                yield interface.dest_pe.eq(dest)
+                yield interface.valid.eq(1)
+            else:
+                yield interface.valid.eq(0)
+            yield
+            if (yield interface.valid) and (yield interface.ack):
+                by_src[pe].popleft()
+                if barrier:
+                    num_sent[dest] = 0
+                else:
+                    num_sent[dest] += 1
+                    in_flight[(pe, dest)].append(clock[0])
+                stats["injection_delay"].append(clock[0] - t0 - 1 - cycle)
+        yield interface.valid.eq(0)
+
+    def gen_sink(pe):
+        interface = network.apply_interface[pe]
+        num_received = 0
+        start_barrier = bool(start)
+        yield interface.ack.eq(1)
+        while num_received < num_expected[pe]:
+            yield
+            if (yield interface.valid):
+                num_received += 1
+                if (yield interface.msg.barrier):
+                    if start_barrier:
+                        start_barrier = False
+                    else:
+                        stats["num_barriers"] += 1
+                else:
+                    src = addresslayout.pe_adr((yield interface.msg.sender))
+                    stats["latency"].append(clock[0] - in_flight[(src, pe)].popleft())
+                    stats["num_messages"] += 1
+                stats["last_delivery"] = max(stats["last_delivery"], clock[0])
+
+    @passive
+    def gen_timeout():
+        for _ in range(timeout):
+            yield
+        raise RuntimeError("Replay did not finish within {} cycles".format(timeout))
+
+    run_simulation(tb, [gen_clock()] + [gen_start(pe) for pe in range(num_pe)] + [gen_source(pe) for pe in range(num_pe)] + [gen_sink(pe) for pe in range(num_pe)] + [gen_timeout()])
+
+    cycles = stats["last_delivery"]
+    logger.info("{} messages and {} barriers in {} cycles ({} in the trace), {:.3f} messages/cycle".format(stats["num_messages"], stats["num_barriers"], cycles, records[-1][0] + 1 if records else 0, stats["num_messages"]/cycles if cycles else 0))
+    logger.info("Latency: {}".format(_percentiles(stats["latency"])))
+    logger.info("Injection delay: {}".format(_percentiles(stats["injection_delay"])))
+    stats["cycles"] = cycles
+    return stats
+
+def main():
+    args, config = init_parse(cmd_choices=("replay",))
+    logger = logging.getLogger('sim.replay')
+    num_pe, records = read_trace(args.trace)
+    if num_pe != config.addresslayout.num_pe:
+        raise ValueError("Trace {} has {} PEs, configuration has {}".format(args.trace, num_pe, config.addresslayout.num_pe))
+    for name in (args.network or "fifo_network").split(","):
+        logger.info("Replaying {} messages on {}".format(len(records), name))
+        replay(config, records, make_network(config, name))
+
+if __name__ == '__main__':
+    main()
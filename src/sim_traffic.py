@@ -0,0 +1,114 @@
+"""Characterize network implementations with synthetic traffic: throughput
+and latency against offered load for several destination patterns and
+PE counts, one table per network."""
+
+from core_init import resolve_defaults
+from sim_trace import replay, make_network
+
+from configparser import ConfigParser
+import argparse
+import random
+
+def uniform(num_pe, src, rng):
+    return rng.randrange(num_pe)
+
+def hotspot(num_pe, src, rng, fraction=0.25, spot=0):
+    return spot if rng.random() < fraction else rng.randrange(num_pe)
+
+def transpose(num_pe, src, rng):
+    """Swap the upper and lower half of the PE number bits (reverse the order
+    of PEs if num_pe is not a power of 2)."""
+    bits = num_pe.bit_length() - 1
+    if num_pe != 1 << bits:
+        return num_pe - 1 - src
+    lo = bits // 2
+    return ((src << (bits - lo)) | (src >> lo)) & (num_pe - 1)
+
+def powerlaw(num_pe, src, rng, alpha=1.5):
+    """PE d is chosen with probability proportional to 1/(d+1)^alpha, like
+    messages to high-degree vertices in a power-law graph."""
+    return rng.choices(range(num_pe), weights=[1/(d+1)**alpha for d in range(num_pe)])[0]
+
+patterns = {
+    "uniform": uniform,
+    "hotspot": hotspot,
+    "transpose": transpose,
+    "powerlaw": powerlaw,
+    # many supersteps with little traffic in each
+    "barrier": uniform
+}
+
+def make_traffic(num_pe, pattern, load, num_rounds=2, messages_per_round=64, num_channels=2, seed=0):
+    """Message trace (see sim_trace) in which every PE offers `load` messages
+    per cycle, destinations chosen by `pattern`. Each round ends with a
+    barrier to every PE."""
+    assert 0 < load <= 1
+    rng = random.Random(seed)
+    if pattern == "barrier":
+        num_rounds *= 16
+        messages_per_round = max(1, messages_per_round // 32)
+    dest = patterns[pattern]
+    records = []
+    for src in range(num_pe):
+        cycle = 0
+        for rnd in range(num_rounds):
+            for _ in range(messages_per_round):
+                while rng.random() >= load:
+                    cycle += 1
+                records.append((cycle, src, dest(num_pe, src, rng), rnd % num_channels, 0))
+                cycle += 1
+            for d in range(num_pe):
+                records.append((cycle, src, d, rnd % num_channels, 1))
+                cycle += 1
+    records.sort()
+    return records
+
+def make_config(num_pe, num_fpga=1):
+    configparser = ConfigParser()
+    configparser['arch'] = {'num_pe': num_pe, 'num_fpga': num_fpga}
+    configparser['graph'] = {}
+    configparser['app'] = {'algo': "bfs"}
+    configparser['logging'] = {'log_file_name': "sim_traffic", 'disable_logfile': True, 'console_log_level': 'WARNING'}
+    return resolve_defaults(configparser, num_nodes=num_pe*16, num_edges=num_pe*16)
+
+def characterize(network, num_pe, num_fpga, pattern, loads, **kwargs):
+    """-> list of (load, accepted messages/cycle/PE, average latency, p99 latency)"""
+    config = make_config(num_pe, num_fpga)
+    rows = []
+    for load in loads:
+        records = make_traffic(num_pe, pattern, load, num_channels=config.addresslayout.num_channels, **kwargs)
+        stats = replay(config, records, make_network(config, network))
+        latency = sorted(stats["latency"])
+        rows.append((load, stats["num_messages"]/stats["cycles"]/num_pe, sum(latency)/len(latency), latency[len(latency)*99//100]))
+    return rows
+
+def format_table(network, results):
+    lines = ["{}".format(network),
+             "{:>5} {:>5} {:>10} {:>8} {:>10} {:>10} {:>10}".format("PEs", "FPGAs", "pattern", "offered", "accepted", "latency", "p99")]
+    for (num_pe, num_fpga, pattern), rows in results:
+        for load, accepted, latency, p99 in rows:
+            lines.append("{:>5} {:>5} {:>10} {:>8.3f} {:>10.3f} {:>10.1f} {:>10}".format(num_pe, num_fpga, pattern, load, accepted, latency, p99))
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--network', default="fifo_network", help="comma separated network modules")
+    parser.add_argument('--pe', default="4,8", help="comma separated PE counts")
+    parser.add_argument('--fpga', type=int, default=1, help="number of FPGAs (uses the modules' MultiNetwork)")
+    parser.add_argument('--pattern', default=",".join(patterns), help="comma separated traffic patterns ({})".format(", ".join(patterns)))
+    parser.add_argument('--load', default="0.1,0.25,0.5,0.75,1", help="comma separated offered loads in messages per PE per cycle")
+    parser.add_argument('--messages', type=int, default=64, help="messages per PE per round")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    loads = [float(x) for x in args.load.split(",")]
+    for network in args.network.split(","):
+        results = []
+        for num_pe in (int(x) for x in args.pe.split(",")):
+            for pattern in args.pattern.split(","):
+                results.append(((num_pe, args.fpga, pattern), characterize(network, num_pe, args.fpga, pattern, loads, messages_per_round=args.messages, seed=args.seed)))
+        print(format_table(network, results))
+        print()
+
+if __name__ == '__main__':
+    main()
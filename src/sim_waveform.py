@@ -0,0 +1,155 @@
+from migen import *
+from migen.sim.core import Simulator
+from migen.fhdl.tools import list_signals
+from migen.fhdl.namer import build_namespace
+
+from fnmatch import fnmatchcase
+import gzip
+import lzma
+import logging
+
+_open = {
+    "none": (open, ""),
+    "gzip": (gzip.open, ".gz"),
+    "xz": (lzma.open, ".xz")
+}
+
+def parse_range(s):
+    """'a-b' -> (a, b), either bound may be left out. A single number is a
+    range of its own."""
+    if not s:
+        return None
+    if "-" not in s:
+        return int(s), int(s)
+    lo, hi = s.split("-", 1)
+    return int(lo) if lo.strip() else 0, int(hi) if hi.strip() else None
+
+def _in_range(x, r):
+    return r is None or (r[0] <= x and (r[1] is None or x <= r[1]))
+
+class WaveformPolicy:
+    """What goes into the VCD: signals whose name in the dump matches one of
+    `signals` (shell-style patterns, all signals if empty), during the cycles
+    (of clock domain sys) and supersteps in the given inclusive ranges,
+    compressed with gzip or xz."""
+    def __init__(self, enable=True, signals="", cycles="", supersteps="", compression="none"):
+        self.enable = enable if isinstance(enable, bool) else enable.lower() in ("1", "yes", "true", "on")
+        self.patterns = signals.replace(",", " ").split()
+        self.cycles = parse_range(cycles)
+        self.supersteps = parse_range(supersteps)
+        if compression not in _open:
+            raise ValueError("compression must be one of {}".format(", ".join(_open)))
+        self.compression = compression
+
+    def filename(self, vcd_name):
+        return vcd_name + _open[self.compression][1]
+
+    def select(self, name):
+        return not self.patterns or any(fnmatchcase(name, p) for p in self.patterns)
+
+class WaveformWriter:
+    """VCD writer that only dumps the selected signals, and only while
+    recording(t) is true. The header is written up front so the dump can be
+    streamed through the compressor instead of buffered like migen's
+    VCDWriter."""
+    def __init__(self, f, signals, names, evaluator, recording):
+        self.f = f
+        self.evaluator = evaluator
+        self.recording = recording
+        self.codes = dict()
+        self.signal_values = dict()
+        self.t = 0
+
+        for n, signal in enumerate(signals):
+            code = self._code(n)
+            self.codes[signal] = code
+            if hasattr(signal, "_enumeration"):
+                size = max([len(v) for v in signal._enumeration.values()])*8
+            else:
+                size = len(signal)
+            f.write("$var wire {} {} {} $end\n".format(size, code, names[signal]))
+        f.write("$dumpvars\n")
+        for signal in signals:
+            self._write_value(signal, signal.reset.value)
+        f.write("$end\n")
+        f.write("#0\n")
+        self.active = recording(0)
+
+    @staticmethod
+    def _code(n):
+        code = chr(33 + n % 94)
+        n //= 94
+        while n > 0:
+            code = chr(33 + n % 94) + code
+            n //= 94
+        return code
+
+    def _write_value(self, signal, value):
+        code = self.codes[signal]
+        if hasattr(signal, "_enumeration"):
+            self.f.write("b{} {}\n".format("".join("{:08b}".format(c) for c in signal._enumeration[value].encode()), code))
+        elif len(signal) > 1:
+            if value < 0:
+                value += 2**len(signal)
+            self.f.write("b{:b} {}\n".format(value, code))
+        else:
+            self.f.write("{}{}\n".format(value & 1, code))
+        self.signal_values[signal] = value
+
+    def set(self, signal, value):
+        if self.active and signal in self.codes and self.signal_values.get(signal) != value:
+            self._write_value(signal, value)
+
+    def delay(self, delay):
+        self.t += delay
+        active = self.recording(self.t)
+        if active:
+            self.f.write("#{}\n".format(self.t))
+            if not self.active:
+                # window opens: dump the current state
+                for signal in self.codes:
+                    self._write_value(signal, self.evaluator.eval(signal))
+        self.active = active
+
+    def close(self):
+        self.f.close()
+
+class WaveformSimulator(Simulator):
+    def __init__(self, fragment_or_module, generators, vcd_name, policy, levels=(), clocks={"sys": 10}, **kwargs):
+        super().__init__(fragment_or_module, generators, clocks=clocks, **kwargs)
+
+        signals = list_signals(self.fragment)
+        for cd in self.fragment.clock_domains:
+            signals.add(cd.clk)
+            if cd.rst is not None:
+                signals.add(cd.rst)
+        for memory_array in self.evaluator.replaced_memories.values():
+            signals |= set(memory_array)
+        signals = sorted(signals, key=lambda x: x.duid)
+        ns = build_namespace(signals)
+        names = {signal: ns.get_name(signal) for signal in signals}
+        selected = [signal for signal in signals if policy.select(names[signal])]
+
+        period = 2*self.time.clocks["sys"].half_period if "sys" in self.time.clocks else 1
+        def recording(t):
+            if not _in_range(t // period, policy.cycles):
+                return False
+            return policy.supersteps is None or _in_range(min(self.evaluator.eval(l) for l in levels), policy.supersteps)
+
+        filename = policy.filename(vcd_name)
+        logging.getLogger('sim.waveform').info("Dumping {} of {} signals to {}".format(len(selected), len(signals), filename))
+        opener = _open[policy.compression][0]
+        self.vcd = WaveformWriter(opener(filename, "wt"), selected, names, self.evaluator, recording)
+
+def simulate(tb, generators, config, vcd_name, levels=(), **kwargs):
+    """run_simulation, dumping waveforms according to config.waveform (the
+    [waveform] section of config.ini). levels are needed to restrict the dump
+    to a window of supersteps."""
+    policy = WaveformPolicy(**getattr(config, "waveform", {}))
+    if not vcd_name or not policy.enable:
+        run_simulation(tb, generators, **kwargs)
+        return
+    if policy.supersteps is not None and not levels:
+        raise ValueError("Superstep window for waveforms not supported by this design")
+    with WaveformSimulator(tb, generators, vcd_name, policy, levels=levels, **kwargs) as s:
+        s.run()
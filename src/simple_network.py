@@ -4,6 +4,7 @@ from migen.genlib.roundrobin import *
 from util.recordfifo import RecordFIFO
 
 from core_interfaces import ApplyInterface, Message, NetworkInterface
+from tbsupport import every_cycle
 
 from functools import reduce
 from operator import and_
@@ -62,6 +63,7 @@ class Arbiter(Module):
 
 
 
+    @every_cycle
     def gen_selfcheck(self, tb, quiet=True):
         level = 0
         num_cycles = 0
@@ -1,5 +1,6 @@
 from migen import *
 from migen.genlib.record import *
+from tbsupport import every_cycle
 import logging
 
 from sssp.interfaces import update_layout, node_storage_layout
@@ -51,10 +52,12 @@ class ApplyKernel(Module):
             self.ready.eq(self.update_ack & self.state_ack)
         ]
 
+    @every_cycle
     def gen_selfcheck(self, tb, quiet=True):
         logger = logging.getLogger('sim.applykernel')
+        debug = logger.isEnabledFor(logging.DEBUG)
         num_pe = tb.config.addresslayout.num_pe
-        pe_id = [a.gatherapplykernel.applykernel for core in tb.cores for a in core.apply].index(self)
+        pe_id = self.pe_id
         level = 0
         num_cycles = 0
         num_messages_out = 0
@@ -65,7 +68,8 @@ class ApplyKernel(Module):
                     level += 1
                 else:
                     num_messages_out += 1
-                    logger.debug("Node " + str((yield self.nodeid_out)) + " updated in round " + str(level) +". New distance: " + str((yield self.update_out.dist)))
+                    if debug:
+                        logger.debug("Node " + str((yield self.nodeid_out)) + " updated in round " + str(level) +". New distance: " + str((yield self.update_out.dist)))
             yield
         logger.info("PE {}: {} cycles taken for {} supersteps. {} messages sent.".format(pe_id, num_cycles, level, num_messages_out))
         logger.info("Average throughput: Out: {:.1f} cycles/message".format(num_cycles/num_messages_out if num_messages_out!=0 else 0))
@@ -39,3 +39,11 @@ class Config(CoreConfig):
             edge_storage_layout = edge_storage_layout, # Mandatory if has_edgedata is True.
             edgedatasize = edgedatasize,
             **kwargs)
+
+    def init_mirror(self, graph, master, mirror):
+        # the mirror must see the master's distance unchanged
+        graph.get_edge_data(master, mirror)['dist'] = 0
+
+    def merge_mirror(self, state):
+        # vertices reached through a mirror have it as parent
+        state['parent'] = self.master_of(state['parent'])
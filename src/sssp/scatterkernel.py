@@ -1,5 +1,6 @@
 from migen import *
 from migen.genlib.record import *
+from tbsupport import every_cycle
 
 from sssp.interfaces import message_layout, update_layout, edge_storage_layout
 
@@ -41,6 +42,7 @@ class ScatterKernel(Module):
             self.ready.eq(self.message_ack)
         ]
 
+    @every_cycle
     def gen_selfcheck(self, tb, quiet=True):
         while not (yield tb.global_inactive):
             if (yield self.valid_in) and (yield self.ready):
@@ -3,8 +3,10 @@ from migen.fhdl import verilog
 
 import struct
 import os
+import multiprocessing
 from contextlib import contextmanager
 from util.misc import pack
+from util.mem import FullyInitMemory
 
 class SimCase:
     def setUp(self, *args, **kwargs):
@@ -25,6 +27,59 @@ def get_simulators(module, name, *args, **kwargs):
                     simulators.append(simulator)
     return simulators
 
+MONITOR_LEVELS = ("off", "barrier", "sampled", "full")
+
+def sample_every(generator, interval):
+    """Run a monitor only every `interval` cycles by stretching each of its
+    clock ticks. Events on the skipped cycles are missed and cycle counts
+    kept by the monitor are in units of `interval` cycles."""
+    reply = None
+    while True:
+        try:
+            request = generator.send(reply)
+        except StopIteration:
+            return
+        if request is None:
+            for _ in range(interval - 1):
+                yield
+        reply = yield request
+
+def every_cycle(gen_selfcheck):
+    """Mark a gen_selfcheck that follows handshakes, so that it keeps running
+    every cycle when the other monitors are sampled."""
+    gen_selfcheck.every_cycle = True
+    return gen_selfcheck
+
+def get_selfchecks(module, tb):
+    """-> gen_selfcheck of module and its submodules, split into those that
+    may be sampled and those marked every_cycle"""
+    sampled = []
+    full = []
+    if hasattr(module, "gen_selfcheck"):
+        (full if getattr(module.gen_selfcheck, "every_cycle", False) else sampled).append(module.gen_selfcheck(tb))
+    for _, submodule in module._submodules:
+        s, f = get_selfchecks(submodule, tb)
+        sampled.extend(s)
+        full.extend(f)
+    return sampled, full
+
+def get_monitors(tb, config, cores):
+    """Simulation monitors (barrier monitors and gen_selfcheck) for the level
+    selected by config.sim_monitor: off, barrier (only barrier monitors),
+    sampled (every config.sim_monitor_interval cycles, except for the
+    selfchecks marked every_cycle) or full."""
+    level = getattr(config, "sim_monitor", "full")
+    if level == "off":
+        return []
+    monitors = [core.gen_barrier_monitor(tb) for core in cores]
+    if level == "barrier":
+        return monitors
+    sampled, full = get_selfchecks(tb, tb)
+    monitors.extend(sampled)
+    if level == "sampled":
+        monitors = [sample_every(m, config.sim_monitor_interval) for m in monitors]
+    return monitors + full
+
 def convert_float_to_32b_int(f):
     return struct.unpack("I", struct.pack("f", f))[0]
 
@@ -94,6 +149,28 @@ def cd(newdir):
     finally:
         os.chdir(prevdir)
 
+_tasks = None
+
+def _run_task(i):
+    _tasks[i]()
+
+def run_parallel(tasks, jobs=1):
+    """Call each of tasks (functions without arguments) in up to `jobs`
+    processes. The processes are forked, so the tasks see the state of the
+    caller (e.g. the config) without it being pickled."""
+    global _tasks
+    jobs = min(jobs, len(tasks))
+    if jobs <= 1:
+        for task in tasks:
+            task()
+        return
+    _tasks = tasks
+    try:
+        with multiprocessing.get_context("fork").Pool(jobs) as pool:
+            pool.map(_run_task, range(len(tasks)), chunksize=1)
+    finally:
+        _tasks = None
+
 def export_data(adj_val, filename, data_size=32, backup=None):
     data = []
     if data_size > 32:
@@ -118,3 +195,54 @@ def export_data(adj_val, filename, data_size=32, backup=None):
             f1.write(struct.pack('=I', x))
             if backup:
                 f2.write(struct.pack('=I', x))
+
+class ReadmemhMemory:
+    """Special override for memories with init: the contents go to a hex
+    file next to the Verilog (written by ConvOutput.write) that the netlist
+    loads with $readmemh, instead of being inlined. Memories are padded with
+    zeros to their full depth, like FullyInitMemory."""
+    @staticmethod
+    def emit_verilog(memory, ns, add_data_file):
+        init = memory.init
+        memory.init = None
+        try:
+            r = Memory.emit_verilog(memory, ns, add_data_file)
+        finally:
+            memory.init = init
+        if init is not None:
+            name = ns.get_name(memory)
+            mask = 2**memory.width - 1
+            content = "".join("{:x}\n".format(x & mask) for x in init)
+            content += "0\n"*(memory.depth - len(init))
+            filename = add_data_file(name + ".hex", content)
+            r += "initial begin\n"
+            r += "\t$readmemh(\"" + filename + "\", " + name + ");\n"
+            r += "end\n\n"
+        return r
+
+class NoInitMemory:
+    """Special override that leaves out the initialization of a memory."""
+    @staticmethod
+    def emit_verilog(memory, ns, add_data_file):
+        init = memory.init
+        memory.init = None
+        try:
+            return Memory.emit_verilog(memory, ns, add_data_file)
+        finally:
+            memory.init = init
+
+def get_special_overrides(config, overrides=None, runtime_load=False):
+    """Special overrides for verilog.convert, with memory initialization
+    moved to side files if config.export_mem_init_files is set. Designs
+    sized by capacity load the graph at runtime, so the graph memories
+    (FullyInitMemory) are not initialized at all; only tops that map them
+    onto the host interface (runtime_load) can export them."""
+    so = dict(overrides) if overrides else dict()
+    if getattr(config, "export_mem_init_files", False):
+        so[Memory] = ReadmemhMemory
+        so[FullyInitMemory] = ReadmemhMemory
+    if getattr(config, "capacity", False):
+        if not runtime_load:
+            raise NotImplementedError("Capacity-sized export needs a top that loads the graph at runtime (top_minimal)")
+        so[FullyInitMemory] = NoInitMemory
+    return so
@@ -10,6 +10,7 @@ import math
 from util.recordfifo import *
 from core_interfaces import *
 from core_barriercounter import Barriercounter
+from tbsupport import every_cycle
 
 class Arbiter(Module):
     def __init__(self, pe_id, config):
@@ -45,6 +46,7 @@ class Arbiter(Module):
             )
         ]
 
+    @every_cycle
     def gen_selfcheck(self, tb):
         logger = logging.getLogger("sim.arbiter" + str(self.pe_id))
         level = 0
@@ -131,6 +133,8 @@ class NetworkRoundSync(Module):
 
 class Network(Module):
     def __init__(self, config, pe_start, pe_end):
+        if config.local_bypass:
+            raise NotImplementedError("local_bypass needs a network with a local lane (fifo_network or sim_network)")
         self.config = config
         num_local_pe = pe_end - pe_start
         num_pe = config.addresslayout.num_pe
@@ -2,6 +2,9 @@ from migen.fhdl import verilog
 
 from migen import *
 from tbsupport import *
+from sim_waveform import simulate
+from sim_trace import get_trace_generators
+from sim_fifo_profile import get_fifo_profilers
 from migen.genlib.roundrobin import *
 
 import logging
@@ -62,6 +65,8 @@ class Core(Module):
             # connect to network
             self.comb += [self.network.apply_interface[i].connect(self.apply[i].apply_interface) for i in range(num_local_pe)]
             self.comb += [self.scatter[i].network_interface.connect(self.network.network_interface[i]) for i in range(num_local_pe)]
+            if config.local_bypass:
+                self.comb += [self.scatter[i].local_interface.connect(self.network.local_interface[i]) for i in range(num_local_pe)]
 
         # state of calculation
         self.global_inactive = Signal()
@@ -256,14 +261,13 @@ def sim(config):
 
     generators = []
 
-    for core in tb.cores:
-        generators.extend([core.gen_barrier_monitor(tb)])
-        # generators.extend([core.bramio.axi_port.gen_radr(), core.bramio.axi_port.gen_rdata(), core.bramio.axi_port.gen_wadr(), core.bramio.axi_port.gen_wdata(), core.bramio.axi_port.gen_wresp()])
-
-    generators.extend(get_simulators(tb, 'gen_selfcheck', tb))
+    generators.extend(get_monitors(tb, config, tb.cores))
+    generators.extend(get_fifo_profilers(tb, config))
+    if not config.inverted:
+        generators.extend(get_trace_generators(tb, config, [s for core in tb.cores for s in core.scatter]))
     generators.extend(get_simulators(tb, 'gen_simulation', tb))
 
-    run_simulation(tb, generators, vcd_name="tb.vcd")
+    simulate(tb, generators, config, "tb.vcd", levels=[a.level for core in tb.cores for a in core.apply])
 
 def export(config, filename='top.v'):
 
@@ -276,7 +280,8 @@ def export(config, filename='top.v'):
 
     verilog.convert(m,
                     name="top",
-                    ios=ios
+                    ios=ios,
+                    special_overrides=get_special_overrides(config)
                     ).write(filename)
 
     # with open("address_mapping.txt", 'w') as adrmap:
@@ -338,7 +343,8 @@ def export_fake(config, filename='top.v'):
 
     verilog.convert(m,
                     name="top",
-                    ios=ios
+                    ios=ios,
+                    special_overrides=get_special_overrides(config)
                     ).write(filename)
 
 def main():
@@ -2,6 +2,9 @@ from migen.fhdl import verilog
 
 from migen import *
 from tbsupport import *
+from sim_waveform import simulate
+from sim_trace import get_trace_generators
+from sim_fifo_profile import get_fifo_profilers
 
 import logging
 from contextlib import ExitStack
@@ -10,6 +13,8 @@ from functools import reduce
 from operator import and_
 
 from core_init import init_parse
+from export_cache import convert_cached
+from resource_estimate import estimate, format_report, largest_num_pe
 from util.recordfifo import RecordFIFO
 from core_interfaces import Message
 
@@ -40,6 +45,8 @@ class Core(Module):
         # connect to network
         self.comb += [self.network.apply_interface[i].connect(self.apply[i].apply_interface) for i in range(num_pe)]
         self.comb += [self.scatter[i].network_interface.connect(self.network.network_interface[i]) for i in range(num_pe)]
+        if config.local_bypass:
+            self.comb += [self.scatter[i].local_interface.connect(self.network.local_interface[i]) for i in range(num_pe)]
 
         # state of calculation
         self.global_inactive = Signal()
@@ -49,12 +56,26 @@ class Core(Module):
             self.total_num_messages.eq(sum(scatter.barrierdistributor.total_num_messages for scatter in self.scatter))
         ]
 
-        # # I/O interface
-        # internal_mem_ports = [a.external_wr_port for a in self.apply]
-        # internal_mem_ports.extend([s.wr_port_idx for s in self.scatter])
-        # internal_mem_ports.extend([s.get_neighbors.wr_port_val for s in self.scatter])
-        # self.submodules.bramio = BRAMIO(start_addr=config.start_addr, endpoints=internal_mem_ports)
+        # memories come up with their init values, so simulation only needs the
+        # host interface when the load path itself is being tested; designs
+        # sized by capacity always load the graph through it
         self.init_complete = Signal()
+        if config.sim_bus_load or config.capacity:
+            internal_mem_ports = [a.external_wr_port for a in self.apply]
+            internal_mem_ports.extend([s.wr_port_idx for s in self.scatter])
+            internal_mem_ports.extend([s.get_neighbors.wr_port_val for s in self.scatter])
+            if config.has_edgedata:
+                internal_mem_ports.extend([s.get_neighbors.wr_port_edge for s in self.scatter])
+            if config.capacity:
+                # same order as in config.memory_images()
+                registers = [a.num_local_nodes for a in self.apply]
+                registers.extend(reg for a in self.apply for reg in a.host_registers)
+                for reg in registers:
+                    reg_port = Record([("adr", 1, DIR_M_TO_S), ("dat_r", len(reg), DIR_S_TO_M), ("we", 1, DIR_M_TO_S), ("dat_w", len(reg), DIR_M_TO_S)])
+                    self.comb += reg_port.dat_r.eq(reg)
+                    self.sync += If(reg_port.we, reg.eq(reg_port.dat_w))
+                    internal_mem_ports.append(reg_port)
+            self.submodules.bramio = BRAMIO(start_addr=config.start_addr, endpoints=internal_mem_ports)
 
     def gen_barrier_monitor(self, tb):
         logger = logging.getLogger('sim.barriermonitor')
@@ -81,36 +102,43 @@ class Core(Module):
                         logger.debug(str(num_cycles) + ": Barrier exits Scatter on PE " + str(s.pe_id))
             yield
 
-    def gen_simulation(self, tb):
-        word_offset = self.bramio.word_offset
-        addr_spacing = self.bramio.addr_spacing
+    def bus_writes(self):
+        """Host writes that load the graph of config through bramio."""
+        return image_writes(self.config.memory_images(), self.config.start_addr, self.bramio.word_offset, self.bramio.addr_spacing)
+
+    def gen_bus_load(self):
+        for adr, data in self.bus_writes():
+            yield from self.bramio.axi_port.write(adr=adr, wdata=data)
+
+    def gen_states(self):
+        """-> dict vertex -> state at the end of the run, read through the
+        host interface if the graph was loaded through it. Mirrors are left
+        out."""
+        word_offset = self.bramio.word_offset if self.config.sim_bus_load else 0
         start_addr = self.config.start_addr
+        states = {}
         for pe_id in range(self.config.addresslayout.num_pe):
-            if self.config.init_nodedata:
-                for addr, data in enumerate(self.config.init_nodedata[pe_id]):
-                    yield from self.bramio.axi_port.write(adr=start_addr + (addr << word_offset), wdata=data)
-            start_addr += addr_spacing
-        for pe_id in range(self.config.addresslayout.num_pe):
-            for addr, (index, length) in enumerate(self.config.adj_idx[pe_id]):
-                data = convert_record_to_int([("index", self.config.addresslayout.edgeidsize), ("length", self.config.addresslayout.edgeidsize)], index=index, length=length)
-                yield from self.bramio.axi_port.write(adr=start_addr + (addr << word_offset), wdata=data)
-            start_addr += addr_spacing
-        for pe_id in range(self.config.addresslayout.num_pe):
-            for addr, data in enumerate(self.config.adj_val[pe_id]):
-                yield from self.bramio.axi_port.write(adr=start_addr + (addr << word_offset), wdata=data)
-            start_addr += addr_spacing
+            for addr in range(len(self.config.adj_idx[pe_id])):
+                if self.config.sim_bus_load:
+                    data = (yield from self.bramio.axi_port.read(adr=start_addr + (addr << word_offset)))
+                else:
+                    data = (yield self.apply[pe_id].mem[addr])
+                vertexid = self.config.addresslayout.global_adr(pe_id, addr)
+                if vertexid in self.config.graph and "master" not in self.config.graph.node[vertexid]:
+                    states[vertexid] = self.config.final_state(data)
+            if self.config.sim_bus_load:
+                start_addr += self.bramio.addr_spacing
+        return states
+
+    def gen_simulation(self, tb):
+        if self.config.sim_bus_load:
+            yield from self.gen_bus_load()
         yield self.init_complete.eq(1)
         while not (yield tb.global_inactive):
             yield
-        start_addr = self.config.start_addr
-        for pe_id in range(self.config.addresslayout.num_pe):
-            for addr in range(len(self.config.adj_idx[pe_id])):
-                data = (yield from self.bramio.axi_port.read(adr=start_addr + (addr << word_offset)))
-                r = convert_int_to_record(data, self.config.addresslayout.node_storage_layout)
-                vertexid = self.config.addresslayout.global_adr(pe_id, addr)
-                if vertexid != 0:
-                    print("Data of Vertex {}:\t {}".format(self.config.graph.node[vertexid]["origin"], [(f[0], r[f[0]]) for f in self.config.addresslayout.node_storage_layout]))
-            start_addr += addr_spacing
+        states = yield from self.gen_states()
+        for vertexid, r in sorted(states.items()):
+            print("Data of Vertex {}:\t {}".format(self.config.graph.node[vertexid].get("origin", vertexid), [(f[0], r[f[0]]) for f in self.config.addresslayout.node_storage_layout]))
 
 class UnCore(Module):
     def __init__(self, config):
@@ -170,26 +198,46 @@ def sim(config):
     generators = []
 
     for core in tb.cores:
-        generators.extend([core.gen_barrier_monitor(tb)])
-        generators.extend([core.bramio.axi_port.gen_radr(), core.bramio.axi_port.gen_rdata(), core.bramio.axi_port.gen_wadr(), core.bramio.axi_port.gen_wdata(), core.bramio.axi_port.gen_wresp()])
+        if config.sim_bus_load:
+            generators.extend([core.bramio.axi_port.gen_radr(), core.bramio.axi_port.gen_rdata(), core.bramio.axi_port.gen_wadr(), core.bramio.axi_port.gen_wdata(), core.bramio.axi_port.gen_wresp()])
 
-    generators.extend(get_simulators(tb, 'gen_selfcheck', tb))
+    generators.extend(get_monitors(tb, config, tb.cores))
+    generators.extend(get_fifo_profilers(tb, config))
+    generators.extend(get_trace_generators(tb, config, [s for core in tb.cores for s in core.scatter]))
     generators.extend(get_simulators(tb, 'gen_simulation', tb))
 
-    run_simulation(tb, generators, vcd_name="{}.vcd".format(config.vcdname))
+    simulate(tb, generators, config, "{}.vcd".format(config.vcdname) if config.vcdname else None, levels=[a.level for core in tb.cores for a in core.apply])
 
 def export(config, filename='top.v'):
 
-    m = UnCore(config)
-    m.clock_domains.cd_sys = ClockDomain(reset_less=True)
+    def build():
+        m = UnCore(config)
+        m.clock_domains.cd_sys = ClockDomain(reset_less=True)
+
+        ios = {m.start, m.done, m.cycle_count, m.total_num_messages, m.cd_sys.clk}
+        if config.capacity:
+            ios |= set(m.cores[0].bramio.axi_port.flatten())
+        return m, ios
+
+    convert_cached(config, build, filename,
+                   key="top_minimal",
+                   name="top",
+                   special_overrides=get_special_overrides(config, runtime_load=True)
+                   )
 
-    verilog.convert(m,
-                    name="top",
-                    ios={m.start, m.done, m.cycle_count, m.total_num_messages, m.cd_sys.clk}
-                    ).write(filename)
+def image(config, filename='graph.img'):
+    m = Core(config)
+    write_image(filename, m.bus_writes())
+
+def estimate_resources(config, args):
+    logger = logging.getLogger('config')
+    print(format_report(estimate(UnCore(config), args.device), args.device))
+    if args.suggest_num_pe:
+        num_pe = largest_num_pe(args, lambda c: [UnCore(c)], device=args.device)
+        logger.info("Largest num_pe that fits on {}: {}".format(args.device, num_pe))
 
 def main():
-    args, config = init_parse()
+    args, config = init_parse(cmd_choices=("sim", "export", "image", "estimate"))
 
     logger = logging.getLogger('config')
 
@@ -202,6 +250,15 @@ def main():
             filename = args.output
         logger.info("Exporting design to file {}".format(filename))
         export(config, filename=filename)
+    if args.command=='image':
+        filename = "graph.img"
+        if args.output:
+            filename = args.output
+        logger.info("Writing graph load image to file {}".format(filename))
+        image(config, filename=filename)
+    if args.command=='estimate':
+        logger.info("Estimating resources")
+        estimate_resources(config, args)
 
 if __name__ == '__main__':
     main()
@@ -1,5 +1,6 @@
 from migen import *
 from migen.genlib.record import *
+from tbsupport import every_cycle
 
 from tri.interfaces import *
 
@@ -75,10 +76,12 @@ class GatherApplyKernel(Module):
             )
         )
 
+    @every_cycle
     def gen_selfcheck(self, tb):
         logger = logging.getLogger("sim.applykernel")
+        debug = logger.isEnabledFor(logging.DEBUG)
         num_pe = tb.config.addresslayout.num_pe
-        pe_id = [a.gatherapplykernel for core in tb.cores for a in core.apply].index(self)
+        pe_id = self.pe_id
         level = 0
         num_cycles = 0
         num_messages_in = 0
@@ -91,7 +94,8 @@ class GatherApplyKernel(Module):
             if (yield self.valid_in) and (yield self.ready) and (yield self.message_in_valid):
                 num_messages_in += 1
             if (yield self.update_valid) and (yield self.update_ack) and not (yield self.barrier_out):
-                logger.debug("{}: PE {} update out (sender={} origin={} hops={})".format(num_cycles, pe_id, (yield self.update_sender), (yield self.update_out.origin), (yield self.update_out.hops)))
+                if debug:
+                    logger.debug("{}: PE {} update out (sender={} origin={} hops={})".format(num_cycles, pe_id, (yield self.update_sender), (yield self.update_out.origin), (yield self.update_out.hops)))
                 num_messages_out += 1
             yield
         logger.info("PE {}: {} cycles taken for {} supersteps. {} messages received, {} updates sent.".format(pe_id, num_cycles, level, num_messages_in, num_messages_out))
@@ -1,5 +1,6 @@
 from migen import *
 from migen.genlib.record import *
+from tbsupport import every_cycle
 
 from tri.interfaces import *
 
@@ -52,10 +53,12 @@ class ScatterKernel(Module):
             )
         ]
 
+    @every_cycle
     def gen_selfcheck(self, tb):
         logger = logging.getLogger("sim.scatterkernel")
+        debug = logger.isEnabledFor(logging.DEBUG)
         num_pe = tb.config.addresslayout.num_pe
-        pe_id = [s.scatterkernel for core in tb.cores for s in core.scatter].index(self)
+        pe_id = self.pe_id
         level = 0
         num_cycles = 0
         num_neighbors_in = 0
@@ -68,6 +71,7 @@ class ScatterKernel(Module):
             if (yield self.valid_in) and (yield self.ready):
                 num_neighbors_in += 1
             if (yield self.valid_out) and (yield self.message_ack) and not (yield self.barrier_out):
-                logger.debug("{}: PE {} message out (dest={} sender={} origin={} hops={})".format(num_cycles, pe_id, (yield self.neighbor_out), (yield self.sender_out), (yield self.message_out.origin), (yield self.message_out.hops)))
+                if debug:
+                    logger.debug("{}: PE {} message out (dest={} sender={} origin={} hops={})".format(num_cycles, pe_id, (yield self.neighbor_out), (yield self.sender_out), (yield self.message_out.origin), (yield self.message_out.hops)))
                 num_messages_out += 1
             yield
@@ -0,0 +1,54 @@
+import unittest
+import random
+
+from core_address import AddressLayout
+from sim_hmc import HMCModel
+
+class VaultLayoutCase(unittest.TestCase):
+    def setUp(self):
+        random.seed(3)
+        self.num_pe = 4
+        self.addresslayout = AddressLayout(nodeidsize=16, edgeidsize=32, peidsize=3, num_pe=self.num_pe, num_nodes_per_pe=32, max_edges_per_pe=4096)
+        nodes = range(1, 128)
+        self.adj_dict = {n: sorted(random.sample(nodes, random.randrange(1, 24))) for n in nodes}
+
+    def check_lists(self, adj_idx, adj_val, bytes_per_edge, inverted):
+        for pe in range(self.num_pe):
+            for i, (idx, n) in enumerate(adj_idx[pe]):
+                node = i if inverted else self.addresslayout.global_adr(pe, i)
+                if node not in self.adj_dict:
+                    continue
+                neighbors = self.adj_dict[node]
+                if inverted:
+                    neighbors = [v for v in neighbors if self.addresslayout.pe_adr(v) == pe]
+                self.assertEqual(adj_val[idx//bytes_per_edge:idx//bytes_per_edge + n], neighbors)
+                self.assertEqual(idx % 16, 0)
+
+    def test_layout(self):
+        adj_idx, adj_val = self.addresslayout.generate_partition_flat_inverted(self.adj_dict, edges_per_burst=4, bytes_per_edge=4, vault_map=(16, 128))
+        self.check_lists(adj_idx, adj_val, 4, True)
+        starts = [min(idx for idx, n in adj_idx[pe] if n) for pe in range(self.num_pe)]
+        self.assertEqual([(start//128) % 16 for start in starts], [0, 4, 8, 12])
+
+    def walk(self, adj_idx):
+        """Cycles waited on busy vaults when all PEs walk their lists at the
+        same time, one 16 byte burst per request."""
+        hmc = HMCModel(num_ports=self.num_pe, vault_cycles_per_flit=4, link_flits_per_cycle=0)
+        bursts = [[idx + 16*i for idx, n in adj_idx[pe] for i in range(-(-n//4))] for pe in range(self.num_pe)]
+        num_requests = sum(len(b) for b in bursts)
+        now = 0
+        while hmc.num_responses < num_requests:
+            for pe in range(self.num_pe):
+                hmc.response(now, pe)
+                if bursts[pe] and hmc.can_accept(now, pe) and len(hmc.outstanding[pe]) < 8:
+                    hmc.request(now, pe, now, bursts[pe].pop(0))
+            now += 1
+        return hmc.vault_wait_cycles
+
+    def test_balance(self):
+        flat, _ = self.addresslayout.generate_partition_flat_inverted(self.adj_dict, edges_per_burst=4)
+        vault, _ = self.addresslayout.generate_partition_flat_inverted(self.adj_dict, edges_per_burst=4, vault_map=(16, 128))
+        self.assertLess(self.walk(vault), self.walk(flat))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import random
+from configparser import ConfigParser
+
+from migen import *
+
+from core_init import resolve_defaults
+import top_minimal
+
+def make_config(algo, bus_load):
+    random.seed(42)
+    config = ConfigParser()
+    config['arch'] = {'num_pe': '2'}
+    config['graph'] = {'nodes': '20', 'edges': '40'}
+    config['app'] = {'algo': algo}
+    config['logging'] = {'log_file_name': "unittest_bus_load", 'disable_logfile': True, 'console_log_level': 'WARNING'}
+    config = resolve_defaults(config)
+    config.sim_bus_load = bus_load
+    return config
+
+def run(config):
+    """-> dict vertex -> final state, read back the way the graph was loaded"""
+    tb = top_minimal.UnCore(config)
+    core = tb.cores[0]
+    states = {}
+
+    def gen_run():
+        if config.sim_bus_load:
+            yield from core.gen_bus_load()
+        yield core.init_complete.eq(1)
+        yield
+        while not (yield tb.global_inactive):
+            yield
+        states.update((yield from core.gen_states()))
+
+    generators = [tb.gen_simulation(tb), gen_run()]
+    if config.sim_bus_load:
+        port = core.bramio.axi_port
+        generators.extend([port.gen_radr(), port.gen_rdata(), port.gen_wadr(), port.gen_wdata(), port.gen_wresp()])
+    run_simulation(tb, generators)
+    return states
+
+class BusLoadCase(unittest.TestCase):
+    def test_same_result(self):
+        for algo in ["bfs", "sssp"]:
+            preload = run(make_config(algo, False))
+            bus_load = run(make_config(algo, True))
+            self.assertEqual(set(preload), set(make_config(algo, False).graph.nodes()), algo)
+            self.assertEqual(bus_load, preload, algo)
+
+if __name__ == "__main__":
+    unittest.main()
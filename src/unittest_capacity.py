@@ -0,0 +1,84 @@
+import unittest
+import tempfile
+import random
+import os
+from configparser import ConfigParser
+
+from migen import *
+
+from core_init import resolve_defaults
+from core_bramif import read_image
+from tbsupport import get_special_overrides
+from export_cache import design_key
+import top_minimal
+
+def make_config(num_nodes, num_edges, capacity=True, algo="bfs"):
+    random.seed(42)
+    config = ConfigParser()
+    config['arch'] = {'num_pe': '2'}
+    if capacity:
+        config['arch'].update({'capacity_nodes_per_pe': '40', 'capacity_edges_per_pe': '200'})
+    config['graph'] = {'nodes': str(num_nodes), 'edges': str(num_edges)}
+    config['app'] = {'algo': algo}
+    config['logging'] = {'log_file_name': "unittest_capacity", 'disable_logfile': True, 'console_log_level': 'WARNING'}
+    return resolve_defaults(config)
+
+class CapacityCase(unittest.TestCase):
+    def test_layout(self):
+        config = make_config(20, 40)
+        self.assertTrue(config.capacity)
+        self.assertEqual(config.addresslayout.num_nodes_per_pe, 64)
+        self.assertEqual(config.addresslayout.max_edges_per_pe, 256)
+        # same partition as without capacity, only the local address space grows
+        reference = make_config(20, 40, capacity=False)
+        shift = log2_int(reference.addresslayout.num_nodes_per_pe)
+        relabel = lambda n: ((n >> shift) << 6) | (n & ((1 << shift) - 1))
+        self.assertEqual(sorted(map(relabel, reference.graph.nodes())), sorted(config.graph.nodes()))
+        self.assertEqual([len(x) for x in reference.adj_val], [len(x) for x in config.adj_val])
+
+    def test_too_large(self):
+        with self.assertRaises(ValueError):
+            make_config(200, 400)
+
+    def export(self, outdir, configs):
+        sources = []
+        for config in configs:
+            filename = os.path.join(outdir, "top.v")
+            top_minimal.export(config, filename=filename)
+            with open(filename) as f:
+                sources.append(f.read())
+        return sources
+
+    def test_export(self):
+        with tempfile.TemporaryDirectory() as outdir:
+            sources = self.export(outdir, [make_config(20, 40), make_config(30, 70)])
+            self.assertEqual(sources[0], sources[1])
+
+            config = make_config(30, 70)
+            filename = os.path.join(outdir, "graph.img")
+            top_minimal.image(config, filename=filename)
+            writes = read_image(filename)
+            # vertex data, CSR index and values of both PEs, vertex counts
+            self.assertEqual(len(writes), sum(len(x) for x in config.memory_images()))
+            self.assertEqual(writes[-1][1], len(config.adj_idx[1]))
+
+    def test_export_constants(self):
+        # 0.15/num_nodes of pr is written by the host, not built in
+        configs = [make_config(20, 40, algo="pr"), make_config(40, 80, algo="pr")]
+        self.assertNotEqual(configs[0].const_base, configs[1].const_base)
+        self.assertEqual(design_key(configs[0], "top_minimal"), design_key(configs[1], "top_minimal"))
+        with tempfile.TemporaryDirectory() as outdir:
+            sources = self.export(outdir, configs)
+        self.assertEqual(sources[0], sources[1])
+        for config in configs:
+            images = config.memory_images()
+            self.assertEqual(images[-2:], [[config.const_base], [config.const_base]])
+
+    def test_no_load_path(self):
+        # other tops would export empty graph memories
+        with self.assertRaises(NotImplementedError):
+            get_special_overrides(make_config(20, 40))
+        get_special_overrides(make_config(20, 40, capacity=False))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import tempfile
+import random
+import os
+from configparser import ConfigParser
+
+from migen import *
+from util.mem import FullyInitMemory
+
+from core_init import resolve_defaults
+from tbsupport import cd, get_special_overrides
+from export_cache import convert_cached, design_key
+
+def make_config(num_nodes, num_edges, capacity=True):
+    random.seed(42)
+    config = ConfigParser()
+    config['arch'] = {'num_pe': '2'}
+    if capacity:
+        config['arch'].update({'capacity_nodes_per_pe': '40', 'capacity_edges_per_pe': '200'})
+    config['graph'] = {'nodes': str(num_nodes), 'edges': str(num_edges)}
+    config['app'] = {'algo': "bfs"}
+    config['logging'] = {'log_file_name': "unittest_export_cache", 'disable_logfile': True, 'console_log_level': 'WARNING'}
+    return resolve_defaults(config)
+
+class ExportCacheCase(unittest.TestCase):
+    class Top(Module):
+        def __init__(self, config):
+            self.specials.mem = FullyInitMemory(8, 4, init=config.adj_val[0][:4], name="edge_csr_val")
+            self.specials.rd_port = rd_port = self.mem.get_port()
+            self.ios = {rd_port.adr, rd_port.dat_r}
+
+    def export(self, config, outdir):
+        built = []
+        def build():
+            m = self.Top(config)
+            built.append(m)
+            return m, m.ios
+        with cd(outdir):
+            convert_cached(config, build, "top.v", key="test", name="top", special_overrides=get_special_overrides(config))
+            files = dict()
+            for name in os.listdir("."):
+                with open(name) as f:
+                    files[name] = f.read()
+        return len(built), files
+
+    def test_reuse(self):
+        config = make_config(20, 40, capacity=False)
+        config.export_mem_init_files = True
+        with tempfile.TemporaryDirectory() as cache, tempfile.TemporaryDirectory() as out1, tempfile.TemporaryDirectory() as out2:
+            config.export_cache = cache
+            num_built, files = self.export(config, out1)
+            self.assertEqual(num_built, 1)
+            self.assertEqual(set(files), {"top.v", "edge_csr_val.hex"})
+            num_built, cached_files = self.export(config, out2)
+            self.assertEqual(num_built, 0)
+            self.assertEqual(cached_files, files)
+
+    def test_key(self):
+        # a graph that fits only matters if the design is not sized by capacity
+        self.assertEqual(design_key(make_config(20, 40)), design_key(make_config(30, 70)))
+        self.assertNotEqual(design_key(make_config(20, 40, capacity=False)), design_key(make_config(20, 41, capacity=False)))
+        config = make_config(20, 40)
+        self.assertNotEqual(design_key(config, "fpga 0"), design_key(config, "fpga 1"))
+        self.assertNotEqual(design_key(config, name="top"), design_key(config, name="echo"))
+        key = design_key(config)
+        config.vcdname = "other"
+        config.sim_monitor = "off"
+        self.assertEqual(design_key(config), key)
+        config.local_bypass = True
+        self.assertNotEqual(design_key(config), key)
+
+if __name__ == "__main__":
+    unittest.main()
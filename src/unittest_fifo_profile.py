@@ -0,0 +1,60 @@
+import unittest
+import tempfile
+import configparser
+import os
+
+from migen import *
+from migen.genlib.fifo import SyncFIFO
+from tbsupport import SimCase
+
+from sim_fifo_profile import find_fifos, gen_fifo_profile
+
+class FIFOProfileCase(SimCase, unittest.TestCase):
+    class TestBench(Module):
+        def __init__(self):
+            self.submodules.fast = SyncFIFO(width=8, depth=4)
+            self.submodules.slow = SyncFIFO(width=8, depth=4)
+            self.submodules.ring = [SyncFIFO(width=8, depth=2) for _ in range(2)]
+            self.global_inactive = Signal()
+
+    def test_profile(self):
+        self.assertEqual([(path, site) for path, site, fifo in find_fifos(self.tb)], [
+            ("TestBench.fast", "TestBench.fast"),
+            ("TestBench.slow", "TestBench.slow"),
+            ("TestBench.ring0", "TestBench.ring"),
+            ("TestBench.ring1", "TestBench.ring")
+        ])
+
+        def gen_write(fifo):
+            for x in range(20):
+                yield fifo.din.eq(x)
+                yield fifo.we.eq(1)
+                yield
+                while not (yield fifo.writable):
+                    yield
+            yield fifo.we.eq(0)
+
+        def gen_read(fifo, every):
+            for x in range(20):
+                for _ in range(every - 1):
+                    yield
+                yield fifo.re.eq(1)
+                yield
+                while not (yield fifo.readable):
+                    yield
+                yield fifo.re.eq(0)
+
+        def gen_done():
+            for _ in range(300):
+                yield
+            yield self.tb.global_inactive.eq(1)
+
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, "fifo.ini")
+            self.run_with([gen_write(self.tb.fast), gen_read(self.tb.fast, 1), gen_write(self.tb.slow), gen_read(self.tb.slow, 8), gen_done(), gen_fifo_profile(self.tb, filename)])
+            config = configparser.ConfigParser()
+            config.read(filename)
+            self.assertEqual(dict(config["fifo_depths"]), {"testbench.slow": "16"})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+import random
+
+import networkx as nx
+
+from migen import log2_int
+
+from graph_manage import generate_graph, reorder_graph, partition_contiguous, cross_pe_edge_fraction
+
+class ReorderCase(unittest.TestCase):
+    def setUp(self):
+        random.seed(7)
+        self.graph = generate_graph(40, 120, digraph=True)
+
+    def test_bijection(self):
+        edges = set(self.graph.edges())
+        for method in ["degree", "bfs", "rcm", "community"]:
+            g = reorder_graph(self.graph.copy(), method)
+            self.assertEqual(sorted(g.nodes()), list(range(len(self.graph))), method)
+            origin = {n: g.node[n]['origin'] for n in g}
+            self.assertEqual(sorted(origin.values()), sorted(self.graph.nodes()), method)
+            self.assertEqual({(origin[u], origin[v]) for u, v in g.edges()}, edges, method)
+
+    def test_keep_origin(self):
+        g = self.graph.copy()
+        for n in g:
+            g.node[n]['origin'] = "v{}".format(n)
+        g = reorder_graph(g, "bfs")
+        self.assertEqual(sorted(g.node[n]['origin'] for n in g), sorted("v{}".format(n) for n in self.graph))
+
+    def test_none(self):
+        self.assertIs(reorder_graph(self.graph, "none"), self.graph)
+
+class PartitionContiguousCase(unittest.TestCase):
+    def test_runs(self):
+        random.seed(7)
+        num_pe = 4
+        g = reorder_graph(generate_graph(60, 240, digraph=True), "rcm")
+        for n in g:
+            g.node[n]['position'] = n
+        degree = dict(g.degree())
+        parts, num_nodes_per_pe = partition_contiguous(g, num_pe)
+        shift = log2_int(num_nodes_per_pe)
+
+        runs = [sorted(parts.node[n]['position'] for n in parts if n >> shift == pe) for pe in range(num_pe)]
+        # each PE gets the next run of consecutive vertices
+        self.assertEqual([p for run in runs for p in run], list(range(len(g))))
+
+        edges = [sum(degree[p] for p in run) for run in runs]
+        total = sum(degree.values())
+        for e in edges:
+            self.assertLessEqual(abs(e - total/num_pe), max(degree.values()))
+
+class CrossPEEdgesCase(unittest.TestCase):
+    def test_fraction(self):
+        g = nx.DiGraph()
+        # 4 vertices per PE: 1, 2 on PE 0, 5, 6 on PE 1, 9 on PE 2
+        g.add_edges_from([(1, 2), (1, 5), (6, 5), (9, 1), (5, 9), (2, 1), (6, 2), (9, 9)])
+        self.assertEqual(cross_pe_edge_fraction(g, 4), 4/8)
+        self.assertEqual(cross_pe_edge_fraction(g, 16), 0.0)
+        self.assertEqual(cross_pe_edge_fraction(nx.DiGraph(), 4), 0.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import random
+
+from migen import *
+from tbsupport import SimCase
+
+from hmc_backed_fifo import HMCBackedFIFO
+from sim_hmc import HMCModel, gen_hmc_port
+
+class HMCPort:
+    """Controller side of an HMC port as in PicoPlatform."""
+    HMC_CMD_RD = 0b0000
+    HMC_CMD_WR_NP = 0b0001
+    effective_max_tag_size = 6
+
+    def __init__(self):
+        self.cmd = Signal(4)
+        self.addr = Signal(34)
+        self.size = Signal(4)
+        self.tag = Signal(self.effective_max_tag_size)
+        self.cmd_valid = Signal()
+        self.cmd_ready = Signal()
+        self.wr_data = Signal(128)
+        self.wr_data_valid = Signal()
+        self.wr_data_ready = Signal()
+        self.rd_data = Signal(128)
+        self.rd_data_tag = Signal(self.effective_max_tag_size)
+        self.rd_data_valid = Signal()
+        self.dinv = Signal()
+
+class HMCBackedFIFOCase(SimCase, unittest.TestCase):
+    class TestBench(Module):
+        def __init__(self, burst_flits=1):
+            self.port = HMCPort()
+            self.submodules.dut = HMCBackedFIFO(width=24, start_addr=0x10000, end_addr=0x20000, port=self.port, burst_flits=burst_flits)
+
+    def check(self, burst_flits):
+        data = list(range(500))
+        model = HMCModel(num_ports=1, latency=30, latency_dist="uniform", latency_spread=20)
+        dut = self.tb.dut
+
+        def gen_write():
+            for x in data:
+                yield dut.din.eq(x)
+                yield dut.we.eq(1)
+                yield
+                while not (yield dut.writable):
+                    yield
+                yield dut.we.eq(0)
+                # bursts, so entries have to go through HMC
+                if random.random() < 0.02:
+                    for _ in range(random.randrange(200)):
+                        yield
+
+        def gen_read():
+            for x in data:
+                yield dut.re.eq(random.random() < 0.5)
+                yield
+                while not ((yield dut.readable) and (yield dut.re)):
+                    yield dut.re.eq(random.random() < 0.5)
+                    yield
+                self.assertEqual(x, (yield dut.dout))
+            yield dut.re.eq(0)
+            yield
+            self.assertEqual((yield dut.level), 0)
+            self.assertEqual((yield dut.num_hmc_writes), (yield dut.num_hmc_reads))
+            self.assertEqual((yield dut.num_hmc_writes), model.num_writes)
+            # 4 entries of 24 bits per flit
+            self.assertEqual((yield dut.num_hmc_writes)*4*burst_flits + (yield dut.num_bypassed), len(data))
+            self.assertGreater((yield dut.num_hmc_writes), 0)
+            self.assertGreater((yield dut.num_bypassed), 0)
+
+        random.seed(1)
+        self.run_with([gen_hmc_port(self.tb.port, 0, model, dict()), gen_write(), gen_read()])
+
+    def test_flit(self):
+        self.check(1)
+
+    def test_burst(self):
+        self.setUp(burst_flits=4)
+        self.check(4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import tempfile
+import random
+import re
+import os
+from configparser import ConfigParser
+
+from migen import *
+from migen.fhdl import verilog
+
+from core_init import resolve_defaults
+from core_apply import Apply
+from core_scatter import Scatter
+from core_netlistkernelwrapper import NetlistGatherKernelWrapper, NetlistScatterKernelWrapper
+from sim_export_apply_scatter_kernels import use_kernel_library
+
+def make_config():
+    random.seed(42)
+    config = ConfigParser()
+    config['arch'] = {'num_pe': '2'}
+    config['graph'] = {'nodes': '20', 'edges': '40'}
+    config['app'] = {'algo': "bfs"}
+    config['logging'] = {'log_file_name': "unittest_kernel_library", 'disable_logfile': True, 'console_log_level': 'WARNING'}
+    return resolve_defaults(config)
+
+class KernelLibraryCase(unittest.TestCase):
+    def test_library(self):
+        with tempfile.TemporaryDirectory() as lib:
+            config = make_config()
+            files = use_kernel_library(config, lib)
+            self.assertEqual([os.path.basename(f) for f in files], ["apply.v", "gather.v", "scatter.v"])
+            self.assertIs(config.gatherkernel, NetlistGatherKernelWrapper)
+            self.assertIs(config.scatterkernel, NetlistScatterKernelWrapper)
+            with self.assertRaises(ValueError):
+                use_kernel_library(config, lib)
+
+            mtime = os.path.getmtime(files[0])
+            self.assertEqual(use_kernel_library(make_config(), lib), files)
+            self.assertEqual(os.path.getmtime(files[0]), mtime)
+
+            # the wrappers connect exactly the ports of the exported kernels
+            m = Module()
+            m.submodules += Apply(config, 0), Scatter(0, config)
+            top = str(verilog.convert(m, ios=set()))
+            for filename in files:
+                with open(filename) as f:
+                    v = f.read()
+                name = re.search(r"module (\w+)\(", v).group(1)
+                ports = set(re.findall(r"^\t(?:input|output)(?: reg)?(?: signed)?(?: \[[^\]]*\])? (\w+)", v, re.M))
+                instance = re.search(r"^{0} {0}\((.*?)\);".format(name), top, re.M | re.S).group(1)
+                self.assertEqual(set(re.findall(r"\.(\w+)\(", instance)), ports)
+
+if __name__ == "__main__":
+    unittest.main()
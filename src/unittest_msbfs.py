@@ -0,0 +1,65 @@
+import unittest
+import tempfile
+import os
+from configparser import ConfigParser
+
+import networkx as nx
+
+from migen import *
+
+from core_init import resolve_defaults
+import top_minimal
+
+# directed, so that the roots reach different parts of the graph
+edges = [(1, 2), (2, 3), (3, 4), (5, 4), (6, 5), (6, 7), (7, 1), (8, 6), (4, 9), (9, 10), (11, 8), (10, 12)]
+
+def make_config(sources):
+    config = ConfigParser()
+    config['arch'] = {'num_pe': '2'}
+    config['graph'] = {}
+    config['app'] = {'algo': 'msbfs', 'sources': sources}
+    config['logging'] = {'log_file_name': "unittest_msbfs", 'disable_logfile': True, 'console_log_level': 'WARNING'}
+    with tempfile.TemporaryDirectory() as graphdir:
+        graphfile = os.path.join(graphdir, "msbfs.graph")
+        with open(graphfile, "w") as f:
+            for u, v in edges:
+                f.write("{} {}\n".format(u, v))
+        return resolve_defaults(config, graphfile=graphfile, digraph=True)
+
+def run(config):
+    """-> dict vertex -> final state"""
+    tb = top_minimal.UnCore(config)
+    core = tb.cores[0]
+    states = {}
+
+    def gen_run():
+        yield core.init_complete.eq(1)
+        yield
+        while not (yield tb.global_inactive):
+            yield
+        states.update((yield from core.gen_states()))
+
+    run_simulation(tb, [tb.gen_simulation(tb), gen_run()])
+    return states
+
+class MSBFSCase(unittest.TestCase):
+    def test_reachability(self):
+        sources = ["3", "6", "10", "11"]
+        config = make_config(", ".join(sources))
+        self.assertEqual(config.addresslayout.num_sources, len(sources))
+        by_origin = {config.graph.node[v]['origin']: v for v in config.graph}
+        states = run(config)
+        self.assertEqual(set(states), set(config.graph.nodes()))
+        for i, source in enumerate(sources):
+            root = by_origin[source]
+            reachable = nx.descendants(config.graph, root) | {root}
+            for v, state in states.items():
+                self.assertEqual(bool(state['visited'] & (1 << i)), v in reachable, "source {} vertex {}".format(source, config.graph.node[v]['origin']))
+
+    def test_bad_sources(self):
+        for sources in ["3, 42", "3, 3"]:
+            with self.assertRaises(ValueError):
+                make_config(sources)
+
+if __name__ == "__main__":
+    unittest.main()
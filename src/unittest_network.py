@@ -10,6 +10,7 @@ from core_init import resolve_defaults
 from configparser import ConfigParser
 
 from fifo_network import Network, MultiNetwork
+from sim_traffic import patterns, characterize, transpose
 
 def get_generators(self, num_rounds):
     sent = [[] for _ in range(self.tb.config.addresslayout.num_pe)]
@@ -28,6 +29,20 @@ def get_generators(self, num_rounds):
     # for pe in range(self.tb.config.addresslayout.num_pe):
     #     print("PE {}: {}".format(pe, sent[pe]))
 
+    def send(interface, msg, roundpar):
+        yield (interface.msg.dest_id.eq(msg["dest_id"]))
+        yield (interface.msg.sender.eq(msg["sender"]))
+        yield (interface.msg.payload.eq(msg["payload"]))
+        yield (interface.msg.barrier.eq(msg["barrier"]))
+        yield (interface.msg.roundpar.eq(roundpar))
+        yield (interface.dest_pe.eq(msg["dest_pe"]))
+        yield (interface.valid.eq(random.choice([0,1])))
+        yield
+        while not ((yield interface.valid) and (yield interface.ack)):
+            yield (interface.valid.eq(1)) #random.choice([0,1])
+            yield
+        yield (interface.valid.eq(0))
+
     def gen_input(pe, num_rounds):
         fpga = pe // self.tb.config.addresslayout.num_pe_per_fpga
         local_pe = pe % self.tb.config.addresslayout.num_pe_per_fpga
@@ -36,32 +51,15 @@ def get_generators(self, num_rounds):
             messages = sent[pe].copy()
             while messages:
                 msg = messages.pop(random.randrange(len(messages)))
-                yield (network_interface.msg.dest_id.eq(msg["dest_id"]))
-                yield (network_interface.msg.sender.eq(msg["sender"]))
-                yield (network_interface.msg.payload.eq(msg["payload"]))
-                yield (network_interface.msg.barrier.eq(msg["barrier"]))
-                yield (network_interface.msg.roundpar.eq(roundpar))
-                yield (network_interface.dest_pe.eq(msg["dest_pe"]))
-                yield (network_interface.valid.eq(random.choice([0,1])))
-                yield
-                while not ((yield network_interface.valid) and (yield network_interface.ack)):
-                    yield (network_interface.valid.eq(1)) #random.choice([0,1])
-                    yield
+                if self.tb.config.local_bypass and msg["dest_pe"] == pe:
+                    # as Scatter does, messages to this PE skip the network
+                    yield from send(self.tb.dut[fpga].local_interface[local_pe], msg, roundpar)
+                else:
+                    yield from send(network_interface, msg, roundpar)
             messages = [{"dest_id": num_sent[pe][i], "sender": pe << log2_int(self.tb.config.addresslayout.num_nodes_per_pe), "payload": 0, "barrier": 1, "dest_pe": i} for i in range(self.tb.config.addresslayout.num_pe)]
             while messages:
                 msg = messages.pop(random.randrange(len(messages)))
-                yield (network_interface.msg.dest_id.eq(msg["dest_id"]))
-                yield (network_interface.msg.sender.eq(msg["sender"]))
-                yield (network_interface.msg.payload.eq(msg["payload"]))
-                yield (network_interface.msg.barrier.eq(msg["barrier"]))
-                yield (network_interface.msg.roundpar.eq(roundpar))
-                yield (network_interface.dest_pe.eq(msg["dest_pe"]))
-                yield (network_interface.valid.eq(random.choice([0,1])))
-                yield
-                while not ((yield network_interface.valid) and (yield network_interface.ack)):
-                    yield (network_interface.valid.eq(1)) #random.choice([0,1])
-                    yield
-        yield (network_interface.valid.eq(0))
+                yield from send(network_interface, msg, roundpar)
         yield
 
     def gen_output(pe, num_rounds):
@@ -121,9 +119,9 @@ def get_generators(self, num_rounds):
 
 class NetworkCase(SimCase, unittest.TestCase):
     class TestBench(Module):
-        def __init__(self):
+        def __init__(self, local_bypass=False):
             configparser = ConfigParser()
-            configparser['arch'] = {'num_pe' : 8}
+            configparser['arch'] = {'num_pe' : 8, 'local_bypass': local_bypass}
             configparser['graph'] = {}
             configparser['app'] = {'algo': "bfs"}
             configparser['logging'] = {'log_file_name': "unittest_network", 'disable_logfile': False}
@@ -137,12 +135,17 @@ class NetworkCase(SimCase, unittest.TestCase):
         num_rounds = 3
         self.run_with(get_generators(self, num_rounds), vcd_name="unittest_network.vcd")
 
+    def test_local_bypass(self):
+        self.setUp(local_bypass=True)
+        self.assertTrue(self.tb.config.local_bypass)
+        self.run_with(get_generators(self, 3))
+
 
 class MultiNetworkCase(SimCase, unittest.TestCase):
     class TestBench(Module):
-        def __init__(self):
+        def __init__(self, local_bypass=False):
             configparser = ConfigParser()
-            configparser['arch'] = {'num_pe': 4, 'num_fpga': 2}
+            configparser['arch'] = {'num_pe': 4, 'num_fpga': 2, 'arch': 'S', 'local_bypass': local_bypass}
             configparser['graph'] = {}
             configparser['app'] = {'algo': "bfs"}
             configparser['logging'] = {'log_file_name': "unittest_network", 'disable_logfile': False}
@@ -170,6 +173,22 @@ class MultiNetworkCase(SimCase, unittest.TestCase):
         num_rounds = 3
         self.run_with(get_generators(self, num_rounds), vcd_name="test_network.vcd")
 
+    def test_local_bypass(self):
+        self.setUp(local_bypass=True)
+        self.assertTrue(self.tb.config.local_bypass)
+        self.run_with(get_generators(self, 3))
+
+class TrafficCase(unittest.TestCase):
+    def test_patterns(self):
+        for pattern in patterns:
+            rows = characterize("fifo_network", 4, 1, pattern, [0.5], messages_per_round=16)
+            load, accepted, latency, p99 = rows[0]
+            self.assertGreater(accepted, 0)
+            self.assertGreaterEqual(p99, latency)
+
+    def test_transpose(self):
+        self.assertEqual([transpose(16, src, None) for src in (0, 1, 4, 5, 15)], [0, 4, 1, 5, 15])
+
 if __name__ == "__main__":
     random.seed(42)
     unittest.main()
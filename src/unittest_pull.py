@@ -0,0 +1,110 @@
+import unittest
+import random
+from configparser import ConfigParser
+
+import networkx as nx
+
+from migen import *
+from tbsupport import SimCase
+
+from core_init import resolve_defaults
+from inverted_pull import PullSweep
+import inverted_top
+
+def make_config(direction_optimizing):
+    random.seed(42)
+    config = ConfigParser()
+    config['arch'] = {'num_pe': '4', 'arch': 'M', 'direction_optimizing': str(direction_optimizing), 'pull_alpha': '100', 'pull_beta': '2'}
+    config['graph'] = {'nodes': '24', 'edges': '96'}
+    config['app'] = {'algo': "bfs"}
+    config['logging'] = {'log_file_name': "unittest_pull", 'disable_logfile': True, 'console_log_level': 'WARNING'}
+    return resolve_defaults(config)
+
+class PullSweepCase(SimCase, unittest.TestCase):
+    class TestBench(Module):
+        def __init__(self):
+            self.config = make_config(True)
+            self.submodules.dut = PullSweep(0, self.config)
+
+    def test_back_to_back(self):
+        dut = self.tb.dut
+        config = self.tb.config
+        root = [v for v in config.graph if config.graph.node[v]['active']][0]
+        expected = [v for v in config.graph if config.addresslayout.pe_adr(v) == 0 and v != root and root in config.graph.predecessors(v)]
+        self.assertTrue(expected)
+        sweeps = []
+
+        def gen():
+            yield dut.pull.eq(1)
+            yield dut.apply_interface.ack.eq(1)
+            yield dut.update_sender.eq(root)
+            yield dut.update_valid.eq(1)
+            yield
+            yield dut.update_valid.eq(0)
+            # two barriers in a row: start stays up, each must get its own sweep
+            yield dut.start.eq(1)
+            for _ in range(2):
+                pulled = []
+                yield
+                while not (yield dut.done):
+                    if (yield dut.apply_interface.valid):
+                        pulled.append((yield dut.apply_interface.msg.dest_id))
+                        self.assertEqual((yield dut.apply_interface.msg.sender), root)
+                    yield
+                sweeps.append(pulled)
+                yield dut.barrier.eq(1)
+                yield
+                yield dut.barrier.eq(0)
+            yield dut.start.eq(0)
+            yield
+
+        self.run_with([gen()])
+        self.assertEqual(sweeps, [expected, expected])
+
+def run_bfs(config):
+    """-> dict vertex -> parent, and number of rounds pulled"""
+    tb = inverted_top.UnCore(config)
+    core = tb.cores[0]
+    parents = {}
+    num_pull_rounds = []
+
+    def gen_run():
+        yield core.init_complete.eq(1)
+        yield
+        while not (yield tb.global_inactive):
+            yield
+        for a in core.apply:
+            for node in range(a.mem.depth):
+                vertexid = config.addresslayout.global_adr(a.pe_id, node)
+                if vertexid in config.graph:
+                    parents[vertexid] = config.final_state((yield a.mem[node]))["parent"]
+        if config.direction_optimizing:
+            for s in core.scatter:
+                num_pull_rounds.append((yield s.pullsweep.num_pull_rounds))
+
+    run_simulation(tb, [tb.gen_simulation(tb), gen_run()])
+    return parents, sum(num_pull_rounds)
+
+class DirectionOptimizingCase(unittest.TestCase):
+    def check_tree(self, config, parents):
+        root = [v for v in config.graph if config.graph.node[v]['active']][0]
+        depth = nx.single_source_shortest_path_length(config.graph, root)
+        self.assertEqual(set(parents), set(config.graph.nodes()))
+        for v, p in parents.items():
+            if v != root:
+                self.assertIn(v, config.graph[p])
+                self.assertEqual(depth[p] + 1, depth[v])
+
+    def test_bfs(self):
+        push = make_config(False)
+        parents, _ = run_bfs(push)
+        self.check_tree(push, parents)
+
+        pull = make_config(True)
+        self.assertTrue(pull.direction_optimizing)
+        parents, num_pull_rounds = run_bfs(pull)
+        self.check_tree(pull, parents)
+        self.assertGreater(num_pull_rounds, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+from migen import *
+
+from resource_estimate import memory_usage, estimate, total, fits
+
+class ResourceEstimateCase(unittest.TestCase):
+    def memory(self, width, depth, async_read=False):
+        m = Memory(width, depth)
+        m.get_port(write_capable=True)
+        m.get_port(async_read=async_read)
+        return m
+
+    def test_memory(self):
+        self.assertEqual(memory_usage(self.memory(32, 1024))["bram18"], 2)
+        self.assertEqual(memory_usage(self.memory(72, 512))["bram18"], 2)
+        self.assertEqual(memory_usage(self.memory(1, 16384))["bram18"], 1)
+        self.assertEqual(memory_usage(self.memory(8, 16))["lutram"], 8)
+        self.assertEqual(memory_usage(self.memory(32, 1024, async_read=True))["lutram"], 1024)
+        self.assertEqual(memory_usage(self.memory(64, 16384))["bram18"], 64)
+        self.assertEqual(memory_usage(self.memory(64, 16384), uram=True)["uram"], 4)
+
+    def test_attribution(self):
+        class Counter(Module):
+            def __init__(self):
+                self.count = Signal(16)
+                self.sync += self.count.eq(self.count + 1)
+
+        class Top(Module):
+            def __init__(self):
+                self.submodules.counters = [Counter() for _ in range(3)]
+                self.specials.mem = Memory(32, 4096)
+                self.specials.port = self.mem.get_port()
+                self.flag = Signal()
+                self.sync += self.flag.eq(self.counters[0].count == 5)
+
+        usage = estimate(Top())
+        count, u = usage["Counter"]
+        self.assertEqual(count, 3)
+        self.assertEqual(u["ff"], 48)
+        self.assertEqual(u["lut"], 48)
+        self.assertEqual(usage["Top"][1]["ff"], 1)
+        self.assertEqual(usage["Top"][1]["bram18"], 8)
+        self.assertEqual(total(usage)["ff"], 49)
+        self.assertTrue(fits(total(usage)))
+        self.assertFalse(fits(total(usage), utilization=0.001))
+
+if __name__ == "__main__":
+    unittest.main()
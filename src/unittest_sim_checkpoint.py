@@ -0,0 +1,76 @@
+import unittest
+import tempfile
+import os
+
+from migen import *
+from migen.genlib.fifo import SyncFIFO
+
+from sim_checkpoint import gen_checkpoint, _memories, SimulationStopped
+
+class CheckpointCase(unittest.TestCase):
+    class TestBench(Module):
+        def __init__(self):
+            self.level = Signal(32)
+            self.count = Signal(8)
+            self.specials.mem = Memory(8, 16)
+            self.specials.wr_port = wr_port = self.mem.get_port(write_capable=True)
+            self.specials.rd_port = rd_port = self.mem.get_port()
+            self.submodules.fifo = SyncFIFO(8, 4)
+            self.sync += [
+                self.count.eq(self.count + 3),
+                If(self.count[:4] == 0, self.level.eq(self.level + 1))
+            ]
+            self.comb += [
+                wr_port.adr.eq(self.count[:4]),
+                wr_port.dat_w.eq(self.count ^ self.level),
+                wr_port.we.eq(1),
+                rd_port.adr.eq(self.count[2:6]),
+                self.fifo.din.eq(self.count),
+                self.fifo.we.eq(self.count[0]),
+                self.fifo.re.eq(self.count[1])
+            ]
+
+    def run_tb(self, num_cycles, **kwargs):
+        tb = self.TestBench()
+        trace = []
+        def gen_trace():
+            for _ in range(num_cycles):
+                state = [(yield tb.level), (yield tb.count), (yield tb.rd_port.dat_r), (yield tb.fifo.dout), (yield tb.fifo.level)]
+                for i in range(tb.mem.depth):
+                    state.append((yield tb.mem[i]))
+                trace.append(state)
+                yield
+        try:
+            run_simulation(tb, [gen_trace(), gen_checkpoint(tb, [tb.level], self.basename, Signal().duid, _memories(tb), **kwargs)])
+        except SimulationStopped:
+            pass
+        return trace
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.basename = os.path.join(self.dir.name, "tb")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_restore(self):
+        full = self.run_tb(200, every=3)
+        restored = self.run_tb(50, restore=self.basename + ".level3.ckpt")
+        start = [state[0] for state in full].index(3)
+        self.assertEqual(restored[1:], full[start:start + 49])
+
+    def test_stop_after(self):
+        trace = self.run_tb(1000, stop_after=2)
+        self.assertEqual(trace[-1][0], 2)
+
+    def test_wrong_design(self):
+        self.run_tb(100, every=1)
+        tb = self.TestBench()
+        tb.specials.other = Memory(4, 4)
+        def gen_idle():
+            yield
+        with self.assertRaises(ValueError):
+            run_simulation(tb, [gen_idle(), gen_checkpoint(tb, [tb.level], self.basename, Signal().duid, _memories(tb), restore=self.basename + ".level1.ckpt")])
+
+if __name__ == "__main__":
+    unittest.main()
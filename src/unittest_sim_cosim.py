@@ -0,0 +1,191 @@
+import unittest
+import tempfile
+import os
+import re
+import random
+import logging
+from types import SimpleNamespace
+from configparser import ConfigParser
+
+from migen import *
+
+from core_init import resolve_defaults
+from core_interfaces import NetworkInterface
+from sim_cosim import CoSim, ShmRing
+import core_top_pico
+import core_top_multifpga_sim
+
+_layout = [("payload", 16), ("valid", 1), ("ack", 1)]
+
+class ToyCore(Module):
+    """Sends num_messages numbered messages to the next FPGA and records what
+    it receives in a memory."""
+    def __init__(self, fpga_id, num_fpga, num_messages):
+        self.network = SimpleNamespace(
+            external_network_interface_in=[Record(_layout)],
+            external_network_interface_out=[Record(_layout)]
+        )
+        out = self.network.external_network_interface_out[0]
+        inp = self.network.external_network_interface_in[0]
+        self.start = Signal()
+        self.global_inactive = Signal()
+        self.fpga_id = fpga_id
+        self.num_messages = num_messages
+
+        num_sent = Signal(16)
+        toggle = Signal()
+        self.num_recvd = Signal(16)
+        self.specials.mem = Memory(16, num_messages)
+        self.specials.wr_port = wr_port = self.mem.get_port(write_capable=True)
+
+        self.comb += [
+            out.payload.eq(fpga_id*1000 + num_sent),
+            out.valid.eq(self.start & (num_sent < num_messages)),
+            # only accept every other cycle to exercise backpressure
+            inp.ack.eq(toggle),
+            wr_port.adr.eq(self.num_recvd),
+            wr_port.dat_w.eq(inp.payload),
+            wr_port.we.eq(inp.valid & inp.ack),
+            self.global_inactive.eq((num_sent == num_messages) & (self.num_recvd == num_messages))
+        ]
+        self.sync += [
+            toggle.eq(~toggle),
+            If(out.valid & out.ack, num_sent.eq(num_sent + 1)),
+            If(inp.valid & inp.ack, self.num_recvd.eq(self.num_recvd + 1))
+        ]
+
+    def gen_selfcheck(self, tb):
+        while not (yield tb.global_inactive):
+            yield
+        received = []
+        for i in range(self.num_messages):
+            received.append((yield self.mem[i]))
+        with open(os.path.join(tb.config.outdir, "fpga{}".format(self.fpga_id)), "w") as f:
+            f.write(" ".join(str(x) for x in received))
+
+class CoSimCase(unittest.TestCase):
+    def test_ring(self):
+        ring = ShmRing(2, 3)
+        self.assertTrue(ring.empty())
+        ring.push([1, 2, 3])
+        ring.push([4, 5, 6])
+        self.assertFalse(ring.can_push(0))
+        self.assertEqual(ring.peek(), [1, 2, 3])
+        ring.pop()
+        # the freed slot only counts once released at the end of the window
+        self.assertFalse(ring.can_push(0))
+        ring.release(0)
+        self.assertTrue(ring.can_push(1))
+        ring.push([7, 8, 9])
+        self.assertEqual(ring.peek(), [4, 5, 6])
+        ring.pop()
+        self.assertEqual(ring.peek(), [7, 8, 9])
+        ring.pop()
+        self.assertTrue(ring.empty())
+
+    def test_ring_of_fpgas(self):
+        num_fpga = 3
+        num_messages = 40
+        with tempfile.TemporaryDirectory() as outdir:
+            config = SimpleNamespace(addresslayout=SimpleNamespace(num_fpga=num_fpga, get_params=lambda: dict()), vcdname=None, outdir=outdir)
+            cosim = CoSim(config,
+                make_core=lambda i: ToyCore(i, num_fpga, num_messages),
+                out_route=lambda i, j, dest_pe: ((i + 1) % num_fpga, 0),
+                num_in=1,
+                interface=lambda: Record(_layout),
+                lookahead=4, ring_depth=8)
+            cosim.run()
+            for i in range(num_fpga):
+                with open(os.path.join(outdir, "fpga{}".format(i))) as f:
+                    received = [int(x) for x in f.read().split()]
+                sender = (i - 1) % num_fpga
+                self.assertEqual(received, [sender*1000 + n for n in range(num_messages)])
+
+    def test_bfs(self):
+        random.seed(42)
+        configparser = ConfigParser()
+        configparser['arch'] = {'num_pe': '4', 'num_fpga': '2', 'arch': 'S'}
+        configparser['graph'] = {'nodes': '20', 'edges': '40'}
+        configparser['app'] = {'algo': "bfs"}
+        configparser['logging'] = {'log_file_name': "unittest_sim_cosim", 'disable_logfile': True, 'console_log_level': 'WARNING', 'monitor': 'full'}
+        config = resolve_defaults(configparser)
+        num_fpga = config.addresslayout.num_fpga
+
+        def out_route(fpga_id, out_index, dest_pe):
+            dst = out_index if out_index < fpga_id else out_index + 1
+            return dst, fpga_id if fpga_id < dst else fpga_id - 1
+
+        with tempfile.TemporaryDirectory() as outdir:
+            def setup(fpga_id, tb):
+                def gen_dump():
+                    while not (yield tb.global_inactive):
+                        yield
+                    with open(os.path.join(outdir, "fpga{}".format(fpga_id)), "w") as f:
+                        for a in tb.core.apply:
+                            for node in range(a.mem.depth):
+                                vertexid = config.addresslayout.global_adr(a.pe_id, node)
+                                if vertexid in config.graph:
+                                    f.write("{} {}\n".format(vertexid, config.final_state((yield a.mem[node]))["parent"]))
+                return {"sys": [gen_dump()]}
+
+            CoSim(config,
+                make_core=lambda i: core_top_pico.Core(config, i),
+                out_route=out_route,
+                num_in=num_fpga - 1,
+                interface=NetworkInterface,
+                setup=setup).run()
+            parents = {}
+            for i in range(num_fpga):
+                with open(os.path.join(outdir, "fpga{}".format(i))) as f:
+                    parents.update((int(v), int(p)) for v, p in (line.split() for line in f))
+            self.assertEqual(set(parents), set(config.graph.nodes()))
+            # every vertex is reached, from a neighbor
+            for v, p in parents.items():
+                self.assertIn(p, list(config.graph.predecessors(v)) + [1])
+
+    def run_logged(self, run, config, logfile):
+        """-> final state by vertex and supersteps by PE logged by run(config)"""
+        handler = logging.FileHandler(logfile, mode="w")
+        logger = logging.getLogger("sim")
+        level = logger.level
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        try:
+            run(config)
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(level)
+            handler.close()
+        states = {}
+        supersteps = {}
+        with open(logfile) as f:
+            for line in f:
+                m = re.match(r"(\d+) \(origin=\d+\): (.*)", line)
+                if m:
+                    states[int(m.group(1))] = m.group(2)
+                m = re.match(r"PE (\d+): \d+ cycles taken for (\d+) supersteps", line)
+                if m:
+                    supersteps[int(m.group(1))] = int(m.group(2))
+        return states, supersteps
+
+    def test_entry_point(self):
+        # cc, since its result does not depend on the order messages arrive in
+        random.seed(42)
+        configparser = ConfigParser()
+        configparser['arch'] = {'num_pe': '4', 'num_fpga': '2', 'arch': 'S'}
+        configparser['graph'] = {'nodes': '16', 'edges': '24'}
+        configparser['app'] = {'algo': "cc"}
+        configparser['logging'] = {'log_file_name': "unittest_sim_cosim", 'disable_logfile': True, 'console_log_level': 'WARNING', 'monitor': 'full'}
+        config = resolve_defaults(configparser)
+        config.cosim = dict(lookahead=4, ring_depth=4)
+
+        with tempfile.TemporaryDirectory() as outdir:
+            reference = self.run_logged(core_top_multifpga_sim.sim, config, os.path.join(outdir, "sim.log"))
+            result = self.run_logged(core_top_multifpga_sim.cosim, config, os.path.join(outdir, "cosim.log"))
+        states, supersteps = reference
+        self.assertEqual(len(states), config.graph.number_of_nodes())
+        self.assertEqual(len(supersteps), config.addresslayout.num_pe)
+        self.assertEqual(result, reference)
+
+if __name__ == "__main__":
+    unittest.main()
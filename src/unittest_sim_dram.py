@@ -0,0 +1,51 @@
+import unittest
+
+from sim_dram import DRAMModel
+
+class DRAMModelCase(unittest.TestCase):
+    def run_requests(self, dram, addrs):
+        pending = list(enumerate(addrs))
+        done = {}
+        now = 0
+        while len(done) < len(addrs):
+            response = dram.response(now)
+            if response:
+                done[response[0]] = now
+            if pending and dram.can_accept():
+                tag, addr = pending.pop(0)
+                dram.request(now, tag, addr)
+            now += 1
+            self.assertLess(now, 100000)
+        return done
+
+    def test_row_hits_are_faster(self):
+        dram = DRAMModel(num_banks=1)
+        self.run_requests(dram, [0, 64])
+        self.assertEqual(dram.row_empty, 1)
+        self.assertEqual(dram.row_hits, 1)
+        hit = DRAMModel(num_banks=1)
+        conflict = DRAMModel(num_banks=1)
+        self.run_requests(hit, [0, 64])
+        self.run_requests(conflict, [0, 8192])
+        self.assertLess(hit.total_latency, conflict.total_latency)
+
+    def test_in_order(self):
+        dram = DRAMModel()
+        addrs = [(i*7919*64) % (1 << 24) for i in range(100)]
+        done = self.run_requests(dram, addrs)
+        order = sorted(done, key=lambda tag: done[tag])
+        self.assertEqual(order, list(range(len(addrs))))
+
+    def test_queue_bound(self):
+        dram = DRAMModel(queue_depth=4)
+        self.run_requests(dram, [i*64 for i in range(50)])
+        self.assertLessEqual(dram.max_occupancy, 4)
+
+    def test_bandwidth(self):
+        dram = DRAMModel(cycles_per_burst=4)
+        done = self.run_requests(dram, [i*64 for i in range(64)])
+        times = sorted(done.values())
+        self.assertTrue(all(b - a >= 4 for a, b in zip(times, times[1:])))
+
+if __name__ == "__main__":
+    unittest.main()
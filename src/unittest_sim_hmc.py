@@ -0,0 +1,91 @@
+import unittest
+import tempfile
+import os
+
+from sim_hmc import HMCModel, init_memory
+
+class HMCModelCase(unittest.TestCase):
+    def run_requests(self, hmc, reqs, port=0):
+        pending = list(enumerate(reqs))
+        done = {}
+        flits = {}
+        now = 0
+        while hmc.num_responses < len(reqs):
+            response = hmc.response(now, port)
+            if response:
+                tag, addr, flit, write = response
+                flits.setdefault(tag, []).append(flit)
+                done[tag] = now
+            if pending and hmc.can_accept(now, port):
+                tag, (addr, size) = pending.pop(0)
+                hmc.request(now, port, tag, addr, size=size)
+            now += 1
+            self.assertLess(now, 100000)
+        return done, flits
+
+    def test_fixed_latency(self):
+        hmc = HMCModel(latency=50, link_flits_per_cycle=0)
+        done, _ = self.run_requests(hmc, [(0, 1)])
+        self.assertEqual(done[0], 51)
+
+    def test_bursts(self):
+        hmc = HMCModel()
+        _, flits = self.run_requests(hmc, [(0, 4), (128, 8)])
+        self.assertEqual(flits[0], list(range(4)))
+        self.assertEqual(flits[1], list(range(8)))
+
+    def test_out_of_order(self):
+        hmc = HMCModel(latency=20, latency_dist="uniform", latency_spread=200, num_vaults=64)
+        done, _ = self.run_requests(hmc, [(i*128, 1) for i in range(32)])
+        order = sorted(done, key=lambda tag: done[tag])
+        self.assertNotEqual(order, list(range(32)))
+        self.assertGreater(hmc.num_reordered, 0)
+
+        hmc = HMCModel(latency=20, latency_dist="uniform", latency_spread=200, num_vaults=64, in_order=True)
+        done, _ = self.run_requests(hmc, [(i*128, 1) for i in range(32)])
+        order = sorted(done, key=lambda tag: done[tag])
+        self.assertEqual(order, list(range(32)))
+        self.assertEqual(hmc.num_reordered, 0)
+
+    def test_vault_conflicts(self):
+        spread = HMCModel(vault_cycles_per_flit=10, link_flits_per_cycle=0)
+        conflict = HMCModel(vault_cycles_per_flit=10, link_flits_per_cycle=0)
+        self.run_requests(spread, [(i*128, 1) for i in range(16)])
+        self.run_requests(conflict, [(i*128*16, 1) for i in range(16)])
+        self.assertEqual(conflict.vault_requests[0], 16)
+        self.assertLess(spread.total_latency, conflict.total_latency)
+        self.assertEqual(spread.vault_imbalance(), 1)
+        self.assertEqual(conflict.vault_imbalance(), 16)
+        self.assertEqual(spread.vault_wait_cycles, 0)
+        self.assertGreater(conflict.vault_wait_cycles, 0)
+
+    def test_link_bandwidth(self):
+        hmc = HMCModel(latency=10, link_flits_per_cycle=1)
+        done, _ = self.run_requests(hmc, [(i*128, 1) for i in range(32)])
+        times = sorted(done.values())
+        self.assertTrue(all(b - a >= 2 for a, b in zip(times, times[1:])))
+        self.assertGreater(hmc.link_stall_cycles, 0)
+
+    def test_latency_trace(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write("# cycles\n30 60\n")
+        try:
+            hmc = HMCModel(latency_trace=f.name, link_flits_per_cycle=0, num_ports=1)
+            done, _ = self.run_requests(hmc, [(0, 1), (128, 1), (256, 1)])
+        finally:
+            os.remove(f.name)
+        self.assertEqual(done, {0: 31, 1: 62, 2: 33})
+
+    def test_tag_reuse(self):
+        hmc = HMCModel()
+        hmc.request(0, 0, 3, 0)
+        with self.assertRaises(AssertionError):
+            hmc.request(0, 0, 3, 128)
+
+    def test_init_memory(self):
+        memory = init_memory(list(range(8)), 4)
+        self.assertEqual(memory[0], 0x00000003000000020000000100000000)
+        self.assertEqual(memory[1], 0x00000007000000060000000500000004)
+
+if __name__ == "__main__":
+    unittest.main()
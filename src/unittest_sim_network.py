@@ -0,0 +1,60 @@
+import unittest
+
+from sim_network import NetworkModel
+
+class NetworkModelCase(unittest.TestCase):
+    def run_model(self, model, sends, num_cycles=200):
+        """sends: {cycle: [(src, dest, msg)]} -> {msg: arrival cycle}"""
+        arrivals = dict()
+        for now in range(num_cycles):
+            for src, dest, msg in sends.get(now, []):
+                model.send(now, src, dest, 0, msg)
+            for dest in range(len(model.ready)):
+                model.advance(now, dest)
+                while model.peek(dest, 0) is not None:
+                    arrivals[model.peek(dest, 0)] = now
+                    model.pop(dest, 0)
+        return arrivals
+
+    def test_latency(self):
+        model = NetworkModel(4, 2, 2, latency=3, fpga_latency=10)
+        arrivals = self.run_model(model, {0: [(0, 1, 1), (0, 2, 2)]})
+        self.assertEqual(arrivals, {1: 3, 2: 13})
+        self.assertEqual(model.num_remote, 1)
+
+    def test_bandwidth(self):
+        model = NetworkModel(4, 4, 2, latency=1, bandwidth=0.5)
+        arrivals = self.run_model(model, {0: [(0, 1, i) for i in range(4)]})
+        self.assertEqual([arrivals[i] for i in range(4)], [1, 3, 5, 7])
+        # other links are not affected
+        model = NetworkModel(4, 4, 2, latency=1, bandwidth=0.5)
+        arrivals = self.run_model(model, {0: [(i, 3, i) for i in range(3)]})
+        self.assertEqual([arrivals[i] for i in range(3)], [1, 1, 1])
+
+    def test_shared_fpga_link(self):
+        model = NetworkModel(4, 2, 2, latency=1, fpga_latency=5, fpga_bandwidth=1)
+        arrivals = self.run_model(model, {0: [(0, 2, 0), (1, 3, 1), (0, 3, 2)]})
+        self.assertEqual([arrivals[i] for i in range(3)], [6, 7, 8])
+
+    def test_order_and_backpressure(self):
+        model = NetworkModel(2, 2, 2, buffer_depth=4)
+        for i in range(4):
+            self.assertTrue(model.can_send(0))
+            model.send(0, 0, 1, i % 2, i)
+        self.assertFalse(model.can_send(0))
+        for now in range(1, 5):
+            model.advance(now, 1)
+        self.assertEqual(model.peek(1, 0), 0)
+        model.pop(1, 0)
+        self.assertEqual(model.peek(1, 0), 2)
+        self.assertEqual(model.peek(1, 1), 1)
+        self.assertTrue(model.can_send(0))
+
+    def test_late_send(self):
+        model = NetworkModel(2, 2, 2, latency=1)
+        model.advance(1, 1)
+        model.send(0, 0, 1, 0, 7)
+        self.assertEqual(model.peek(1, 0), 7)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import tempfile
+import os
+import random
+from configparser import ConfigParser
+
+from migen import *
+
+from core_init import resolve_defaults
+from core_interfaces import NetworkInterface
+from sim_trace import TraceWriter, read_trace, replay, make_network, gen_trace_capture
+
+class TraceCase(unittest.TestCase):
+    def setUp(self):
+        configparser = ConfigParser()
+        configparser['arch'] = {'num_pe': 4}
+        configparser['graph'] = {}
+        configparser['app'] = {'algo': "bfs"}
+        configparser['logging'] = {'log_file_name': "unittest_sim_trace", 'disable_logfile': True}
+        self.config = resolve_defaults(configparser, num_nodes=16, num_edges=32)
+
+    def make_trace(self, num_rounds, num_messages):
+        num_pe = self.config.addresslayout.num_pe
+        random.seed(7)
+        records = []
+        for src in range(num_pe):
+            cycle = 0
+            for roundpar in range(num_rounds):
+                for _ in range(num_messages):
+                    cycle += random.choice([1, 1, 2, 8])
+                    records.append((cycle, src, random.randrange(num_pe), roundpar % 2, 0))
+                for dest in range(num_pe):
+                    cycle += 1
+                    records.append((cycle, src, dest, roundpar % 2, 1))
+        records.sort()
+        return records
+
+    def test_file(self):
+        records = self.make_trace(2, 10)
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, "trace.bin")
+            writer = TraceWriter(filename, 4)
+            for r in records:
+                writer.write(*r)
+            writer.close()
+            self.assertEqual(read_trace(filename), (4, records))
+
+    def test_replay(self):
+        records = self.make_trace(2, 20)
+        stats = replay(self.config, records, make_network(self.config, "fifo_network"), timeout=5000)
+        self.assertEqual(stats["num_messages"], 4*2*20)
+        self.assertEqual(stats["num_barriers"], 4*2)
+        self.assertEqual(len(stats["latency"]), stats["num_messages"])
+        self.assertGreater(min(stats["latency"]), 0)
+
+    def test_latency(self):
+        num_pe = self.config.addresslayout.num_pe
+        # one message from PE 0 to PE 1 on an otherwise idle network, then the barriers
+        records = [(0, 0, 1, 0, 0)] + sorted((1 + dest, src, dest, 0, 1) for src in range(num_pe) for dest in range(num_pe))
+        stats = replay(self.config, records, make_network(self.config, "fifo_network"), timeout=5000)
+        self.assertEqual(stats["latency"], [3])
+        self.assertEqual(stats["injection_delay"], [0]*len(records))
+
+    def test_one_channel(self):
+        with self.assertRaises(NotImplementedError):
+            make_network(self.config, "one_channel_network")
+
+    def test_capture_local(self):
+        class Scatter:
+            def __init__(self, pe_id, config):
+                self.pe_id = pe_id
+                self.network_interface = NetworkInterface(**config.addresslayout.get_params())
+                self.local_interface = NetworkInterface(**config.addresslayout.get_params())
+
+        tb = Module()
+        tb.config = self.config
+        scatter = [Scatter(pe_id, self.config) for pe_id in range(2)]
+
+        def gen():
+            yield scatter[0].network_interface.dest_pe.eq(1)
+            yield scatter[0].network_interface.valid.eq(1)
+            yield scatter[0].network_interface.ack.eq(1)
+            yield scatter[1].local_interface.valid.eq(1)
+            yield scatter[1].local_interface.ack.eq(1)
+            yield
+            yield scatter[0].network_interface.valid.eq(0)
+            yield
+            yield scatter[1].local_interface.msg.roundpar.eq(1)
+            yield
+            yield scatter[1].local_interface.valid.eq(0)
+            yield
+
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, "trace.bin")
+            capture = gen_trace_capture(tb, scatter, filename)
+            run_simulation(tb, [capture, gen()])
+            capture.close()
+            self.assertEqual(read_trace(filename), (4, [(1, 0, 1, 0, 0), (1, 1, 1, 0, 0), (2, 1, 1, 0, 0), (3, 1, 1, 1, 0)]))
+
+if __name__ == "__main__":
+    unittest.main()
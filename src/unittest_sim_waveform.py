@@ -0,0 +1,92 @@
+import unittest
+import tempfile
+import gzip
+import os
+from types import SimpleNamespace
+
+from migen import *
+
+from sim_waveform import simulate, parse_range
+
+class WaveformCase(unittest.TestCase):
+    class TestBench(Module):
+        def __init__(self):
+            self.count = Signal(8)
+            self.level = Signal(4)
+            self.other = Signal(8)
+            self.sync += [
+                self.count.eq(self.count + 1),
+                If(self.count[:3] == 7, self.level.eq(self.level + 1)),
+                self.other.eq(self.count ^ 0x55)
+            ]
+
+    def run_tb(self, **waveform):
+        tb = self.TestBench()
+        def gen():
+            for _ in range(40):
+                yield
+        config = SimpleNamespace(waveform=waveform)
+        simulate(tb, [gen()], config, self.vcd_name, levels=[tb.level])
+        return tb
+
+    def parse(self, filename, opener=open):
+        """-> names of dumped signals, {time: {name: value}} of the changes"""
+        with opener(filename, "rt") as f:
+            lines = f.read().splitlines()
+        codes = {l.split()[3]: l.split()[4] for l in lines if l.startswith("$var")}
+        changes = dict()
+        t = None
+        for l in lines[lines.index("$end") + 1:]:
+            if l.startswith("#"):
+                t = int(l[1:])
+            elif l.startswith("b"):
+                value, code = l[1:].split()
+                changes.setdefault(t, dict())[codes[code]] = int(value, 2)
+            else:
+                changes.setdefault(t, dict())[codes[l[1:]]] = int(l[0])
+        return set(codes.values()), changes
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.vcd_name = os.path.join(self.dir.name, "tb.vcd")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range(""), None)
+        self.assertEqual(parse_range("3"), (3, 3))
+        self.assertEqual(parse_range("10-20"), (10, 20))
+        self.assertEqual(parse_range("10-"), (10, None))
+
+    def test_select(self):
+        self.run_tb(signals="*count*, *level*")
+        names, changes = self.parse(self.vcd_name)
+        self.assertEqual(len(names), 2)
+        self.assertTrue(all("other" not in name for name in names))
+        count = [name for name in names if "count" in name][0]
+        values = sorted(c[count] for c in changes.values() if count in c)
+        self.assertEqual(values, list(range(1, max(values) + 1)))
+        self.assertGreaterEqual(max(values), 40)
+
+    def test_cycle_window(self):
+        self.run_tb(signals="*count*", cycles="10-19", compression="gzip")
+        self.assertFalse(os.path.exists(self.vcd_name))
+        names, changes = self.parse(self.vcd_name + ".gz", gzip.open)
+        count = names.pop()
+        values = [c[count] for t, c in sorted(changes.items()) if count in c]
+        self.assertEqual(values, list(range(10, 21)))
+
+    def test_superstep_window(self):
+        self.run_tb(signals="*count*", supersteps="2")
+        names, changes = self.parse(self.vcd_name)
+        count = names.pop()
+        values = [c[count] for t, c in sorted(changes.items()) if count in c]
+        self.assertEqual(values, list(range(16, 25)))
+
+    def test_disable(self):
+        self.run_tb(enable="False")
+        self.assertFalse(os.path.exists(self.vcd_name))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import random
+
+from migen import *
+from migen.genlib.fifo import SyncFIFOBuffered
+from tbsupport import SimCase
+
+from hmc_backed_fifo import SpillFIFO
+
+class SpillFIFOCase(SimCase, unittest.TestCase):
+    class TestBench(Module):
+        def __init__(self):
+            self.submodules.dut = SpillFIFO(width=16, depth=4, backend=SyncFIFOBuffered(width=16, depth=64))
+
+    def test_order(self):
+        data = list(range(200))
+        max_level = [0]
+
+        def gen_write():
+            for x in data:
+                yield self.tb.dut.din.eq(x)
+                yield self.tb.dut.we.eq(1)
+                yield
+                while not (yield self.tb.dut.writable):
+                    yield
+                yield self.tb.dut.we.eq(0)
+                # bursts, so the on-chip part overflows
+                if random.random() < 0.05:
+                    for _ in range(random.randrange(40)):
+                        yield
+
+        def gen_read():
+            for x in data:
+                yield self.tb.dut.re.eq(random.random() < 0.3)
+                yield
+                while not ((yield self.tb.dut.readable) and (yield self.tb.dut.re)):
+                    max_level[0] = max(max_level[0], (yield self.tb.dut.level))
+                    yield self.tb.dut.re.eq(random.random() < 0.3)
+                    yield
+                self.assertEqual(x, (yield self.tb.dut.dout))
+            yield self.tb.dut.re.eq(0)
+            yield
+            self.assertEqual((yield self.tb.dut.level), 0)
+            self.assertEqual((yield self.tb.dut.spill_level), 0)
+            self.assertGreater((yield self.tb.dut.num_spilled), 0)
+            self.assertGreater(max_level[0], 4)
+
+        random.seed(1)
+        self.run_with([gen_write(), gen_read()])
+
+if __name__ == "__main__":
+    unittest.main()
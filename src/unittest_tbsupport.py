@@ -0,0 +1,136 @@
+import unittest
+import tempfile
+import os
+from types import SimpleNamespace
+
+from migen import *
+from migen.fhdl import verilog
+from util.mem import FullyInitMemory
+
+from tbsupport import sample_every, every_cycle, get_monitors, get_special_overrides, cd, run_parallel
+
+class MonitorCase(unittest.TestCase):
+    class Handshake(Module):
+        def __init__(self, count):
+            self.count = count
+
+        @every_cycle
+        def gen_selfcheck(self, tb):
+            while not (yield tb.global_inactive):
+                self.seen.append((yield self.count))
+                yield
+
+    class TestBench(Module):
+        def __init__(self):
+            self.count = Signal(16)
+            self.global_inactive = Signal()
+            self.sync += self.count.eq(self.count + 1)
+            self.comb += self.global_inactive.eq(self.count == 100)
+            self.submodules.handshake = MonitorCase.Handshake(self.count)
+
+        def gen_selfcheck(self, tb):
+            while not (yield tb.global_inactive):
+                self.seen.append((yield tb.count))
+                yield
+
+    class Core:
+        def gen_barrier_monitor(self, tb):
+            yield
+
+    def run_monitors(self, level):
+        tb = self.TestBench()
+        tb.seen = []
+        tb.handshake.seen = []
+        self.tb = tb
+        config = SimpleNamespace(sim_monitor=level, sim_monitor_interval=10)
+        monitors = get_monitors(tb, config, [self.Core()])
+        if monitors:
+            run_simulation(tb, monitors)
+        return monitors, tb.seen
+
+    def test_levels(self):
+        monitors, seen = self.run_monitors("off")
+        self.assertEqual(monitors, [])
+        monitors, seen = self.run_monitors("barrier")
+        self.assertEqual((len(monitors), seen), (1, []))
+        monitors, seen = self.run_monitors("full")
+        self.assertEqual(seen, list(range(100)))
+        monitors, seen = self.run_monitors("sampled")
+        self.assertEqual(seen, list(range(0, 100, 10)))
+
+    def test_every_cycle(self):
+        for level in ("sampled", "full"):
+            self.run_monitors(level)
+            self.assertEqual(self.tb.handshake.seen, list(range(100)))
+
+    def test_passive(self):
+        tb = self.TestBench()
+        seen = []
+        @passive
+        def gen_watch():
+            while True:
+                seen.append((yield tb.count))
+                yield
+        def gen_wait():
+            for _ in range(25):
+                yield
+        run_simulation(tb, [sample_every(gen_watch(), 10), gen_wait()])
+        self.assertEqual(seen, [0, 10, 20])
+
+class MemInitCase(unittest.TestCase):
+    class Top(Module):
+        def __init__(self):
+            self.specials.mem = FullyInitMemory(8, 6, init=[1, 0xab, 3, -1], name="vertex_data_0")
+            self.specials.rd_port = rd_port = self.mem.get_port()
+            self.adr = rd_port.adr
+            self.dat_r = rd_port.dat_r
+
+    def export(self, mem_init_files):
+        m = self.Top()
+        config = SimpleNamespace(export_mem_init_files=mem_init_files)
+        with tempfile.TemporaryDirectory() as outdir:
+            with cd(outdir):
+                verilog.convert(m, name="top", ios={m.adr, m.dat_r}, special_overrides=get_special_overrides(config)).write("top.v")
+                with open("top.v") as f:
+                    src = f.read()
+                data = dict()
+                for name in os.listdir("."):
+                    if name != "top.v":
+                        with open(name) as f:
+                            data[name] = f.read()
+        return src, data
+
+    def test_side_files(self):
+        src, data = self.export(True)
+        self.assertEqual(data, {"vertex_data_0.hex": "1\nab\n3\nff\n0\n0\n"})
+        self.assertIn('$readmemh("vertex_data_0.hex", vertex_data_0);', src)
+
+    def test_default(self):
+        self.assertEqual(get_special_overrides(SimpleNamespace(), {Instance: None}), {Instance: None})
+        src, data = self.export(False)
+        self.assertEqual(data, {})
+        self.assertNotIn("$readmemh", src)
+
+class ParallelCase(unittest.TestCase):
+    def test_tasks(self):
+        with tempfile.TemporaryDirectory() as outdir:
+            parent = os.getpid()
+            def task(i):
+                with open(os.path.join(outdir, str(i)), "w") as f:
+                    f.write(str(os.getpid() != parent))
+            run_parallel([lambda i=i: task(i) for i in range(4)], jobs=2)
+            for i in range(4):
+                with open(os.path.join(outdir, str(i))) as f:
+                    self.assertEqual(f.read(), "True")
+            run_parallel([lambda: task(4)], jobs=2)
+            with open(os.path.join(outdir, "4")) as f:
+                self.assertEqual(f.read(), "False")
+
+    def test_error(self):
+        def fail():
+            raise ValueError("in worker")
+        with self.assertRaises(ValueError):
+            run_parallel([fail, fail], jobs=2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import tempfile
+import random
+import os
+from configparser import ConfigParser
+
+from migen import *
+
+from core_init import resolve_defaults
+import top_minimal
+
+def make_config(graphfile, algo, split_degree):
+    random.seed(42)
+    config = ConfigParser()
+    config['arch'] = {'num_pe': '4'}
+    config['graph'] = {'graphfile': graphfile, 'split_degree': str(split_degree)}
+    config['app'] = {'algo': algo}
+    config['logging'] = {'log_file_name': "unittest_vertex_split", 'disable_logfile': True, 'console_log_level': 'WARNING'}
+    return resolve_defaults(config)
+
+def run(config):
+    """-> dict origin -> final state, parents given by origin (None for
+    no parent or a mirror)"""
+    tb = top_minimal.UnCore(config)
+    core = tb.cores[0]
+    states = {}
+
+    def gen_run():
+        yield core.init_complete.eq(1)
+        yield
+        while not (yield tb.global_inactive):
+            yield
+        states.update((yield from core.gen_states()))
+
+    run_simulation(tb, [tb.gen_simulation(tb), gen_run()])
+
+    origin = lambda v: config.graph.node[v]["origin"] if v in config.graph and "master" not in config.graph.node[v] else None
+    result = {}
+    for vertexid, state in states.items():
+        if "parent" in state:
+            state["parent"] = origin(state["parent"])
+        result[origin(vertexid)] = state
+    return result
+
+class VertexSplitCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.graphfile = os.path.join(self.dir.name, "hub.edgelist")
+        # hub 0 with 20 neighbors, of which a few are connected among each other
+        with open(self.graphfile, "w") as f:
+            for v in range(1, 21):
+                f.write("0 {}\n".format(v))
+            for v in range(1, 20, 4):
+                f.write("{} {}\n".format(v, v + 1))
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_sssp(self):
+        split = make_config(self.graphfile, "sssp", 4)
+        self.assertEqual(len(split.mirrors), 1)
+        self.assertEqual(len(list(split.mirrors.values())[0]), 4)
+        reference = run(make_config(self.graphfile, "sssp", 0))
+        self.assertEqual(run(split), reference)
+        self.assertEqual(len(reference), 21)
+
+    def test_bfs(self):
+        # the mirror would add a hop, so bfs does not split
+        self.assertEqual(make_config(self.graphfile, "bfs", 4).mirrors, {})
+
+if __name__ == "__main__":
+    unittest.main()